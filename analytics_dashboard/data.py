@@ -0,0 +1,113 @@
+"""
+Data access for the analytics dashboard.
+
+- Emissions come from the carbon estimator's EmissionRollup rows (daily,
+  ISO-week and monthly sums kept up to date on every entry write), read
+  with one range query on the (user, period, start) index that fetches
+  only the columns the charts use
+- Classified uploads come from classifier.history.category_counts(), one
+  GROUP BY over the (uploaded_at, category) index
+- Each filter option maps to a date range and a bucket size; results are
+  pandas DataFrames over NumPy arrays, one row per bucket
+"""
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from carbon_estimator import rollups
+from classifier.history import category_counts
+
+# filter option -> (days before today included, bucket period)
+FILTERS = {
+    'day': (0, 'day'),
+    'week': (6, 'day'),
+    'month': (29, 'day'),
+    'quarter': (89, 'day'),
+    'year': (364, 'week'),
+}
+DEFAULT_FILTER = 'month'
+ALL_TIME_PERIOD = 'month'  # bucket for any other filter value, which shows all time
+
+# Frame column -> EmissionRollup field
+EMISSION_COLUMNS = {
+    'transport': 'transport_emission',
+    'electricity': 'electricity_emission',
+    'food': 'food_emission',
+    'plastic': 'plastic_emission',
+    'co2': 'total_emission',
+}
+CATEGORY_COLUMNS = ['transport', 'electricity', 'food', 'plastic']
+
+FRAME_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'), ('entries', np.int64),
+    *[(column, np.float64) for column in EMISSION_COLUMNS],
+])
+
+
+def date_range(filter_option, today=None):
+    """(first day or None for all time, last day, bucket period) for a filter option."""
+    today = today or timezone.localdate()
+    if filter_option not in FILTERS:
+        return None, today, ALL_TIME_PERIOD
+    days, period = FILTERS[filter_option]
+    return today - timedelta(days=days), today, period
+
+
+def emissions_frame(user=None, filter_option=DEFAULT_FILTER):
+    """
+    The user's emissions per bucket in the filter's range: date, entries and
+    kg CO2e per category plus 'co2' (the total). Buckets without entries are
+    absent. `user` None reads entries that have no user.
+    """
+    start, end, period = date_range(filter_option)
+    rows = (rollups.series(period, start, end, user=user)
+            .values_list('start', 'entries', *EMISSION_COLUMNS.values()))
+    records = np.fromiter(rows.iterator(), dtype=FRAME_DTYPE)
+    return pd.DataFrame({name: records[name] for name in FRAME_DTYPE.names})
+
+
+def daily_averages(frame):
+    """Mean kg CO2e per entry (i.e. per day with an entry) for each category."""
+    entries = int(frame['entries'].sum())
+    if not entries:
+        return pd.Series(0.0, index=CATEGORY_COLUMNS)
+    return frame[CATEGORY_COLUMNS].sum() / entries
+
+
+def weekly_changes(frame):
+    """Week-over-week change of the weekly totals in a frame of daily or weekly buckets."""
+    weeks = frame['date'] - pd.to_timedelta(frame['date'].dt.weekday, unit='D')
+    totals = frame.groupby(weeks)['co2'].sum()
+    return pd.DataFrame({'date': totals.index, 'co2': totals.to_numpy(), 'change': totals.diff().fillna(0).to_numpy()})
+
+
+def streaks(frame, limit, days=30, today=None):
+    """
+    Per day of the last `days` days: whether its total was at or under
+    `limit` kg CO2e and the run of such days ending there. A day without an
+    entry ends the run.
+    """
+    today = today or timezone.localdate()
+    dates = pd.date_range(end=pd.Timestamp(today), periods=days, freq='D')
+    totals = frame.set_index('date')['co2'].reindex(dates).to_numpy()
+    under = totals <= limit  # False for days without an entry (NaN)
+    # Length of the run of True values ending at each position
+    run_starts = np.maximum.accumulate(np.where(under, 0, np.arange(1, days + 1)))
+    return pd.DataFrame({'date': dates, 'under_limit': under, 'streak': np.arange(1, days + 1) - run_starts})
+
+
+def classification_frame(filter_option=DEFAULT_FILTER):
+    """Classified uploads per bucket and waste category in the filter's range: date, category, count."""
+    start, end, period = date_range(filter_option)
+    rows = category_counts(period, _local_midnight(start or date(1970, 1, 1)), _local_midnight(end + timedelta(days=1)))
+    return pd.DataFrame({
+        'date': np.array([row['period'] for row in rows], dtype='datetime64[D]'),
+        'category': np.array([row['category'] for row in rows], dtype=object),
+        'count': np.array([row['count'] for row in rows], dtype=np.int64),
+    })
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
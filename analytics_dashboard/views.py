@@ -1,3 +1,4 @@
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import JsonResponse, HttpResponse
 import pandas as pd
@@ -10,40 +11,17 @@ from folium.plugins import MarkerCluster
 import json
 import random
 
+from . import data as analytics_data
+
+@login_required
 def dashboard_view(request):
     # Get filter from query parameter
     filter_option = request.GET.get('filter', 'month')
 
-    # Load sample/mock data
-    dates = pd.date_range(end=pd.Timestamp.today(), periods=90)
-    df = pd.DataFrame({
-        'date': dates,
-        'transport': np.random.randint(1, 10, len(dates)),
-        'electricity': np.random.randint(1, 10, len(dates)),
-        'food': np.random.randint(1, 10, len(dates)),
-        'plastic': np.random.randint(1, 10, len(dates)),
-    })
-
-    # Force last 5 rows to have today's date
-    df.loc[df.tail(5).index, 'date'] = pd.Timestamp.today().normalize()
-
-    # Total CO₂ column
-    df['co2'] = df[['transport', 'electricity', 'food', 'plastic']].sum(axis=1)
-    df['date'] = pd.to_datetime(df['date'])
-
-    # Filtering
-    if filter_option == 'day':
-        df_filtered = df[df['date'] >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)]
-    elif filter_option == 'week':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(weeks=1)]
-    elif filter_option == 'month':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=30)]
-    elif filter_option == 'quarter':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=90)]
-    elif filter_option == 'year':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=365)]
-    else:
-        df_filtered = df
+    # The user's emissions in the filter's range, and the last 90 days for the weekly and streak charts
+    user = request.user
+    df_filtered = analytics_data.emissions_frame(user, filter_option)
+    df = analytics_data.emissions_frame(user, 'quarter')
 
     # Line Chart for CO₂ Emissions
     fig = px.line(df_filtered, x='date', y='co2', title=f'CO₂ Emissions - {filter_option.capitalize()} View')
@@ -53,7 +31,7 @@ def dashboard_view(request):
 
     # Radar Chart: User avg vs Global avg
     categories = ['Transport', 'Electricity', 'Food', 'Plastic']
-    user_avg = df_filtered[['transport', 'electricity', 'food', 'plastic']].mean()
+    user_avg = analytics_data.daily_averages(df_filtered)
     global_avg = pd.Series([6, 7, 5, 4], index=categories)  # Mock global avg
 
     radar_fig = go.Figure()
@@ -72,8 +50,7 @@ def dashboard_view(request):
     bar_html = bar_fig.to_html(full_html=False)
 
     # Waterfall Chart: Weekly change
-    weekly_df = df.set_index('date').resample('W').sum().reset_index()
-    weekly_df['change'] = weekly_df['co2'].diff().fillna(0)
+    weekly_df = analytics_data.weekly_changes(df)
     waterfall_fig = go.Figure(go.Waterfall(
         x=weekly_df['date'].dt.strftime('%Y-%m-%d'),
         y=weekly_df['change'],
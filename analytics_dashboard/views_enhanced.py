@@ -1,3 +1,4 @@
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import JsonResponse, HttpResponse
 import pandas as pd
@@ -9,73 +10,57 @@ import folium
 from folium.plugins import MarkerCluster
 import json
 import random
+from ecoguard.metrics import timer
 
+from . import data as analytics_data
+
+# kg CO2e per day at or under which a day counts towards a streak
+STREAK_LIMIT_KG = 4.5
+
+@login_required
 def dashboard_view(request):
     # Handle AJAX requests for real-time updates
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return get_dashboard_data(request)
     
     # Regular page load
-    return render(request, 'analytics_dashboard/dashboard.html', {
-        'achievements': get_user_achievements(),
-        'ai_insights': get_ai_insights(),
-        'streak_data': get_streak_data()
-    })
+    with timer('analytics.template'):
+        return render(request, 'analytics_dashboard/dashboard.html', {
+            'achievements': get_user_achievements(),
+            'ai_insights': get_ai_insights(),
+            'streak_data': get_streak_data(request.user)
+        })
 
+@login_required
 def get_dashboard_data(request):
-    """API endpoint for real-time dashboard data"""
+    """API endpoint for real-time dashboard data; the signed-in user's entries only"""
     filter_option = request.GET.get('filter', 'month')
     chart_type = request.GET.get('chart_type', 'line')
-    
-    # Generate sample data
-    dates = pd.date_range(end=pd.Timestamp.today(), periods=90)
-    df = pd.DataFrame({
-        'date': dates,
-        'transport': np.random.randint(1, 10, len(dates)),
-        'electricity': np.random.randint(1, 10, len(dates)),
-        'food': np.random.randint(1, 10, len(dates)),
-        'plastic': np.random.randint(1, 10, len(dates)),
-    })
-    
-    df['co2'] = df[['transport', 'electricity', 'food', 'plastic']].sum(axis=1)
-    df['date'] = pd.to_datetime(df['date'])
-    
-    # Apply time filter
-    if filter_option == 'day':
-        df_filtered = df[df['date'] >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)]
-    elif filter_option == 'week':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(weeks=1)]
-    elif filter_option == 'month':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=30)]
-    elif filter_option == 'quarter':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=90)]
-    elif filter_option == 'year':
-        df_filtered = df[df['date'] > datetime.now() - timedelta(days=365)]
-    else:
-        df_filtered = df
-    
-    # Prepare data for frontend
-    data = {
-        'dates': df_filtered['date'].dt.strftime('%Y-%m-%d').tolist(),
-        'emissions': df_filtered['co2'].tolist(),
-        'transport': df_filtered['transport'].tolist(),
-        'electricity': df_filtered['electricity'].tolist(),
-        'food': df_filtered['food'].tolist(),
-        'plastic': df_filtered['plastic'].tolist(),
-        'categories': ['Transport', 'Electricity', 'Food', 'Plastic'],
-        'category_totals': [
-            df_filtered['transport'].sum(),
-            df_filtered['electricity'].sum(),
-            df_filtered['food'].sum(),
-            df_filtered['plastic'].sum()
-        ],
-        'radar_user': df_filtered[['transport', 'electricity', 'food', 'plastic']].mean().tolist(),
-        'radar_global': [6, 7, 5, 4],
-        'achievements': get_user_achievements(),
-        'ai_insights': get_ai_insights(),
-        'streak_data': get_streak_data()
-    }
-    
+    user = request.user
+
+    with timer('analytics.aggregate'):
+        df_filtered = analytics_data.emissions_frame(user, filter_option)
+        waste = analytics_data.classification_frame(filter_option).groupby('category')['count'].sum()
+
+        # Prepare data for frontend; plain Python numbers, which JsonResponse can serialise
+        data = {
+            'dates': df_filtered['date'].dt.strftime('%Y-%m-%d').tolist(),
+            'emissions': df_filtered['co2'].round(2).tolist(),
+            'transport': df_filtered['transport'].round(2).tolist(),
+            'electricity': df_filtered['electricity'].round(2).tolist(),
+            'food': df_filtered['food'].round(2).tolist(),
+            'plastic': df_filtered['plastic'].round(2).tolist(),
+            'categories': ['Transport', 'Electricity', 'Food', 'Plastic'],
+            'category_totals': df_filtered[analytics_data.CATEGORY_COLUMNS].sum().round(2).tolist(),
+            'radar_user': analytics_data.daily_averages(df_filtered).round(2).tolist(),
+            'radar_global': [6, 7, 5, 4],
+            'waste_categories': waste.index.tolist(),
+            'waste_counts': waste.tolist(),
+            'achievements': get_user_achievements(),
+            'ai_insights': get_ai_insights(),
+            'streak_data': get_streak_data(user)
+        }
+
     return JsonResponse(data)
 
 def get_user_achievements():
@@ -119,29 +104,17 @@ def get_ai_insights():
     ]
     return random.sample(insights, 3)  # Return 3 random insights
 
-def get_streak_data():
-    """Generate streak tracking data"""
-    dates = pd.date_range(end=pd.Timestamp.today(), periods=30)
-    streak_data = []
-    current_streak = 0
-    
-    for date in dates:
-        is_low_emission = random.choice([True, False, True, True])  # 75% chance of low emission day
-        if is_low_emission:
-            current_streak += 1
-        else:
-            current_streak = 0
-        
-        streak_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'streak': current_streak,
-            'is_low_emission': is_low_emission
-        })
-    
+def get_streak_data(user=None):
+    """Low-emission streaks over the last 30 days of the user's entries"""
+    streaks = analytics_data.streaks(analytics_data.emissions_frame(user, 'month'), STREAK_LIMIT_KG)
+    streak_data = [
+        {'date': day.strftime('%Y-%m-%d'), 'streak': int(streak), 'is_low_emission': bool(under)}
+        for day, streak, under in zip(streaks['date'], streaks['streak'], streaks['under_limit'])
+    ]
     return {
         'data': streak_data,
-        'current_streak': current_streak,
-        'best_streak': max([d['streak'] for d in streak_data])
+        'current_streak': streak_data[-1]['streak'],
+        'best_streak': max(d['streak'] for d in streak_data)
     }
 
 # Map view remains unchanged
@@ -166,7 +139,8 @@ def map_view(request):
             icon=folium.Icon(color="green" if co2 < 90 else "red")
         ).add_to(marker_cluster)
 
-    map_html = m._repr_html_()
+    with timer('analytics.map'):
+        map_html = m._repr_html_()
     return render(request, 'analytics_dashboard/map.html', {'map_html': map_html})
 
 def generate_streak_chart(df):
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import EmissionFactor, Meter
+
+
+@admin.register(EmissionFactor)
+class EmissionFactorAdmin(admin.ModelAdmin):
+    # Factors are versioned: add a new row to change one, so history stays intact
+    list_display = ('key', 'value', 'unit', 'version', 'created_at', 'note')
+    list_filter = ('key',)
+    readonly_fields = ('version', 'created_at')
+
+    def has_change_permission(self, request, obj=None):
+        return obj is None
+
+
+@admin.register(Meter)
+class MeterAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'created_at')
+    readonly_fields = ('token', 'created_at')
@@ -0,0 +1,192 @@
+"""
+Streaming anomaly detection on daily emission totals.
+
+- EmissionStats keeps Welford running statistics (utils.RunningStats) of
+  each user's daily totals for all time and for rolling windows of the last
+  7, 30 and 90 days
+- Every CarbonEntry write passes the changed day's old and new total to
+  record_day_changes(): the stats are updated in O(1), a window that moves
+  forward only reads the few days that fell out of it, and the day is scored
+  against the other days of each window
+- Days more than CARBON_ANOMALY_Z standard deviations away are stored as
+  EmissionAnomaly rows with their date and z-score. A day is scored against
+  the days seen before it, so later data does not re-flag earlier days
+- rebuild() recomputes everything from the daily rollups with numpy, e.g.
+  after bulk writes, with the same result as replaying them day by day
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from . import rollups
+from .models import EmissionAnomaly, EmissionStats
+from .utils import RunningStats
+
+WINDOWS = (0, 7, 30, 90)  # days; 0 = all time
+
+
+def z_threshold():
+    return getattr(settings, 'CARBON_ANOMALY_Z', 2.0)
+
+
+def min_days():
+    return getattr(settings, 'CARBON_ANOMALY_MIN_DAYS', 5)
+
+
+def _day_totals(user_id):
+    def totals_between(start, end):
+        return rollups.series('day', start, end, user=user_id).values_list('total_emission', flat=True)
+    return totals_between
+
+
+def observe(stats, day, before, after, totals_between):
+    """
+    Applies one day's total changing from `before` to `after` (None = no
+    entries) to one EmissionStats row, in memory. `totals_between(start, end)`
+    returns the user's daily totals in that date range.
+
+    Returns (z-score, mean, std) of `after` against the window's other days,
+    or None when the day is not scored (no value, too little history, or
+    older than a rolling window).
+    """
+    running = RunningStats(stats.count, stats.mean, stats.m2)
+    if stats.window:
+        span = timedelta(days=stats.window - 1)
+        if not stats.count or stats.window_end is None:
+            # Empty window: start it at this day, with whatever earlier days it covers
+            running = RunningStats()
+            for total in totals_between(day - span, day - timedelta(days=1)):
+                running.add(total)
+            stats.window_end, before = day, None
+        elif day > stats.window_end:
+            old_start, new_start = stats.window_end - span, day - span
+            if new_start > stats.window_end:
+                running = RunningStats()  # the window moved past every day it held
+            else:
+                for total in totals_between(old_start, new_start - timedelta(days=1)):
+                    running.remove(total)
+            stats.window_end = day
+        elif _outside_window(stats, day):
+            return None
+
+    if before is not None:
+        running.remove(before)
+    score = None
+    if after is not None:
+        if running.count >= min_days():
+            score = (running.z_score(after), running.mean, running.std)
+        running.add(after)
+    stats.count, stats.mean, stats.m2 = running.count, running.mean, running.m2
+    return score
+
+
+def _outside_window(stats, day):
+    """True when `day` is older than the rolling window `stats` holds, so it is no longer scored there."""
+    return bool(stats.window and stats.count and stats.window_end is not None
+                and day < stats.window_end - timedelta(days=stats.window - 1))
+
+
+def _stats_rows(user_id):
+    rows = {stats.window: stats for stats in EmissionStats.objects.select_for_update().filter(user_id=user_id)}
+    missing = [EmissionStats(user_id=user_id, window=window) for window in WINDOWS if window not in rows]
+    if missing:
+        EmissionStats.objects.bulk_create(missing)
+        rows = {stats.window: stats for stats in EmissionStats.objects.select_for_update().filter(user_id=user_id)}
+    return [rows[window] for window in WINDOWS]
+
+
+def record_day_changes(changes):
+    """Updates the running statistics and anomaly flags for [(user id, day, total before, total after)]."""
+    threshold = z_threshold()
+    for user_id in {user_id for user_id, _, _, _ in changes}:
+        days = [(day, before, after) for changed_user, day, before, after in changes if changed_user == user_id]
+        with transaction.atomic():
+            stats_rows = _stats_rows(user_id)
+            flagged = []
+            rescored = {window: [] for window in WINDOWS}
+            for day, before, after in days:
+                for stats in stats_rows:
+                    if _outside_window(stats, day):
+                        continue  # its flag there still records how the day scored when it was in the window
+                    rescored[stats.window].append(day)
+                    score = observe(stats, day, before, after, _day_totals(user_id))
+                    if score and abs(score[0]) > threshold:
+                        flagged.append(_anomaly(user_id, stats.window, day, after, score))
+            EmissionStats.objects.bulk_update(stats_rows, ['count', 'mean', 'm2', 'window_end'])
+            # A rescored day's earlier flags no longer describe it
+            for window, rescored_days in rescored.items():
+                if rescored_days:
+                    EmissionAnomaly.objects.filter(user_id=user_id, window=window, date__in=rescored_days).delete()
+            EmissionAnomaly.objects.bulk_create(flagged)
+
+
+def _anomaly(user_id, window, day, total, score):
+    z_score, mean, std = score
+    return EmissionAnomaly(user_id=user_id, window=window, date=day, total_emission=round(total, 2),
+                           mean=round(mean, 2), std=round(std, 2), z_score=round(z_score, 2))
+
+
+def rebuild(user=None):
+    """
+    Recomputes one user's statistics and flags (user None: entries without a
+    user) from their daily rollups, scoring every day against the days before
+    it exactly as a replay through observe() would, but with numpy prefix sums
+    instead of a Python loop per day and window.
+    """
+    user_id = getattr(user, 'pk', user)
+    rows = list(rollups.series('day', user=user_id).values_list('start', 'total_emission'))
+    days = [day for day, _ in rows]
+    ordinals = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(rows))
+    totals = np.fromiter((total for _, total in rows), dtype=np.float64, count=len(rows))
+    # Shifting by the mean keeps the prefix sums of squares well conditioned
+    shift = totals.mean() if len(rows) else 0.0
+    values = totals - shift
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+    index = np.arange(len(rows))
+
+    threshold, minimum = z_threshold(), min_days()
+    stats_rows, flagged = [], []
+    for window in WINDOWS:
+        # Each day is scored against the days in [day - window + 1, day - 1]
+        first = np.searchsorted(ordinals, ordinals - (window - 1)) if window else np.zeros(len(rows), dtype=np.int64)
+        count = index - first
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = (sums[index] - sums[first]) / count
+            std = np.sqrt(np.maximum((squares[index] - squares[first]) / count - mean * mean, 0.0))
+            z = (values - mean) / np.maximum(std, RunningStats.MIN_STD)
+        for i in np.flatnonzero((count >= minimum) & (np.abs(z) > threshold)):
+            flagged.append(_anomaly(user_id, window, days[i], float(totals[i]),
+                                    (float(z[i]), float(mean[i] + shift), float(std[i]))))
+
+        stats = EmissionStats(user_id=user_id, window=window)
+        if len(rows):
+            held = values[first[-1]:] if window else values
+            stats.count, stats.mean = len(held), float(held.mean() + shift)
+            stats.m2 = float(((held - held.mean()) ** 2).sum())
+            if window:
+                stats.window_end = days[-1]
+        stats_rows.append(stats)
+
+    with transaction.atomic():
+        EmissionStats.objects.filter(user_id=user_id).delete()
+        EmissionAnomaly.objects.filter(user_id=user_id).delete()
+        EmissionStats.objects.bulk_create(stats_rows)
+        EmissionAnomaly.objects.bulk_create(flagged, batch_size=1000)
+    return len(flagged)
+
+
+def reset():
+    """Drops every user's statistics and flags, before rebuilding them all."""
+    EmissionStats.objects.all().delete()
+    EmissionAnomaly.objects.all().delete()
+
+
+def recent(window=30, limit=20, user=None):
+    """One user's latest anomalies for one window, newest first."""
+    return list(
+        EmissionAnomaly.objects.filter(user_id=getattr(user, 'pk', user), window=window)
+        .values('date', 'total_emission', 'z_score', 'mean', 'std')[:limit]
+    )
@@ -0,0 +1,163 @@
+"""
+Cached carbon dashboard data and trend chart.
+
+- Each user's 'carbon:<user id>' DataVersion gets a new token on every write
+  to their entries (and rollup rebuild), in the same transaction as the write
+- Dashboard numbers (including flagged anomalies) and the trend PNG are
+  cached in the Django cache under that token, so repeated loads cost one
+  version lookup and nothing is recomputed or re-rendered until the data
+  changes
+- With CARBON_CHART_PRERENDER the PNG for a new version is rendered on a
+  background thread as soon as the write commits, off the request thread
+"""
+import io
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+
+from ecoguard.metrics import timer
+
+from . import anomalies, rollups
+from .models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+DATA_VERSION_KEY = 'carbon'  # entries without a user; 'carbon:<user id>' for a user's entries
+
+# Beyond this many days with entries the trend chart shows weekly averages
+TREND_MAX_POINTS = 366
+
+_prerender_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='carbon-charts')
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def version_key(user=None):
+    user_id = _user_id(user)
+    return DATA_VERSION_KEY if user_id is None else f'{DATA_VERSION_KEY}:{user_id}'
+
+
+def data_version(user=None):
+    return DataVersion.objects.filter(key=version_key(user)).values_list('version', flat=True).first() or ''
+
+
+def bump_data_version(user=None):
+    """Gives a user's carbon data a new version token; cached charts for older tokens stop being used."""
+    key, token = version_key(user), uuid.uuid4().hex
+    if not DataVersion.objects.filter(key=key).update(version=token):
+        try:
+            with transaction.atomic():
+                DataVersion.objects.create(key=key, version=token)
+        except IntegrityError:
+            DataVersion.objects.filter(key=key).update(version=token)
+    if getattr(settings, 'CARBON_CHART_PRERENDER', False):
+        user_id = _user_id(user)
+        transaction.on_commit(lambda: _prerender_pool.submit(_prerender, user_id, token))
+    return token
+
+
+def cached(name, user, version, build):
+    """`build()`, cached under (name, user, data version) for CARBON_CHART_CACHE_SECONDS."""
+    key = f'carbon:{name}:{_user_id(user)}:{version}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, getattr(settings, 'CARBON_CHART_CACHE_SECONDS', 3600))
+    return value
+
+
+def trend_points(user=None):
+    """[(date, kg CO2e)] from the user's daily rollups, or weekly means per entry for long histories."""
+    days = rollups.series('day', user=user)
+    if days.count() > TREND_MAX_POINTS:
+        return [(row.start, round(row.total_emission / row.entries, 2)) for row in rollups.series('week', user=user)]
+    return [(day, round(total, 2)) for day, total in days.values_list('start', 'total_emission')]
+
+
+def dashboard_data(user=None):
+    """Everything the carbon dashboard shows that depends only on the user's stored data."""
+    today = date.today()
+
+    # Today's summary and category-wise emissions from today's rollup
+    today_rollup = rollups.series('day', today, today, user=user).first()
+    today_categories = {}
+    if today_rollup:
+        today_categories = {
+            'Transport': round(today_rollup.transport_emission, 2),
+            'Electricity': round(today_rollup.electricity_emission, 2),
+            'Food': round(today_rollup.food_emission, 2),
+            'Plastic': round(today_rollup.plastic_emission, 2),
+        }
+
+    # Last 7 days with entries
+    last_7 = list(rollups.series('day', user=user).order_by('-start').values_list('start', 'total_emission')[:7])[::-1]
+
+    # Days flagged by the streaming detector against the last CARBON_ANOMALY_WINDOW days
+    outliers = [
+        {**row, 'date': row['date'].isoformat()}
+        for row in anomalies.recent(getattr(settings, 'CARBON_ANOMALY_WINDOW', 30), user=user)
+    ]
+
+    return {
+        'total_emission_today': round(today_rollup.total_emission, 2) if today_rollup else None,
+        'today_categories': today_categories,
+        'trend_dates': [day.strftime('%a') for day, _ in last_7],
+        'trend_values': [round(total, 2) for _, total in last_7],
+        'outliers': outliers,
+    }
+
+
+def cached_dashboard_data(user=None, version=None):
+    version = data_version(user) if version is None else version
+    # Today's figures depend on the date as well as the data
+    return cached(f'dashboard:{date.today().isoformat()}', user, version, lambda: dashboard_data(user))
+
+
+def render_trend_png(points):
+    """The 'CO₂ Emission Trend' line chart as PNG bytes."""
+    # Figure objects instead of pyplot: nothing is kept in pyplot's global figure list,
+    # and rendering is safe off the request thread
+    from matplotlib.dates import DateFormatter
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot([day for day, _ in points], [value for _, value in points], marker='o')
+    ax.set_title('CO₂ Emission Trend')
+    ax.set_ylabel('kg CO₂e')
+    ax.xaxis.set_major_formatter(DateFormatter("%d-%b"))
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def trend_png(user=None, version=None):
+    """PNG bytes of the user's trend chart, or None when they have no entries."""
+    version = data_version(user) if version is None else version
+
+    def build():
+        points = trend_points(user)
+        if not points:
+            return b''
+        with timer('carbon.chart'):
+            return render_trend_png(points)
+
+    return cached('trend-png', user, version, build) or None
+
+
+def _prerender(user_id, version):
+    try:
+        trend_png(user_id, version)
+    except Exception:
+        logger.exception("Pre-rendering the carbon trend chart failed")
+    finally:
+        connection.close()  # this thread's own connection
@@ -0,0 +1,100 @@
+"""
+Emission factors (kg CO2e per unit of each input), read from the versioned
+EmissionFactor table.
+
+- The current factor set is loaded once per process and kept in `factor_cache`
+- Saving or deleting an EmissionFactor invalidates the cache in that process;
+  other processes pick the change up within CARBON_FACTOR_CACHE_SECONDS
+- Keys missing from the table fall back to DEFAULT_FACTORS, so a fresh
+  database computes the same values as before the table existed
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+# Factor keys: 'transport' (per km), 'electricity' (per kWh), 'plastic' (per gram),
+# 'food:<food_type>' (per day) and 'food:default' for any other food type
+DEFAULT_FACTORS = {
+    'transport': 0.12,
+    'electricity': 0.92,
+    'plastic': 0.0088,  # Assume 8.8g CO2e per gram plastic, example
+    'food:veg': 2.0,
+    'food:non-veg': 7.0,
+    'food:mixed': 4.5,
+    'food:default': 3.0,
+}
+
+
+class Factors:
+    """One immutable factor set; `version` is the highest EmissionFactor version it includes."""
+
+    def __init__(self, values, version=0):
+        self.values = dict(values)
+        self.version = version
+        self.transport = self.values['transport']
+        self.electricity = self.values['electricity']
+        self.plastic = self.values['plastic']
+        self.food_default = self.values['food:default']
+        self.food = {
+            key.split(':', 1)[1]: value for key, value in self.values.items()
+            if key.startswith('food:') and key != 'food:default'
+        }
+
+    def food_factor(self, food_type):
+        return self.food.get(food_type.lower(), self.food_default)
+
+    def replace(self, **overrides):
+        """A copy with some keys changed, e.g. replace(transport=0.05) or replace(**{'food:veg': 1.5})."""
+        return Factors({**self.values, **overrides}, self.version)
+
+    def __repr__(self):
+        return f"Factors(v{self.version}, {self.values})"
+
+
+def load_factors():
+    """Reads the latest version of every factor key from the database."""
+    from .models import EmissionFactor
+
+    values, version = dict(DEFAULT_FACTORS), 0
+    for key, value, row_version in EmissionFactor.objects.order_by('key', 'version').values_list(
+            'key', 'value', 'version'):
+        values[key] = value  # rows come in version order, so the last one per key wins
+        version = max(version, row_version)
+    return Factors(values, version)
+
+
+class FactorCache:
+    """Process-level cache of the current Factors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factors = None
+        self._loaded_at = 0.0
+
+    def get(self):
+        factors = self._factors
+        ttl = getattr(settings, 'CARBON_FACTOR_CACHE_SECONDS', 60)
+        if factors is not None and (ttl is None or time.monotonic() - self._loaded_at < ttl):
+            return factors
+        with self._lock:
+            if self._factors is factors:  # nobody reloaded while we waited
+                try:
+                    self._factors = load_factors()
+                except DatabaseError:
+                    # Table not migrated yet: keep serving the defaults (or the last good set)
+                    self._factors = factors or Factors(DEFAULT_FACTORS)
+                self._loaded_at = time.monotonic()
+            return self._factors
+
+    def invalidate(self):
+        with self._lock:
+            self._factors = None
+
+
+factor_cache = FactorCache()
+
+
+def current_factors():
+    return factor_cache.get()
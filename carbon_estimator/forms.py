@@ -7,7 +7,8 @@ class CarbonEntryForm(forms.ModelForm):
         fields = ['transport_km', 'electricity_kwh', 'food_type', 'plastic_grams']
         widgets = {
             'transport_km': forms.NumberInput(attrs={'min': 0, 'step': 0.1, 'class': 'form-control'}),
-            'electricity_kwh': forms.NumberInput(attrs={'min': 0, 'step': 0.1, 'class': 'form-control'}),
+            'electricity_kwh': forms.NumberInput(attrs={'min': 0, 'step': 0.1, 'class': 'form-control',
+                                                      'title': 'Usage your smart meters do not measure; their readings are added automatically'}),
             'food_type': forms.Select(choices=[('veg', 'Vegetarian'), ('non-veg', 'Non-Vegetarian'), ('mixed', 'Mixed')], attrs={'class': 'form-control'}),
             'plastic_grams': forms.NumberInput(attrs={'min': 0, 'step': 0.1, 'class': 'form-control'}),
         }
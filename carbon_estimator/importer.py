@@ -0,0 +1,162 @@
+"""
+Bulk import of a user's historical carbon entries from CSV.
+
+- The file is read row by row and validated and written in chunks of
+  CARBON_IMPORT_CHUNK_SIZE rows, so memory stays flat whatever its length
+- Each chunk is written with executemany() of an INSERT ... ON CONFLICT
+  (user, date) DO UPDATE, one statement per row, with the emission fields
+  computed for the whole chunk by calculator.py; a date that already has
+  an entry is overwritten
+- The CSV's electricity is the unmetered part, as on the dashboard form:
+  the kWh the user's meters reported for a day are added on top, so an
+  import never drops meter readings
+- Each chunk is committed on its own, so a long import never holds the
+  database's write lock for its whole length; rollups, anomaly statistics
+  and the chart data version are rebuilt once for the imported range at
+  the end, also when the import stops part-way through
+"""
+import csv
+import math
+import time
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import rollups
+from .calculator import INPUT_DTYPE, compute_from_inputs
+from .factors import current_factors
+from .models import CarbonEntry
+
+CSV_FIELDS = ('date', 'transport_km', 'electricity_kwh', 'food_type', 'plastic_grams')
+REQUIRED_FIELDS = ('date', 'transport_km', 'electricity_kwh', 'food_type')
+INPUT_FIELDS = ['transport_km', 'electricity_kwh', 'food_type', 'plastic_grams']
+
+# Errors reported back; later invalid rows are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class InvalidCSV(ValueError):
+    """The file as a whole cannot be imported (e.g. missing columns)."""
+
+
+def parse_row(row):
+    """(date, transport_km, electricity_kwh, food_type, plastic_grams) from one CSV row, or ValueError."""
+    try:
+        day = date.fromisoformat((row.get('date') or '').strip())
+    except ValueError:
+        raise ValueError(f"invalid date {row.get('date')!r}; expected YYYY-MM-DD")
+    values = []
+    for field in ('transport_km', 'electricity_kwh', 'plastic_grams'):
+        raw = (row.get(field) or '').strip()
+        if not raw and field == 'plastic_grams':
+            values.append(0.0)
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            raise ValueError(f"{field} must be a number, got {raw!r}")
+        if not value >= 0 or not math.isfinite(value):  # rejects nan and inf too
+            raise ValueError(f"{field} must be a finite number of zero or more, got {raw!r}")
+        values.append(value)
+    food_type = (row.get('food_type') or '').strip()
+    if not food_type or len(food_type) > 20:
+        raise ValueError("food_type must be 1-20 characters")
+    transport_km, electricity_kwh, plastic_grams = values
+    return day, transport_km, electricity_kwh, food_type, plastic_grams
+
+
+def import_csv(stream, user, chunk_size=None):
+    """
+    Imports a text-mode CSV stream with a header row (date, transport_km,
+    electricity_kwh, food_type and optionally plastic_grams) as `user`'s entries.
+
+    Returns {'rows', 'imported', 'invalid', 'errors': [{'line', 'error'}], 'first_date', 'last_date', 'seconds'}.
+    """
+    chunk_size = chunk_size or getattr(settings, 'CARBON_IMPORT_CHUNK_SIZE', 5000)
+    started = time.perf_counter()
+    reader = csv.DictReader(stream)
+    missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise InvalidCSV(f"Missing CSV column(s): {', '.join(missing)}")
+
+    factors = current_factors()
+    rows = imported = invalid = 0
+    errors, first, last = [], None, None
+    pending = {}  # date -> parsed row; a date repeated within a chunk keeps its last row
+    try:
+        for line, row in enumerate(reader, start=2):
+            rows += 1
+            try:
+                parsed = parse_row(row)
+            except ValueError as exc:
+                invalid += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line, 'error': str(exc)})
+                continue
+            pending[parsed[0]] = parsed
+            if len(pending) >= chunk_size:
+                imported += _write_chunk(user, pending, factors)
+                first, last = _extend(first, last, pending)
+                pending = {}
+        if pending:
+            imported += _write_chunk(user, pending, factors)
+            first, last = _extend(first, last, pending)
+    finally:
+        if first is not None:
+            # The chunk writes skip the signal handlers that keep these up to date
+            rollups.rebuild(since=first, user=user)
+
+    return {
+        'rows': rows,
+        'imported': imported,
+        'invalid': invalid,
+        'errors': errors,
+        'first_date': first.isoformat() if first else None,
+        'last_date': last.isoformat() if last else None,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _extend(first, last, pending):
+    days = list(pending)
+    low, high = min(days), max(days)
+    return (low if first is None else min(first, low)), (high if last is None else max(last, high))
+
+
+def _upsert_sql():
+    """INSERT ... ON CONFLICT (user, date) DO UPDATE for one entry (SQLite and PostgreSQL syntax)."""
+    qn = connection.ops.quote_name
+    columns = ['user_id', 'date', *INPUT_FIELDS, *CarbonEntry.EMISSION_FIELDS]
+    return (
+        f"INSERT INTO {qn(CarbonEntry._meta.db_table)} ({', '.join(qn(column) for column in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({qn('user_id')}, {qn('date')}) DO UPDATE SET "
+        + ', '.join(f"{qn(column)} = excluded.{qn(column)}" for column in columns[2:])
+    )
+
+
+def _write_chunk(user, pending, factors):
+    from .meters import metered_kwh_by_day  # meters imports this module
+
+    parsed = list(pending.values())
+    metered = metered_kwh_by_day(user.pk, min(pending), max(pending))
+    if metered:
+        parsed = [(day, km, kwh + metered.get(day, 0.0), food_type, grams)
+                  for day, km, kwh, food_type, grams in parsed]
+    inputs = np.empty(len(parsed), dtype=INPUT_DTYPE)
+    inputs['pk'] = 0
+    for name, column in zip(INPUT_FIELDS, list(zip(*parsed))[1:]):
+        inputs[name] = column
+    emissions = compute_from_inputs(inputs, factors)
+    # Plain parameter tuples through executemany(): building a model instance per
+    # row made bulk_create() the slowest part of a large import
+    emission_columns = [emissions[field].tolist() for field in CarbonEntry.EMISSION_FIELDS]
+    params = [
+        (user.pk, connection.ops.adapt_datefield_value(day), km, kwh, food_type, grams, *values)
+        for (day, km, kwh, food_type, grams), *values in zip(parsed, *emission_columns)
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(), params)
+    return len(params)
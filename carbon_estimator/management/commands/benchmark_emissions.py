@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from carbon_estimator.calculator import compute_emissions
+from carbon_estimator.factors import current_factors
+from carbon_estimator.models import CarbonEntry
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares per-instance CarbonEntry.calculate_emissions() with the vectorised calculator. "
+        "--rows N inserts N synthetic entries for the run and rolls them back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=0, help="Synthetic entries to insert (rolled back)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per query by the per-instance loop")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['rows']:
+                self._insert(options['rows'])
+            self._compare(CarbonEntry.objects.order_by('pk'), options['chunk_size'])
+            transaction.set_rollback(True)
+
+    def _insert(self, count, batch_size=10000):
+        rng = random.Random(0)
+        today = date.today()
+        food_types = ['veg', 'non-veg', 'mixed', 'Veg', 'vegan']
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            CarbonEntry.objects.bulk_create([
+                CarbonEntry(
+                    date=today - timedelta(days=i % 3650), transport_km=rng.uniform(0, 60),
+                    electricity_kwh=rng.uniform(0, 20), food_type=rng.choice(food_types),
+                    plastic_grams=rng.uniform(0, 400),
+                )
+                for i in range(offset, min(offset + batch_size, count))
+            ])
+        self.stdout.write(f"Inserted {count} synthetic entries in {time.perf_counter() - start:.1f}s")
+
+    def _compare(self, entries, chunk_size):
+        factors = current_factors()
+
+        start = time.perf_counter()
+        per_instance = [entry.calculate_emissions(factors) for entry in entries.iterator(chunk_size=chunk_size)]
+        instance_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorised = compute_emissions(entries, factors)['total_emission']
+        vector_seconds = time.perf_counter() - start
+
+        rows = len(per_instance)
+        difference = float(np.abs(np.array(per_instance) - vectorised).max()) if rows else 0.0
+        self.stdout.write(f"{'method':<24} {'seconds':>8} {'rows/s':>12}")
+        for name, seconds in (('calculate_emissions()', instance_seconds), ('vectorised', vector_seconds)):
+            self.stdout.write(f"{name:<24} {seconds:>8.2f} {rows / max(seconds, 1e-9):>12,.0f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rows} entries: {instance_seconds / max(vector_seconds, 1e-9):.1f}x faster, "
+            f"max difference {difference:.3f} kg CO2e"
+        ))
@@ -0,0 +1,55 @@
+import csv
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from carbon_estimator.importer import CSV_FIELDS, InvalidCSV, import_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a CSV of historical carbon entries (date, transport_km, electricity_kwh, food_type, "
+        "plastic_grams) for one user, overwriting entries on the same dates. "
+        "--generate N first writes N synthetic daily rows to the file, for benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username the entries belong to")
+        parser.add_argument('--chunk-size', type=int, help="Rows per upsert (default CARBON_IMPORT_CHUNK_SIZE)")
+        parser.add_argument('--generate', type=int, metavar='N', help="Write N synthetic rows to PATH first")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+        if options['generate']:
+            self._generate(options['path'], options['generate'])
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as fh:
+            try:
+                result = import_csv(fh, user, chunk_size=options['chunk_size'])
+            except InvalidCSV as exc:
+                raise CommandError(str(exc))
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} of {result['rows']} rows ({result['invalid']} invalid, "
+            f"{result['first_date']} to {result['last_date']}) in {result['seconds']:.2f}s"
+        ))
+
+    def _generate(self, path, count):
+        rng = random.Random(0)
+        first = date.today() - timedelta(days=count - 1)
+        with open(path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(CSV_FIELDS)
+            for i in range(count):
+                writer.writerow([
+                    (first + timedelta(days=i)).isoformat(), round(rng.uniform(0, 60), 1),
+                    round(rng.uniform(0, 20), 1), rng.choice(['veg', 'non-veg', 'mixed']),
+                    round(rng.uniform(0, 400), 1),
+                ])
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from carbon_estimator import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily, ISO-week and monthly EmissionRollup rows from CarbonEntry and replays them "
+        "through the anomaly detector, e.g. after entries were written with bulk_create() or update()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild periods containing this date (YYYY-MM-DD) or later")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = rollups.rebuild(since=options['since'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} rollup rows in {time.perf_counter() - start:.2f}s"
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from carbon_estimator import rollups
+from carbon_estimator.models import CarbonEntry, emission_expressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the stored emission totals and category values of every CarbonEntry from its inputs, "
+        "e.g. after rows were written with bulk_create()/update() or the factors changed, and rebuilds the rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only entries on or after this date (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        entries = CarbonEntry.objects.all()
+        if options['since']:
+            entries = entries.filter(date__gte=options['since'])
+        start = time.perf_counter()
+        updated = entries.update(**emission_expressions())
+        # update() bypasses the rollup signal handlers
+        rollups.rebuild(since=options['since'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed emissions for {updated} entries in {time.perf_counter() - start:.2f}s"
+        ))
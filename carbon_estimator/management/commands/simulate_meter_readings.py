@@ -0,0 +1,136 @@
+import json
+import math
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from carbon_estimator import meters
+from carbon_estimator.models import CarbonEntry, Meter
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulates smart meters sending NDJSON reading batches for one user and reports the sustained "
+        "readings/s. Batches go to meters.ingest() in-process and are rolled back afterwards (unless --keep), "
+        "or with --url are POSTed to a running server's /carbon-estimator/meter/readings/. "
+        "With --concurrent every meter sends from its own thread, as separate gateways would."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username the simulated meters belong to")
+        parser.add_argument('--meters', type=int, default=3)
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between one meter's readings")
+        parser.add_argument('--hours', type=float, default=24.0, help="Simulated time span, ending now")
+        parser.add_argument('--batch', type=int, default=1000, help="Readings per NDJSON batch")
+        parser.add_argument('--url', help="e.g. http://127.0.0.1:8000/carbon-estimator/meter/readings/")
+        parser.add_argument('--keep', action='store_true', help="Keep the in-process run's readings and entries")
+        parser.add_argument('--concurrent', action='store_true', help="Send each meter's batches from its own thread")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        if options['url']:
+            simulated = [Meter.objects.get_or_create(user=user, name=f'simulated-{i + 1}')[0]
+                         for i in range(options['meters'])]
+            self._run(simulated, options, self._post)
+            return
+        if options['concurrent']:
+            # Each thread writes on its own connection, which one outer transaction cannot roll back
+            if not options['keep']:
+                raise CommandError("An in-process --concurrent run keeps its readings; pass --keep as well")
+            simulated = [Meter.objects.create(user=user, name=f'simulated-{i + 1}') for i in range(options['meters'])]
+            self._run(simulated, options, self._ingest)
+            return
+        with transaction.atomic():
+            simulated = [Meter.objects.create(user=user, name=f'simulated-{i + 1}') for i in range(options['meters'])]
+            before = dict(CarbonEntry.objects.filter(user=user).values_list('date', 'electricity_kwh'))
+            generated = self._run(simulated, options, self._ingest)
+            after = dict(CarbonEntry.objects.filter(user=user).values_list('date', 'electricity_kwh'))
+            difference = max((abs(after.get(day, 0.0) - before.get(day, 0.0) - kwh) for day, kwh in generated.items()),
+                             default=0.0)
+            self.stdout.write(f"Daily electricity_kwh matches the readings within {difference:.6f} kWh")
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def _run(self, simulated, options, send):
+        """
+        Sends every meter's readings batch by batch, round-robin or with
+        --concurrent one thread per meter; returns the generated kWh per local day.
+        """
+        interval, per_batch = options['interval'], options['batch']
+        count = int(options['hours'] * 3600 / interval)
+        first = timezone.now() - timedelta(seconds=count * interval)
+        per_meter = [{} for _ in simulated]  # kWh per day; one dict per meter, as threads fill them
+        batches = [self._batches(number, first, interval, count, per_batch, per_meter[number])
+                   for number in range(len(simulated))]
+        started = time.perf_counter()
+        if options['concurrent']:
+            with ThreadPoolExecutor(max_workers=len(simulated)) as pool:
+                sent = sum(pool.map(lambda args: self._send_all(*args, options['url'], send),
+                                    zip(simulated, batches)))
+        else:
+            sent = 0
+            for round_batches in zip(*batches):
+                for meter, lines in zip(simulated, round_batches):
+                    self._send(meter, lines, options['url'], send)
+                    sent += len(lines)
+        seconds = time.perf_counter() - started
+        mode = f"{len(simulated)} concurrent meters" if options['concurrent'] else f"{len(simulated)} meters"
+        self.stdout.write(self.style.SUCCESS(
+            f"{sent} readings from {mode} in {seconds:.2f}s "
+            f"({sent / max(seconds, 1e-9):,.0f} readings/s, {per_batch} per batch)"
+        ))
+        generated = {}
+        for days in per_meter:
+            for day, kwh in days.items():
+                generated[day] = generated.get(day, 0.0) + kwh
+        return generated
+
+    def _batches(self, number, first, interval, count, per_batch, generated):
+        """One meter's NDJSON batches; adds their kWh to `generated` as they are built."""
+        rng = random.Random(number)
+        for offset in range(0, count, per_batch):
+            lines = []
+            for i in range(offset, min(offset + per_batch, count)):
+                timestamp = first + timedelta(seconds=(i + 1) * interval)
+                # Base load plus a daily cycle peaking in the evening, with noise
+                hour = timestamp.hour + timestamp.minute / 60
+                kw = 0.3 + 0.1 * number + 0.4 * max(math.sin((hour - 12) / 12 * math.pi), 0) + rng.uniform(0, 0.2)
+                kwh = round(kw * interval / 3600, 6)
+                day = timezone.localdate(timestamp)
+                generated[day] = generated.get(day, 0.0) + kwh
+                lines.append(json.dumps({'ts': timestamp.isoformat(), 'kwh': kwh}))
+            yield lines
+
+    def _send_all(self, meter, batches, url, send):
+        try:
+            return sum(self._send(meter, lines, url, send) for lines in batches)
+        finally:
+            connection.close()  # this thread's connection
+
+    def _send(self, meter, lines, url, send):
+        result = send(meter, lines, url)
+        if result['invalid']:
+            raise CommandError(f"Unexpected ingest result: {result}")
+        return len(lines)
+
+    def _ingest(self, meter, lines, url):
+        return meters.ingest(meter, lines)
+
+    def _post(self, meter, lines, url):
+        request = urllib.request.Request(
+            url, data='\n'.join(lines).encode(), method='POST',
+            headers={'Authorization': f'Bearer {meter.token}', 'Content-Type': 'application/x-ndjson'},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
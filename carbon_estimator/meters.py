@@ -0,0 +1,172 @@
+"""
+Smart-meter reading ingestion.
+
+- Meters POST newline-delimited JSON readings, one per line:
+  {"ts": "2026-10-17T08:00:05Z", "kwh": 0.0021}, where `kwh` is the energy
+  used since the meter's previous reading. `ts` may also be Unix seconds;
+  timestamps without an offset are in TIME_ZONE
+- The request body is read line by line into a buffer of
+  CARBON_METER_BATCH_SIZE readings. Each full buffer is written with one
+  bulk insert, in its own transaction, so a long stream neither builds up in
+  memory nor holds the database's write lock for its whole length
+- Readings a meter already sent (same timestamp) are skipped, so a gateway
+  can safely resend a batch after a timeout
+- The kWh of each buffer's new readings are added to the user's CarbonEntry
+  for each local day they fall on, with one save() per day rather than per
+  reading, so rollups, anomaly statistics and chart versions follow as for
+  any other entry write. A day without an entry gets one with no transport
+  or plastic and the food:default factor, until the user fills it in.
+  The dashboard form's electricity is the unmetered part: saving it adds
+  metered_kwh() back, so a form submission never drops readings
+"""
+import json
+import math
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .importer import MAX_REPORTED_ERRORS
+from .models import CarbonEntry, Meter, MeterReading
+
+
+def batch_size():
+    return getattr(settings, 'CARBON_METER_BATCH_SIZE', 2000)
+
+
+def meter_for_request(request):
+    """The Meter whose token is in the request's 'Authorization: Bearer <token>' header, or None."""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return Meter.objects.filter(token=token.strip()).first()
+
+
+def parse_reading(line):
+    """(aware timestamp, kWh) from one NDJSON line, or ValueError."""
+    try:
+        reading = json.loads(line)
+    except ValueError:
+        raise ValueError("not a JSON object")
+    if not isinstance(reading, dict):
+        raise ValueError("not a JSON object")
+    raw = reading.get('ts')
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool) and math.isfinite(raw):
+        try:
+            timestamp = datetime.fromtimestamp(raw, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):  # finite but outside the platform's range
+            raise ValueError(f"invalid ts {raw!r}; out of range")
+    elif isinstance(raw, str):
+        try:
+            timestamp = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"invalid ts {raw!r}; expected ISO 8601 or Unix seconds")
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+    else:
+        raise ValueError("missing ts")
+    kwh = reading.get('kwh')
+    if isinstance(kwh, bool) or not isinstance(kwh, (int, float)) or not kwh >= 0 or math.isinf(kwh):
+        raise ValueError(f"kwh must be a number of zero or more, got {kwh!r}")
+    return timestamp, float(kwh)
+
+
+def ingest(meter, lines, size=None):
+    """
+    Stores the NDJSON readings in `lines` (an iterable of str or bytes, e.g.
+    the request) for `meter` and adds them to its user's daily entries.
+
+    Returns {'readings', 'stored', 'duplicates', 'invalid', 'errors': [{'line', 'error'}], 'days', 'seconds'}.
+    """
+    size = size or batch_size()
+    started = time.perf_counter()
+    readings = stored = duplicates = invalid = 0
+    errors, days = [], set()
+    buffer = {}  # timestamp -> kWh; a timestamp repeated within a batch keeps its last reading
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        readings += 1
+        try:
+            timestamp, kwh = parse_reading(line)
+        except ValueError as exc:
+            invalid += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': number, 'error': str(exc)})
+            continue
+        buffer[timestamp] = kwh
+        if len(buffer) >= size:
+            written = _flush(meter, buffer, days)
+            stored, duplicates = stored + written, duplicates + len(buffer) - written
+            buffer = {}
+    if buffer:
+        written = _flush(meter, buffer, days)
+        stored, duplicates = stored + written, duplicates + len(buffer) - written
+
+    return {
+        'readings': readings,
+        'stored': stored,
+        'duplicates': duplicates,
+        'invalid': invalid,
+        'errors': errors,
+        'days': sorted(day.isoformat() for day in days),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _flush(meter, buffer, days):
+    """Writes one buffer of readings and folds the new ones into the daily entries; returns how many were new."""
+    with transaction.atomic():
+        # One writer per meter at a time, so a resent batch cannot be counted twice
+        Meter.objects.select_for_update().filter(pk=meter.pk).exists()
+        seen = set(
+            MeterReading.objects.filter(meter=meter, timestamp__range=(min(buffer), max(buffer)))
+            .values_list('timestamp', flat=True)
+        )
+        new = [(timestamp, kwh) for timestamp, kwh in buffer.items() if timestamp not in seen]
+        MeterReading.objects.bulk_create([MeterReading(meter=meter, timestamp=timestamp, kwh=kwh)
+                                          for timestamp, kwh in new])
+        day_kwh = {}
+        for timestamp, kwh in new:
+            day = timezone.localdate(timestamp)
+            day_kwh[day] = day_kwh.get(day, 0.0) + kwh
+        for day, kwh in sorted(day_kwh.items()):
+            add_electricity(meter.user_id, day, kwh)
+        days.update(day_kwh)
+    return len(new)
+
+
+def add_electricity(user_id, day, kwh):
+    """Adds `kwh` to the user's entry for `day`, creating the entry if there is none."""
+    with transaction.atomic():
+        entry, created = CarbonEntry.objects.select_for_update().get_or_create(
+            user_id=user_id, date=day,
+            defaults={'transport_km': 0.0, 'electricity_kwh': kwh, 'food_type': '', 'plastic_grams': 0.0},
+        )
+        if not created:
+            entry.electricity_kwh += kwh
+            entry.save(update_fields=['electricity_kwh'])
+    return entry
+
+
+def metered_kwh(user_id, day):
+    """kWh the user's meters have reported for the local day `day`."""
+    start, end = (timezone.make_aware(datetime.combine(d, dt_time.min)) for d in (day, day + timedelta(days=1)))
+    return MeterReading.objects.filter(
+        meter__user_id=user_id, timestamp__gte=start, timestamp__lt=end,
+    ).aggregate(total=Sum('kwh'))['total'] or 0.0
+
+
+def metered_kwh_by_day(user_id, first, last):
+    """{local day: kWh} the user's meters have reported from `first` to `last`, both included."""
+    start, end = (timezone.make_aware(datetime.combine(d, dt_time.min)) for d in (first, last + timedelta(days=1)))
+    rows = MeterReading.objects.filter(
+        meter__user_id=user_id, timestamp__gte=start, timestamp__lt=end,
+    ).annotate(day=TruncDate('timestamp', tzinfo=timezone.get_current_timezone()))
+    return {row['day']: row['total'] for row in rows.values('day').annotate(total=Sum('kwh'))}
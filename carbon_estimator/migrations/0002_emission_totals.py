@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+import datetime
+from django.db import migrations, models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Round
+
+
+def backfill_emissions(apps, schema_editor):
+    # Factors as of this migration, applied in one UPDATE
+    CarbonEntry = apps.get_model('carbon_estimator', 'CarbonEntry')
+    transport = F('transport_km') * 0.12
+    electricity = F('electricity_kwh') * 0.92
+    food = Case(
+        When(Q(food_type__iexact='veg'), then=Value(2.0)),
+        When(Q(food_type__iexact='non-veg'), then=Value(7.0)),
+        When(Q(food_type__iexact='mixed'), then=Value(4.5)),
+        default=Value(3.0),
+        output_field=models.FloatField(),
+    )
+    plastic = F('plastic_grams') * 0.0088
+    CarbonEntry.objects.update(
+        transport_emission=Round(transport, 2),
+        electricity_emission=Round(electricity, 2),
+        food_emission=food,
+        plastic_emission=Round(plastic, 2),
+        total_emission=Round(transport + electricity + food + plastic, 2),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carbon_estimator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carbonentry',
+            name='electricity_emission',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='carbonentry',
+            name='food_emission',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='carbonentry',
+            name='plastic_emission',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='carbonentry',
+            name='total_emission',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='carbonentry',
+            name='transport_emission',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='carbonentry',
+            name='date',
+            field=models.DateField(db_index=True, default=datetime.date.today),
+        ),
+        migrations.RunPython(backfill_emissions, migrations.RunPython.noop),
+    ]
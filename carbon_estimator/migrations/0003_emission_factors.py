@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:33
+
+from django.db import migrations, models
+
+# The factors that were hard-coded until now, stored as version 1
+INITIAL_FACTORS = [
+    ('transport', 0.12, 'km'),
+    ('electricity', 0.92, 'kWh'),
+    ('plastic', 0.0088, 'g'),
+    ('food:veg', 2.0, 'day'),
+    ('food:non-veg', 7.0, 'day'),
+    ('food:mixed', 4.5, 'day'),
+    ('food:default', 3.0, 'day'),
+]
+
+
+def seed_factors(apps, schema_editor):
+    EmissionFactor = apps.get_model('carbon_estimator', 'EmissionFactor')
+    EmissionFactor.objects.bulk_create([
+        EmissionFactor(key=key, value=value, unit=unit, version=1, note='Initial factors')
+        for key, value, unit in INITIAL_FACTORS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carbon_estimator', '0002_emission_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmissionFactor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('value', models.FloatField()),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('version', models.PositiveIntegerField(editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['key', '-version'],
+                'constraints': [models.UniqueConstraint(fields=('key', 'version'), name='unique_emission_factor_version')],
+            },
+        ),
+        migrations.RunPython(seed_factors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:42
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+EMISSION_FIELDS = ['transport_emission', 'electricity_emission', 'food_emission',
+                   'plastic_emission', 'total_emission']
+
+
+def build_rollups(apps, schema_editor):
+    CarbonEntry = apps.get_model('carbon_estimator', 'CarbonEntry')
+    EmissionRollup = apps.get_model('carbon_estimator', 'EmissionRollup')
+    for period, start in (('day', F('date')), ('week', TruncWeek('date')), ('month', TruncMonth('date'))):
+        rows = (
+            CarbonEntry.objects.annotate(start=start).values('start')
+            .annotate(count=Count('id'), **{f'sum_{field}': Sum(field) for field in EMISSION_FIELDS})
+            .order_by('start')
+        )
+        EmissionRollup.objects.bulk_create([
+            EmissionRollup(period=period, start=row['start'], entries=row['count'],
+                           **{field: row[f'sum_{field}'] for field in EMISSION_FIELDS})
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carbon_estimator', '0003_emission_factors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmissionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'ISO week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('entries', models.IntegerField(default=0)),
+                ('transport_emission', models.FloatField(default=0.0)),
+                ('electricity_emission', models.FloatField(default=0.0)),
+                ('food_emission', models.FloatField(default=0.0)),
+                ('plastic_emission', models.FloatField(default=0.0)),
+                ('total_emission', models.FloatField(default=0.0)),
+            ],
+            options={
+                'ordering': ['period', 'start'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'start'), name='unique_emission_rollup_period')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carbon_estimator', '0006_emission_anomalies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='emissionrollup',
+            name='unique_emission_rollup_period',
+        ),
+        migrations.AddField(
+            model_name='carbonentry',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='carbon_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='emissionrollup',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emission_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='carbonentry',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_carbon_entry_user_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='emissionrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'start'), name='unique_emission_rollup_period'),
+        ),
+    ]
@@ -1,21 +1,285 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, Max, Q, Value, When
+from django.db.models.functions import Round
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+import secrets
 from datetime import date
 
+from .factors import current_factors, factor_cache
+
+
+class EmissionFactor(models.Model):
+    """
+    One version of an emission factor. Factors are never edited in place:
+    adding a row with the same key supersedes the previous value, and the
+    highest version of each key is the one in use (see factors.py).
+    """
+    key = models.CharField(max_length=40)  # 'transport', 'electricity', 'plastic', 'food:<type>', 'food:default'
+    value = models.FloatField()  # kg CO2e per unit
+    unit = models.CharField(max_length=20, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+    version = models.PositiveIntegerField(editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['key', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'version'], name='unique_emission_factor_version'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.version is None:
+            # Versions are global, so the current factor set is identified by the highest one
+            latest = EmissionFactor.objects.aggregate(latest=Max('version'))['latest'] or 0
+            self.version = latest + 1
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.key} = {self.value} (v{self.version})"
+
+
+@receiver(post_save, sender=EmissionFactor)
+@receiver(post_delete, sender=EmissionFactor)
+def invalidate_emission_factors(sender, **kwargs):
+    factor_cache.invalidate()
+
+
 class CarbonEntry(models.Model):
-    date = models.DateField(default=date.today)
+    # Entries from before accounts were attached have no user
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='carbon_entries')
+    date = models.DateField(default=date.today, db_index=True)
     transport_km = models.FloatField()
     electricity_kwh = models.FloatField()
     food_type = models.CharField(max_length=20)  # 'veg', 'non-veg', 'mixed'
     plastic_grams = models.FloatField(default=0.0)  # Newly added field
 
-    def calculate_emissions(self):
-        transport_emission = self.transport_km * 0.12       # per km
-        electricity_emission = self.electricity_kwh * 0.92  # per kWh
-        food_emission = {
-            'veg': 2.0,
-            'non-veg': 7.0,
-            'mixed': 4.5
-        }.get(self.food_type.lower(), 3.0)
-        plastic_emission = self.plastic_grams * 0.0088  # Assume 8.8g CO2e per gram plastic, example
-
-        return round(transport_emission + electricity_emission + food_emission + plastic_emission, 2)
+    # Derived from the inputs above on every save() (and by `manage.py recompute_emissions`),
+    # so dashboards can sum and average emissions in the database
+    transport_emission = models.FloatField(default=0.0, editable=False)
+    electricity_emission = models.FloatField(default=0.0, editable=False)
+    food_emission = models.FloatField(default=0.0, editable=False)
+    plastic_emission = models.FloatField(default=0.0, editable=False)
+    total_emission = models.FloatField(default=0.0, editable=False)
+
+    EMISSION_FIELDS = ['transport_emission', 'electricity_emission', 'food_emission',
+                       'plastic_emission', 'total_emission']
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_carbon_entry_user_date'),
+        ]
+
+    def category_emissions(self, factors=None):
+        """kg CO2e per category, from the current inputs and factors."""
+        factors = factors or current_factors()
+        return {
+            'transport_emission': self.transport_km * factors.transport,
+            'electricity_emission': self.electricity_kwh * factors.electricity,
+            'food_emission': factors.food_factor(self.food_type),
+            'plastic_emission': self.plastic_grams * factors.plastic,
+        }
+
+    def calculate_emissions(self, factors=None):
+        return round(sum(self.category_emissions(factors).values()), 2)
+
+    def refresh_emissions(self):
+        """Recomputes the stored emission fields from the inputs (does not save)."""
+        emissions = self.category_emissions()
+        for field, value in emissions.items():
+            setattr(self, field, round(value, 2))
+        self.total_emission = round(sum(emissions.values()), 2)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        entry = super().from_db(db, field_names, values)
+        # What this row currently adds to the rollups, so a later save only applies the difference
+        entry._rollup_state = None if entry.get_deferred_fields() else entry.rollup_state()
+        return entry
+
+    def rollup_state(self):
+        """(user id, date, emission values) this entry contributes to the EmissionRollup sums."""
+        return self.user_id, self.date, {field: getattr(self, field) for field in self.EMISSION_FIELDS}
+
+    def save(self, *args, **kwargs):
+        self.refresh_emissions()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(self.EMISSION_FIELDS)
+        super().save(*args, **kwargs)
+
+
+class EmissionRollup(models.Model):
+    """Sum of the stored emissions of one user's entries in one day, ISO week or month (see rollups.py)."""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'ISO week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='emission_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    start = models.DateField()  # the day itself, the Monday of the week or the 1st of the month
+    entries = models.IntegerField(default=0)
+    transport_emission = models.FloatField(default=0.0)
+    electricity_emission = models.FloatField(default=0.0)
+    food_emission = models.FloatField(default=0.0)
+    plastic_emission = models.FloatField(default=0.0)
+    total_emission = models.FloatField(default=0.0)
+
+    class Meta:
+        ordering = ['period', 'start']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'start'], name='unique_emission_rollup_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.start}: {self.total_emission:.2f} kg CO2e ({self.entries} entries)"
+
+
+class DataVersion(models.Model):
+    """Token replaced on every write to some data; caches derived from that data are keyed by it (see charts.py)."""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class EmissionStats(models.Model):
+    """
+    Running (Welford) statistics of daily totals, over all time (window 0) or
+    the last `window` days up to `window_end`. Kept per user; user is None for
+    the statistics of all entries.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='emission_stats')
+    window = models.PositiveSmallIntegerField()  # days; 0 = all time
+    count = models.IntegerField(default=0)
+    mean = models.FloatField(default=0.0)
+    m2 = models.FloatField(default=0.0)  # sum of squared deviations from the mean
+    window_end = models.DateField(null=True, blank=True)  # latest day seen
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'window'], name='unique_emission_stats_window'),
+        ]
+
+    def __str__(self):
+        return f"{self.user or 'all'} / {self.window or 'all-time'}: n={self.count} mean={self.mean:.2f}"
+
+
+class EmissionAnomaly(models.Model):
+    """A day whose total was more than CARBON_ANOMALY_Z standard deviations from the window's other days."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE,
+                             related_name='emission_anomalies')
+    date = models.DateField()
+    window = models.PositiveSmallIntegerField()  # days; 0 = all time
+    total_emission = models.FloatField()
+    mean = models.FloatField()  # of the window, without this day
+    std = models.FloatField()
+    z_score = models.FloatField()
+    detected_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'window', 'date'], name='unique_emission_anomaly_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.total_emission:.2f} kg CO2e (z={self.z_score:.1f}, window {self.window or 'all'})"
+
+
+
+def new_meter_token():
+    return secrets.token_hex(20)
+
+
+class Meter(models.Model):
+    """A smart meter whose readings are added to its user's daily electricity_kwh (see meters.py)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meters')
+    name = models.CharField(max_length=100)
+    # Sent by the meter as 'Authorization: Bearer <token>'
+    token = models.CharField(max_length=64, unique=True, default=new_meter_token, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+
+class MeterReading(models.Model):
+    """Energy a meter measured in the interval ending at `timestamp`."""
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='readings')
+    timestamp = models.DateTimeField()
+    kwh = models.FloatField()  # used since the meter's previous reading
+
+    class Meta:
+        constraints = [
+            # Also the index the duplicate check of each ingested batch uses
+            models.UniqueConstraint(fields=['meter', 'timestamp'], name='unique_meter_reading_timestamp'),
+        ]
+
+    def __str__(self):
+        return f"{self.meter_id} @ {self.timestamp}: {self.kwh} kWh"
+
+
+@receiver(pre_save, sender=CarbonEntry)
+def remember_rollup_state(sender, instance, **kwargs):
+    if instance.pk is not None and getattr(instance, '_rollup_state', None) is None:
+        # Not loaded from the database (or loaded with deferred fields): read what is stored now
+        stored = (CarbonEntry.objects.filter(pk=instance.pk)
+                  .values_list('user_id', 'date', *CarbonEntry.EMISSION_FIELDS).first())
+        instance._rollup_state = stored and (stored[0], stored[1], dict(zip(CarbonEntry.EMISSION_FIELDS, stored[2:])))
+    elif instance.pk is None:
+        instance._rollup_state = None
+
+
+@receiver(post_save, sender=CarbonEntry)
+def update_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        from .rollups import entry_saved
+        _entry_changed(entry_saved(instance))
+
+
+@receiver(post_delete, sender=CarbonEntry)
+def remove_from_rollups(sender, instance, **kwargs):
+    from .rollups import entry_deleted
+    _entry_changed(entry_deleted(instance))
+
+
+def _entry_changed(changes):
+    from .anomalies import record_day_changes
+    from .charts import bump_data_version
+    record_day_changes(changes)
+    for user_id in {user_id for user_id, _, _, _ in changes}:
+        bump_data_version(user_id)
+
+
+def emission_expressions(factors=None):
+    """
+    The emission fields as database expressions of the inputs, so
+    CarbonEntry.objects.update(**emission_expressions()) recomputes any
+    number of rows in a single UPDATE.
+    """
+    factors = factors or current_factors()
+    transport = F('transport_km') * factors.transport
+    electricity = F('electricity_kwh') * factors.electricity
+    food = Case(
+        *[When(Q(food_type__iexact=food_type), then=Value(factor)) for food_type, factor in factors.food.items()],
+        default=Value(factors.food_default),
+        output_field=models.FloatField(),
+    )
+    plastic = F('plastic_grams') * factors.plastic
+    return {
+        'transport_emission': Round(transport, 2),
+        'electricity_emission': Round(electricity, 2),
+        'food_emission': Round(food, 2),
+        'plastic_emission': Round(plastic, 2),
+        'total_emission': Round(transport + electricity + food + plastic, 2),
+    }
@@ -0,0 +1,173 @@
+"""
+Per-user, per-day, ISO-week and month sums of the stored CarbonEntry emissions.
+
+- EmissionRollup rows are adjusted by the CarbonEntry post_save/post_delete
+  handlers, so a write touches three rollup rows instead of charts
+  re-aggregating the whole history
+- bulk_create() and queryset update() skip those signals: follow them with
+  rebuild() (`manage.py rebuild_carbon_rollups`, which recompute_emissions
+  runs for you)
+"""
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import CarbonEntry, EmissionRollup
+
+EMISSION_FIELDS = CarbonEntry.EMISSION_FIELDS
+
+PERIODS = {
+    'day': lambda day: day,
+    'week': lambda day: day - timedelta(days=day.weekday()),  # ISO weeks start on Monday
+    'month': lambda day: day.replace(day=1),
+}
+
+# How each period's start is computed in the database, for rebuild()
+PERIOD_EXPRESSIONS = {
+    'day': lambda: F('date'),
+    'week': lambda: TruncWeek('date'),
+    'month': lambda: TruncMonth('date'),
+}
+
+
+def period_start(period, day):
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return PERIODS[period](day)
+
+
+def _apply(user_id, day, values, entries):
+    """Adds `values` (per emission field) and `entries` to the user's rollups covering `day`."""
+    increments = {field: F(field) + values[field] for field in EMISSION_FIELDS}
+    with transaction.atomic():
+        for period in PERIODS:
+            start = period_start(period, day)
+            rows = EmissionRollup.objects.filter(user_id=user_id, period=period, start=start)
+            if not rows.update(entries=F('entries') + entries, **increments):
+                try:
+                    with transaction.atomic():
+                        EmissionRollup.objects.create(user_id=user_id, period=period, start=start,
+                                                      entries=entries, **values)
+                except IntegrityError:
+                    # Another writer created the row first
+                    rows.update(entries=F('entries') + entries, **increments)
+            if entries < 0:
+                rows.filter(entries__lte=0).delete()
+
+
+def entry_saved(entry):
+    """Applies a saved entry to the rollups; returns its day changes (see day_changes())."""
+    old, new = entry._rollup_state, entry.rollup_state()
+    changes = {}
+    if old is not None and old[0] == new[0] and period_start('day', old[1]) == period_start('day', new[1]):
+        difference = {field: new[2][field] - old[2][field] for field in EMISSION_FIELDS}
+        _apply(new[0], new[1], difference, 0)
+        changes[new[0], period_start('day', new[1])] = (0, difference['total_emission'])
+    else:
+        if old is not None:
+            _apply(old[0], old[1], {field: -value for field, value in old[2].items()}, -1)
+            changes[old[0], period_start('day', old[1])] = (-1, -old[2]['total_emission'])
+        _apply(new[0], new[1], new[2], 1)
+        changes[new[0], period_start('day', new[1])] = (1, new[2]['total_emission'])
+    entry._rollup_state = new
+    return day_changes(changes)
+
+
+def entry_deleted(entry):
+    user_id, day, values = entry._rollup_state or entry.rollup_state()
+    _apply(user_id, day, {field: -value for field, value in values.items()}, -1)
+    return day_changes({(user_id, period_start('day', day)): (-1, -values['total_emission'])})
+
+
+def day_changes(changes):
+    """
+    Turns {(user id, day): (entries added, total added)} into
+    [(user id, day, total before, total after)] from the updated daily
+    rollups; a total is None when the day had no entries.
+    """
+    result = []
+    for user_id, day in sorted(changes, key=lambda key: (key[0] or 0, key[1])):
+        added_entries, added_total = changes[user_id, day]
+        entries, after = EmissionRollup.objects.filter(
+            user_id=user_id, period='day', start=day,
+        ).values_list('entries', 'total_emission').first() or (0, None)
+        before = (after or 0.0) - added_total if entries - added_entries > 0 else None
+        result.append((user_id, day, before, after))
+    return result
+
+
+def rebuild(since=None, user=None):
+    """
+    Recomputes the rollups from CarbonEntry with one GROUP BY per period,
+    for every user or only `user` (a User or id).
+    With `since`, only periods that contain days on or after it are replaced.
+    """
+    from . import anomalies
+    from .charts import bump_data_version
+
+    user_id = getattr(user, 'pk', user)
+    created = 0
+    with transaction.atomic():
+        for period in PERIODS:
+            rollups = EmissionRollup.objects.filter(period=period)
+            entries = CarbonEntry.objects.all()
+            if user is not None:
+                rollups, entries = rollups.filter(user_id=user_id), entries.filter(user_id=user_id)
+            if since is not None:
+                first = period_start(period, since)
+                rollups = rollups.filter(start__gte=first)
+                entries = entries.filter(date__gte=first)
+            rollups.delete()
+            created += _insert_grouped(period, entries)
+        if user is None:
+            anomalies.reset()
+        for rebuilt_user in [user_id] if user is not None else users():
+            anomalies.rebuild(rebuilt_user)
+            bump_data_version(rebuilt_user)
+    return created
+
+
+def _insert_grouped(period, entries):
+    """
+    Inserts the rollups of `entries` for one period with a single
+    INSERT ... SELECT over the GROUP BY query, so no rows pass through Python.
+    """
+    rows = (
+        entries.annotate(start=PERIOD_EXPRESSIONS[period]())
+        .values('user_id', 'start')
+        .annotate(count=Count('id'), **{f'sum_{field}': Sum(field) for field in EMISSION_FIELDS})
+        .order_by()
+    )
+    sql, params = rows.query.sql_with_params()
+    qn = connection.ops.quote_name
+    columns = ['user_id', 'period', 'start', 'entries', *EMISSION_FIELDS]
+    names = ['user_id', 'start', 'count', *[f'sum_{field}' for field in EMISSION_FIELDS]]
+    selected = [f'grouped.{qn(name)}' for name in names]
+    selected.insert(1, '%s')  # period
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(EmissionRollup._meta.db_table)} ({', '.join(qn(column) for column in columns)}) "
+            f"SELECT {', '.join(selected)} FROM ({sql}) grouped",
+            (period, *params),
+        )
+        return cursor.rowcount
+
+
+def users():
+    """Ids of the users with rollups (None for entries without a user)."""
+    return list(EmissionRollup.objects.filter(period='month').values_list('user_id', flat=True)
+                .distinct().order_by('user_id'))
+
+
+def series(period, start=None, end=None, user=None):
+    """One user's rollup rows of one period between `start` and `end` (inclusive), oldest first."""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {sorted(PERIODS)}")
+    rows = EmissionRollup.objects.filter(user_id=getattr(user, 'pk', user), period=period)
+    if start is not None:
+        rows = rows.filter(start__gte=period_start(period, start))
+    if end is not None:
+        rows = rows.filter(start__lte=end)
+    return rows.order_by('start')
@@ -0,0 +1,266 @@
+"""
+What-if scenarios for a user's daily emissions, e.g. "30% less driving and
+vegetarian four days a week".
+
+- The baseline is the user's entries of the last `days` days (or one
+  explicit day of inputs), computed with calculator.compute_from_inputs()
+  under the current factors or overrides through Factors.replace()
+- Levers: 'transport', 'electricity' and 'plastic' scale those inputs
+  (1.0 = unchanged); 'veg_days' is the number of vegetarian days a week
+- Each lever is a list of values, a {"min", "max", "steps"} range or a
+  distribution ({"dist": "uniform", "low", "high"}, {"dist": "normal",
+  "mean", "std"}, {"dist": "triangular", "low", "mode", "high"})
+- With only lists and ranges, every combination is evaluated at once by
+  broadcasting one axis per lever against the baseline's mean day. With a
+  distribution, `samples` Monte Carlo scenarios each draw every lever and
+  a baseline day, so the spread includes day-to-day variation
+- Results: summary statistics of kg CO2e per day, the best combination
+  (grid only) and the levers ranked by how much each reduces emissions on
+  its own
+"""
+import math
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .calculator import INPUT_DTYPE, compute_from_inputs, load_inputs
+from .factors import DEFAULT_FACTORS, current_factors
+from .models import CarbonEntry
+
+# Lever -> the emission category it scales
+MULTIPLIER_LEVERS = {
+    'transport': 'transport_emission',
+    'electricity': 'electricity_emission',
+    'plastic': 'plastic_emission',
+}
+LEVERS = (*MULTIPLIER_LEVERS, 'veg_days')
+DISTRIBUTIONS = {
+    'uniform': ('low', 'high'),
+    'normal': ('mean', 'std'),
+    'triangular': ('low', 'mode', 'high'),
+}
+PERCENTILES = (5, 50, 95)
+MAX_BASELINE_DAYS = 3660  # about ten years of entries
+
+
+class ScenarioError(ValueError):
+    """The scenario request cannot be evaluated (bad levers, no baseline, too many combinations)."""
+
+
+def max_scenarios():
+    return getattr(settings, 'CARBON_SCENARIO_MAX', 5_000_000)
+
+
+class Baseline:
+    """Per-day emission categories of the days scenarios start from."""
+
+    def __init__(self, records, factors):
+        emissions = compute_from_inputs(records, factors)
+        self.days = len(records)
+        self.categories = {field: emissions[field] for field in MULTIPLIER_LEVERS.values()}
+        self.total = emissions['total_emission']
+        self.veg_factor = factors.food_factor('veg')
+        is_veg = np.array([food_type.lower() == 'veg' for food_type in records['food_type']], dtype=bool)
+        self.veg_days = 7 * float(is_veg.mean())
+        # Food on the days that are not vegetarian; what a non-veg day costs under the scenario
+        other = emissions['food_emission'][~is_veg]
+        self.other_food = other if len(other) else np.array([self.veg_factor])
+
+    def means(self):
+        return {field: float(values.mean()) for field, values in self.categories.items()}
+
+
+def load_baseline(user, days=30, inputs=None, factors=None):
+    """The user's entries of the last `days` days, or one day of explicit `inputs`, as a Baseline."""
+    factors = factors or current_factors()
+    if inputs is None:
+        if not 1 <= days <= MAX_BASELINE_DAYS:
+            raise ScenarioError(f"days must be between 1 and {MAX_BASELINE_DAYS}.")
+        since = date.today() - timedelta(days=days - 1)
+        records = load_inputs(CarbonEntry.objects.filter(user_id=getattr(user, 'pk', user), date__gte=since))
+        if not len(records):
+            raise ScenarioError(f"No entries in the last {days} days; pass a baseline.")
+    else:
+        records = np.array([(0, *_baseline_values(inputs))], dtype=INPUT_DTYPE)
+    return Baseline(records, factors)
+
+
+def _baseline_values(inputs):
+    if not isinstance(inputs, dict):
+        raise ScenarioError("baseline must be an object of transport_km, electricity_kwh, food_type, plastic_grams.")
+    values = []
+    for field in ('transport_km', 'electricity_kwh', 'food_type', 'plastic_grams'):
+        value = inputs.get(field, 0.0 if field == 'plastic_grams' else None)
+        if field == 'food_type':
+            if not isinstance(value, str) or not value.strip():
+                raise ScenarioError("baseline food_type must be a non-empty string.")
+            value = value.strip()
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value < math.inf:
+            raise ScenarioError(f"baseline {field} must be a number of zero or more.")
+        values.append(value)
+    return values
+
+
+def lever_values(name, spec, neutral):
+    """
+    A lever spec as ('grid', array of values) or ('dist', sampler(rng, n));
+    a missing spec keeps the baseline (`neutral`).
+    """
+    upper = 7.0 if name == 'veg_days' else np.inf
+    if spec is None:
+        return 'grid', np.array([neutral])
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        spec = [spec]
+    if isinstance(spec, list):
+        values = _numbers(name, spec)
+    elif isinstance(spec, dict) and 'dist' in spec:
+        kind = spec['dist']
+        if kind not in DISTRIBUTIONS:
+            raise ScenarioError(f"{name}: unknown dist {kind!r}; expected one of {', '.join(DISTRIBUTIONS)}.")
+        params = _numbers(name, [spec.get(key) for key in DISTRIBUTIONS[kind]])
+        draw = getattr(np.random.Generator, kind)
+        try:
+            draw(np.random.default_rng(0), *params, 1)
+        except ValueError as exc:
+            raise ScenarioError(f"{name}: {exc}")
+        return 'dist', lambda rng, n: np.clip(draw(rng, *params, n), 0.0, upper)
+    elif isinstance(spec, dict):
+        low, high, steps = _numbers(name, [spec.get('min'), spec.get('max'), spec.get('steps', 11)])
+        if steps < 1 or high < low:
+            raise ScenarioError(f"{name}: need min <= max and steps >= 1.")
+        # Checked before linspace() allocates the axis; simulate() checks the product of all axes
+        if steps > max_scenarios():
+            raise ScenarioError(f"{name}: steps is more than CARBON_SCENARIO_MAX ({max_scenarios()}).")
+        values = np.linspace(low, high, int(steps))
+    else:
+        raise ScenarioError(f"{name}: expected a list of values, a min/max/steps range or a dist.")
+    if (values < 0).any() or (values > upper).any():
+        raise ScenarioError(f"{name}: values must be between 0 and {upper:g}.")
+    return 'grid', values
+
+
+def _numbers(name, values):
+    if not values or any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in values):
+        raise ScenarioError(f"{name}: expected numbers.")
+    values = np.asarray(values, dtype=np.float64)
+    if not np.isfinite(values).all():
+        raise ScenarioError(f"{name}: values must be finite numbers.")
+    return values
+
+
+def _expected(baseline, means, levers):
+    """Expected kg CO2e per day for lever values that broadcast against each other."""
+    share = levers['veg_days'] / 7
+    food = share * baseline.veg_factor + (1 - share) * float(baseline.other_food.mean())
+    return food + sum(levers[lever] * means[field] for lever, field in MULTIPLIER_LEVERS.items())
+
+
+def simulate(baseline, specs, samples=None, target=None, seed=None):
+    """Evaluates the lever specs (see lever_values()) against `baseline`; returns the summary."""
+    started = time.perf_counter()
+    neutral = {**{lever: 1.0 for lever in MULTIPLIER_LEVERS}, 'veg_days': baseline.veg_days}
+    levers = {lever: lever_values(lever, specs.get(lever), neutral[lever]) for lever in LEVERS}
+    means = baseline.means()
+    baseline_total = float(baseline.total.mean())
+    rng = np.random.default_rng(seed)
+
+    if all(kind == 'grid' for kind, _ in levers.values()):
+        mode = 'grid'
+        shape = tuple(len(values) for _, values in levers.values())
+        count = math.prod(shape)  # Python ints: np.prod() wraps around in int64 for huge grids
+        if count > max_scenarios():
+            raise ScenarioError(f"{count} combinations is more than CARBON_SCENARIO_MAX ({max_scenarios()}).")
+        # One axis per lever, so the sum broadcasts to every combination
+        axes = {
+            lever: values.reshape([-1 if i == axis else 1 for i in range(len(LEVERS))])
+            for axis, (lever, (_, values)) in enumerate(levers.items())
+        }
+        totals = _expected(baseline, means, axes).ravel()
+        best = np.unravel_index(int(totals.argmin()), shape)
+        best = {
+            'levers': {lever: float(values[i]) for (lever, (_, values)), i in zip(levers.items(), best)},
+            'kg_per_day': round(float(totals.min()), 3),
+        }
+        favourable = {lever: (values.max() if lever == 'veg_days' else values.min())
+                      for lever, (_, values) in levers.items()}
+    else:
+        mode = 'monte_carlo'
+        count = int(samples or getattr(settings, 'CARBON_SCENARIO_SAMPLES', 100_000))
+        if not 1 <= count <= max_scenarios():
+            raise ScenarioError(f"samples must be between 1 and CARBON_SCENARIO_MAX ({max_scenarios()}).")
+        drawn = {
+            lever: values(rng, count) if kind == 'dist' else rng.choice(values, count)
+            for lever, (kind, values) in levers.items()
+        }
+        day = rng.integers(baseline.days, size=count)
+        veg = rng.random(count) < drawn['veg_days'] / 7
+        other = baseline.other_food[rng.integers(len(baseline.other_food), size=count)]
+        totals = np.where(veg, baseline.veg_factor, other)
+        for lever, field in MULTIPLIER_LEVERS.items():
+            totals += drawn[lever] * baseline.categories[field][day]
+        best = None
+        favourable = {lever: float(np.percentile(values, 95 if lever == 'veg_days' else 5))
+                      for lever, values in drawn.items()}
+
+    ranking = []
+    for lever in (lever for lever in LEVERS if lever in specs):
+        alone = _expected(baseline, means, {**neutral, lever: favourable[lever]})
+        ranking.append({
+            'lever': lever,
+            'value': round(float(favourable[lever]), 3),
+            'kg_per_day': round(baseline_total - alone, 3),
+            'percent': round(100 * (baseline_total - alone) / baseline_total, 1) if baseline_total else 0.0,
+        })
+    ranking.sort(key=lambda row: row['kg_per_day'], reverse=True)
+
+    result = {
+        'mode': mode,
+        'scenarios': count,
+        'baseline_days': baseline.days,
+        'baseline_kg_per_day': round(baseline_total, 3),
+        'mean': round(float(totals.mean()), 3),
+        'std': round(float(totals.std()), 3),
+        'min': round(float(totals.min()), 3),
+        'max': round(float(totals.max()), 3),
+        **{f'p{q}': round(float(value), 3) for q, value in zip(PERCENTILES, np.percentile(totals, PERCENTILES))},
+        'best': best,
+        'levers': ranking,
+    }
+    if target is not None:
+        result['probability_below_target'] = round(float((totals < target).mean()), 4)
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run(data, user):
+    """
+    Evaluates one scenario request: {"levers": {...}, "days": 30,
+    "baseline": {...}, "factors": {"electricity": 0.4}, "samples", "target", "seed"}.
+    """
+    if not isinstance(data, dict):
+        raise ScenarioError("Expected a JSON object.")
+    specs = data.get('levers') or {}
+    if not isinstance(specs, dict) or set(specs) - set(LEVERS):
+        raise ScenarioError(f"levers must be an object with keys from {', '.join(LEVERS)}.")
+    overrides = data.get('factors') or {}
+    if not isinstance(overrides, dict) or any(
+        (key not in DEFAULT_FACTORS and not key.startswith('food:'))
+        or isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value < math.inf
+        for key, value in overrides.items()
+    ):
+        raise ScenarioError("factors must map factor keys (e.g. 'electricity', 'food:veg') to numbers.")
+    days, samples, target, seed = (data.get(key) for key in ('days', 'samples', 'target', 'seed'))
+    for key, value, low in (('days', days, 1), ('samples', samples, 1), ('seed', seed, 0)):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < low):
+            raise ScenarioError(f"{key} must be an integer of at least {low}.")
+    if days is not None and days > MAX_BASELINE_DAYS:
+        raise ScenarioError(f"days must be at most {MAX_BASELINE_DAYS}.")
+    if target is not None and (isinstance(target, bool) or not isinstance(target, (int, float))
+                               or not math.isfinite(target)):
+        raise ScenarioError("target must be a number (kg CO2e per day).")
+
+    factors = current_factors().replace(**overrides)
+    baseline = load_baseline(user, days or 30, data.get('baseline'), factors)
+    return simulate(baseline, specs, samples=samples, target=target, seed=seed)
@@ -0,0 +1,236 @@
+import io
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import importer, meters, rollups, scenarios
+from .models import CarbonEntry, EmissionAnomaly, EmissionRollup, Meter
+from .utils import RunningStats, detect_outliers_zscore
+
+
+class RunningStatsTests(SimpleTestCase):
+    def test_add_matches_numpy(self):
+        values = [3.0, 7.5, 1.25, 9.0, 4.0]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertEqual(stats.count, len(values))
+        self.assertAlmostEqual(stats.mean, np.mean(values))
+        self.assertAlmostEqual(stats.std, np.std(values))
+
+    def test_remove_undoes_add(self):
+        stats = RunningStats()
+        for value in [3.0, 7.5, 1.25, 9.0, 4.0]:
+            stats.add(value)
+        stats.remove(3.0)
+        stats.remove(9.0)
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.mean, np.mean([7.5, 1.25, 4.0]))
+        self.assertAlmostEqual(stats.std, np.std([7.5, 1.25, 4.0]))
+
+    def test_remove_last_value_empties(self):
+        stats = RunningStats()
+        stats.add(5.0)
+        stats.remove(5.0)
+        self.assertEqual((stats.count, stats.mean, stats.m2, stats.std), (0, 0.0, 0.0, 0.0))
+
+    def test_z_score_after_identical_values_is_finite(self):
+        stats = RunningStats()
+        for _ in range(5):
+            stats.add(2.0)
+        self.assertEqual(stats.z_score(3.0), 1.0 / RunningStats.MIN_STD)
+
+
+class DetectOutliersTests(SimpleTestCase):
+    def test_identical_values_have_no_outliers(self):
+        self.assertEqual(detect_outliers_zscore([4.0] * 10), [])
+
+    def test_too_few_values(self):
+        self.assertEqual(detect_outliers_zscore([4.0]), [])
+
+    def test_flags_far_value(self):
+        self.assertEqual(detect_outliers_zscore([1.0] * 10 + [50.0]), [50.0])
+
+
+def _entry(user, day, transport_km):
+    return CarbonEntry.objects.create(user=user, date=day, transport_km=transport_km,
+                                      electricity_kwh=2.0, food_type='veg', plastic_grams=10.0)
+
+
+def _rollup_rows():
+    return sorted(
+        (row.user_id, row.period, row.start, row.entries, round(row.total_emission, 6))
+        for row in EmissionRollup.objects.all()
+    )
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('rollups')
+        self.start = date(2026, 1, 26)  # a Monday; the entries span two months and several ISO weeks
+        self.entries = [_entry(self.user, self.start + timedelta(days=i), 5.0 + i) for i in range(14)]
+
+    def assertMatchesRebuild(self):
+        incremental = _rollup_rows()
+        rollups.rebuild(user=self.user)
+        self.assertEqual(incremental, _rollup_rows())
+
+    def test_insert(self):
+        self.assertEqual(
+            EmissionRollup.objects.get(user=self.user, period='day', start=self.start).total_emission,
+            self.entries[0].total_emission,
+        )
+        self.assertMatchesRebuild()
+
+    def test_update_in_place(self):
+        entry = self.entries[3]
+        entry.transport_km = 100.0
+        entry.save()
+        self.assertMatchesRebuild()
+
+    def test_move_to_another_month(self):
+        entry = self.entries[0]
+        entry.date = date(2026, 3, 15)
+        entry.save()
+        self.assertFalse(EmissionRollup.objects.filter(user=self.user, period='day', start=self.start).exists())
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.entries[5].delete()
+        self.entries[6].delete()
+        self.assertMatchesRebuild()
+
+    def test_delete_last_entry_of_period_removes_rollup(self):
+        for entry in self.entries:
+            if entry.date.month == 2:
+                entry.delete()
+        self.assertFalse(EmissionRollup.objects.filter(user=self.user, period='month',
+                                                       start=date(2026, 2, 1)).exists())
+        self.assertMatchesRebuild()
+
+
+class AnomalyFlagTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('anomalies')
+        self.start = date(2026, 1, 1)
+        for i in range(10):
+            _entry(self.user, self.start + timedelta(days=i), 10.0 + i % 2)
+        self.spike_day = self.start + timedelta(days=10)
+        self.spike = _entry(self.user, self.spike_day, 200.0)
+        for i in range(11, 30):
+            _entry(self.user, self.start + timedelta(days=i), 10.0 + i % 2)
+
+    def windows_flagged(self, day):
+        return set(EmissionAnomaly.objects.filter(user=self.user, date=day).values_list('window', flat=True))
+
+    def test_spike_is_flagged(self):
+        self.assertEqual(self.windows_flagged(self.spike_day), {0, 7, 30, 90})
+
+    def test_editing_a_day_outside_a_window_keeps_its_flag_there(self):
+        self.spike.transport_km = 10.0
+        self.spike.save()
+        # Rescored (and now normal) for all time; no longer in the last 7 days, so that flag stays
+        self.assertEqual(self.windows_flagged(self.spike_day), {7})
+
+
+class ScenarioTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('scenarios')
+        self.baseline = {'transport_km': 20.0, 'electricity_kwh': 5.0, 'food_type': 'veg'}
+
+    def run_levers(self, levers):
+        return scenarios.run({'baseline': self.baseline, 'levers': levers}, self.user)
+
+    def test_grid(self):
+        result = self.run_levers({'transport': [0.5, 1.0], 'veg_days': [7]})
+        self.assertEqual((result['mode'], result['scenarios']), ('grid', 2))
+        self.assertEqual(result['best']['levers']['transport'], 0.5)
+
+    @override_settings(CARBON_SCENARIO_MAX=5_000_000)
+    def test_oversized_grid_is_rejected(self):
+        # 5e6 ** 3 overflows int64; the product must still be seen as too large
+        steps = {'min': 0, 'max': 1, 'steps': 5_000_000}
+        with self.assertRaisesMessage(scenarios.ScenarioError, 'combinations'):
+            self.run_levers({'transport': steps, 'electricity': steps, 'plastic': steps})
+
+    @override_settings(CARBON_SCENARIO_MAX=1000)
+    def test_steps_over_the_cap_are_rejected(self):
+        with self.assertRaisesMessage(scenarios.ScenarioError, 'steps'):
+            self.run_levers({'transport': {'min': 0, 'max': 1, 'steps': 1001}})
+
+    def test_oversized_grid_is_a_bad_request(self):
+        self.client.force_login(self.user)
+        steps = {'min': 0, 'max': 1, 'steps': 5_000_000}
+        response = self.client.post(
+            '/carbon-estimator/scenarios/', content_type='application/json',
+            data={'baseline': self.baseline, 'levers': {'transport': steps, 'electricity': steps, 'plastic': steps}},
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class MeterIngestTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(user=get_user_model().objects.create_user('meters'), name='main')
+
+    def test_out_of_range_timestamp_is_an_invalid_line(self):
+        result = meters.ingest(self.meter, ['{"ts": 1e20, "kwh": 1}', '{"ts": 1760688000, "kwh": 0.5}'])
+        self.assertEqual((result['stored'], result['invalid']), (1, 1))
+        self.assertEqual(result['errors'][0]['line'], 1)
+
+    def test_resent_readings_are_duplicates(self):
+        lines = ['{"ts": "2026-10-17T08:00:00Z", "kwh": 0.25}', '{"ts": "2026-10-17T08:00:05Z", "kwh": 0.25}']
+        meters.ingest(self.meter, lines)
+        result = meters.ingest(self.meter, lines)
+        self.assertEqual((result['stored'], result['duplicates']), (0, 2))
+        self.assertAlmostEqual(CarbonEntry.objects.get(user=self.meter.user).electricity_kwh, 0.5)
+
+
+class ImportTests(TestCase):
+    header = 'date,transport_km,electricity_kwh,food_type,plastic_grams\n'
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('importer')
+
+    def import_rows(self, *lines, chunk_size=None):
+        return importer.import_csv(io.StringIO(self.header + ''.join(line + '\n' for line in lines)),
+                                   self.user, chunk_size=chunk_size)
+
+    def test_valid_import(self):
+        result = self.import_rows('2026-03-01,10,2,veg,5', '2026-03-02,0,1.5,meat,', '2026-03-03,4,3,veg,0',
+                                  chunk_size=2)
+        self.assertEqual((result['rows'], result['imported'], result['invalid']), (3, 3, 0))
+        self.assertEqual((result['first_date'], result['last_date']), ('2026-03-01', '2026-03-03'))
+        entry = CarbonEntry.objects.get(user=self.user, date=date(2026, 3, 1))
+        saved = entry.total_emission
+        entry.save()  # recomputes the emissions the ORM way
+        self.assertAlmostEqual(entry.total_emission, saved)
+        self.assertEqual(EmissionRollup.objects.get(user=self.user, period='month', start=date(2026, 3, 1)).entries, 3)
+
+    def test_existing_day_is_overwritten(self):
+        _entry(self.user, date(2026, 3, 1), 50.0)
+        self.import_rows('2026-03-01,10,2,veg,5')
+        entry = CarbonEntry.objects.get(user=self.user, date=date(2026, 3, 1))
+        self.assertEqual((entry.transport_km, entry.plastic_grams), (10.0, 5.0))
+        self.assertEqual(CarbonEntry.objects.filter(user=self.user).count(), 1)
+
+    def test_metered_kwh_is_kept(self):
+        meter = Meter.objects.create(user=self.user, name='main')
+        meters.ingest(meter, ['{"ts": "2026-03-01T12:00:00", "kwh": 0.75}'])
+        self.import_rows('2026-03-01,10,2,veg,5')
+        self.assertAlmostEqual(CarbonEntry.objects.get(user=self.user, date=date(2026, 3, 1)).electricity_kwh, 2.75)
+
+    def test_invalid_rows_are_reported(self):
+        result = self.import_rows('2026-03-01,inf,2,veg,5', '2026-03-02,1,nan,veg,5', '03/03/2026,1,2,veg,5',
+                                  '2026-03-04,1,,veg,5', '2026-03-05,1,2,,5', '2026-03-06,1,2,veg,5')
+        self.assertEqual((result['imported'], result['invalid']), (1, 5))
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 4, 5, 6])
+        self.assertIn('finite', result['errors'][0]['error'])
+        self.assertIn('date', result['errors'][2]['error'])
+        self.assertEqual(list(CarbonEntry.objects.filter(user=self.user).values_list('date', flat=True)),
+                         [date(2026, 3, 6)])
+
+    def test_missing_column(self):
+        with self.assertRaises(importer.InvalidCSV):
+            importer.import_csv(io.StringIO('date,transport_km\n2026-03-01,1\n'), self.user)
@@ -3,5 +3,10 @@ from . import views
 
 urlpatterns = [
     path('dashboard/', views.carbon_dashboard, name='carbon_dashboard'),
+    path('trend.png', views.carbon_trend_chart, name='carbon_trend_chart'),
+    path('anomalies/', views.carbon_anomalies, name='carbon_anomalies'),
+    path('import/', views.carbon_import, name='carbon_import'),
+    path('meter/readings/', views.meter_readings, name='carbon_meter_readings'),
+    path('scenarios/', views.carbon_scenarios, name='carbon_scenarios'),
     
 ]
@@ -1,3 +1,5 @@
+import math
+
 import numpy as np
 
 def get_impact_rating(total_emission):
@@ -13,8 +15,48 @@ def detect_outliers_zscore(data):
         return []
     mean = np.mean(data)
     std = np.std(data)
+    if std == 0:
+        return []  # all values equal
     return [i for i in data if abs((i - mean) / std) > 2]
 
+
+class RunningStats:
+    """
+    Welford running mean/variance that also supports removing a value, so a
+    rolling window can be maintained by adding the newest day and removing
+    the one that fell out, without rescanning history.
+    """
+
+    # Spread below which z-scores use this value instead, so a jump after a
+    # run of identical days gets a large but finite z-score
+    MIN_STD = 0.1
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count, self.mean, self.m2 = count, mean, m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+
+    @property
+    def std(self):
+        """Population standard deviation, like np.std()."""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def z_score(self, value):
+        return (value - self.mean) / max(self.std, self.MIN_STD)
+
 def get_personalized_tip(entry):
     tips = []
     if entry.food_type == "non-veg":
@@ -1,21 +1,26 @@
+import csv
+import io
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.db import transaction
 from django.shortcuts import render, redirect
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from . import anomalies, charts, meters, scenarios
+from .importer import InvalidCSV, import_csv
 from .models import CarbonEntry
 from .forms import CarbonEntryForm
-from .utils import get_impact_rating, detect_outliers_zscore, get_personalized_tip, get_achievement_badges
-from django.db.models import Avg
-import matplotlib.pyplot as plt
-import seaborn as sns
-import os
-import io
-import base64
-from matplotlib.dates import DateFormatter
+from .utils import get_impact_rating, get_personalized_tip, get_achievement_badges
 from datetime import date
+from ecoguard.metrics import timer
 
+@login_required
 def carbon_dashboard(request):
     form = CarbonEntryForm()
     message = ''
-    chart = None
-    outliers = []
     tip = ''
     rating = ''
     badges = []
@@ -23,69 +28,37 @@ def carbon_dashboard(request):
     if request.method == 'POST':
         form = CarbonEntryForm(request.POST)
         if form.is_valid():
-            # Save or update today's entry
+            # Save or update the user's entry for today; (user, date) is unique, so
+            # concurrent submissions update the same row instead of adding a second one
             today = date.today()
-            entry, created = CarbonEntry.objects.update_or_create(
-                date=today,
-                defaults=form.cleaned_data
-            )
-            total_emission = entry.calculate_emissions()
+            with transaction.atomic():
+                # Lock the entry before summing readings, so a meter batch lands either in
+                # the sum or on top of the saved entry, never neither
+                CarbonEntry.objects.select_for_update().filter(user=request.user, date=today).exists()
+                # The form holds unmetered electricity; the meters' readings stay on top of it
+                electricity = form.cleaned_data['electricity_kwh'] + meters.metered_kwh(request.user.pk, today)
+                entry, created = CarbonEntry.objects.update_or_create(
+                    user=request.user,
+                    date=today,
+                    defaults={**form.cleaned_data, 'electricity_kwh': electricity}
+                )
+            total_emission = entry.total_emission
             message = f"Your CO₂ emission today is {total_emission} kg CO₂e"
             rating = get_impact_rating(total_emission)
             tip = get_personalized_tip(entry)
             badges = get_achievement_badges(total_emission)
 
-    # Get all entries ordered by date for trend
-    entries = CarbonEntry.objects.all().order_by('date')
-    dates = [e.date for e in entries]
-    emissions = [e.calculate_emissions() for e in entries]
-
-    # Detect outliers
-    if emissions:
-        outliers = detect_outliers_zscore(emissions)
-
-        plt.switch_backend('Agg')
-        fig, ax = plt.subplots(figsize=(10, 6)) 
-
-        ax.plot(dates, emissions, marker='o')
-        ax.set_title('CO₂ Emission Trend')
-        ax.set_ylabel('kg CO₂e')
-        ax.xaxis.set_major_formatter(DateFormatter("%d-%b"))
-        fig.autofmt_xdate()
-
-        buf = io.BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        image_png = buf.getvalue()
-        buf.close()
-        chart = base64.b64encode(image_png).decode('utf-8')
-
-    # Get today's entry for summary and category-wise emissions
-    today_entry = CarbonEntry.objects.filter(date=date.today()).first()
-    if today_entry:
-        total_emission_today = today_entry.calculate_emissions()
+    # Trend, today's summary and outliers only change when an entry does
+    data = charts.cached_dashboard_data(request.user)
+    outliers = data['outliers']
+    trend_dates, trend_values = data['trend_dates'], data['trend_values']
+    today_category_emissions = data['today_categories']
+    if data['total_emission_today'] is not None:
+        total_emission_today = data['total_emission_today']
         rating_today = get_impact_rating(total_emission_today)
-        today_category_emissions = {
-            'Transport': round(today_entry.transport_km * 0.12, 2),
-            'Electricity': round(today_entry.electricity_kwh * 0.92, 2),
-            'Food': {
-                'veg': 2.0,
-                'non-veg': 7.0,
-                'mixed': 4.5
-            }.get(today_entry.food_type.lower(), 3.0),
-            'Plastic': round(today_entry.plastic_grams * 0.0088, 2),
-        }
     else:
         total_emission_today = 0
         rating_today = 'No data'
-        today_category_emissions = {}
-
-    # Prepare data for trend chart (last 7 days)
-    last_7_entries = CarbonEntry.objects.order_by('-date')[:7]
-    last_7_entries = list(reversed(last_7_entries))  # chronological order
-    trend_dates = [e.date.strftime('%a') for e in last_7_entries]
-    trend_values = [e.calculate_emissions() for e in last_7_entries]
 
     # Radar chart user values — today's category emissions or zeroes
     radar_user_values = [
@@ -113,7 +86,6 @@ def carbon_dashboard(request):
     context = {
         'form': form,
         'message': message,
-        'chart': chart,
 
         'todays_rating': rating_today,
         'total_emission': total_emission_today,
@@ -136,4 +108,95 @@ def carbon_dashboard(request):
         'rating': rating,
         'outliers': outliers,
     }
-    return render(request, 'carbon_estimator/dashboard.html', context)
\ No newline at end of file
+    with timer('carbon.template'):
+        return render(request, 'carbon_estimator/dashboard.html', context)
+
+@login_required
+def carbon_trend_chart(request):
+    """The user's CO₂ trend as a PNG, rendered once per data version and served from the chart cache."""
+    version = charts.data_version(request.user)
+    etag = quote_etag(version or 'empty')
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304)
+    png = charts.trend_png(request.user, version)
+    if png is None:
+        return HttpResponse(status=204)
+    response = HttpResponse(png, content_type='image/png')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'  # revalidate with the ETag; the body only changes with the data
+    return response
+
+
+@login_required
+def carbon_anomalies(request):
+    """
+    The user's days flagged by the streaming anomaly detector, newest first.
+    Query parameters: window=0|7|30|90 days (0 = all time, default 30), limit (default 20).
+    """
+    try:
+        window = int(request.GET.get('window', 30))
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 500)
+    except ValueError:
+        return JsonResponse({'error': 'window and limit must be integers.'}, status=400)
+    if window not in anomalies.WINDOWS:
+        return JsonResponse({'error': f"window must be one of {', '.join(map(str, anomalies.WINDOWS))}."}, status=400)
+    rows = anomalies.recent(window, limit, user=request.user)
+    return JsonResponse({
+        'window': window,
+        'threshold': anomalies.z_threshold(),
+        'results': [{**row, 'date': row['date'].isoformat()} for row in rows],
+    })
+
+
+@login_required
+@require_POST
+def carbon_import(request):
+    """
+    Imports a CSV `file` of historical entries for the user (columns: date,
+    transport_km, electricity_kwh, food_type, optional plastic_grams).
+    Existing entries on the same dates are overwritten.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'Upload a CSV file as "file".'}, status=400)
+    # Large uploads are spooled to a temporary file by Django; read it as a text stream
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        result = import_csv(stream, request.user)
+    except (InvalidCSV, UnicodeDecodeError, csv.Error) as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(result)
+
+
+@login_required
+@require_POST
+def carbon_scenarios(request):
+    """
+    Evaluates what-if scenarios against the user's recent entries. JSON body:
+    {"levers": {"transport": [0.7, 0.85, 1.0], "veg_days": {"min": 0, "max": 7, "steps": 8}, ...},
+    "days": 30, "samples": 100000, "target": 8.0}; see scenarios.py for every option.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'The body must be a JSON object.'}, status=400)
+    try:
+        with timer('carbon.scenarios'):
+            result = scenarios.run(data, request.user)
+    except scenarios.ScenarioError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(result)
+
+
+@csrf_exempt
+@require_POST
+def meter_readings(request):
+    """
+    Ingests a batch of smart-meter readings as NDJSON (one {"ts", "kwh"}
+    object per line), authenticated with 'Authorization: Bearer <meter token>'.
+    The body is streamed, so a batch may be arbitrarily long.
+    """
+    meter = meters.meter_for_request(request)
+    if meter is None:
+        return JsonResponse({'error': 'Unknown or missing meter token.'}, status=401)
+    return JsonResponse(meters.ingest(meter, request))
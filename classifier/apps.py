@@ -1,6 +1,50 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
 
 
 class ClassifierConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'classifier'
+
+    def ready(self):
+        self._register_gauges()
+
+        # The CNN is loaded lazily on the first classification; opt in to
+        # paying the TensorFlow start-up cost at worker boot instead.
+        # Workers that delegate to the inference sidecar never load it.
+        uses_sidecar = bool(getattr(settings, 'CLASSIFIER_SIDECAR_SOCKET', None))
+        if getattr(settings, 'CLASSIFIER_EAGER_LOAD', False) and not uses_sidecar:
+            from .registry import registry, ModelUnavailable
+            try:
+                registry.get_model()
+            except ModelUnavailable as exc:
+                logger.warning("Classifier model not loaded at startup: %s", exc)
+
+    def _register_gauges(self):
+        from ecoguard.metrics import register_gauge
+        from .cache import prediction_cache
+        from .inference import batcher
+        from .models import ClassificationJob
+        from .registry import registry
+
+        register_gauge('ecoguard_classifier_model_loaded', 'Whether this process has the CNN in memory.',
+                       lambda: int(registry.is_loaded))
+        register_gauge('ecoguard_classifier_batch_queue_depth', 'Images waiting for the micro-batcher.',
+                       lambda: batcher.stats()['queue_depth'])
+        register_gauge('ecoguard_classifier_mean_batch_size', 'Mean images per model.predict call.',
+                       lambda: batcher.stats()['mean_batch_size'])
+        register_gauge('ecoguard_classifier_cache_lookups', 'Prediction cache lookups by outcome.',
+                       lambda: {(outcome,): count for outcome, count in prediction_cache.stats().items()
+                                if outcome in ('memory_hits', 'db_hits', 'misses')},
+                       labelnames=('outcome',))
+        register_gauge('ecoguard_classifier_cache_hit_ratio', 'Share of prediction cache lookups served from cache.',
+                       lambda: prediction_cache.stats()['hit_ratio'])
+        register_gauge('ecoguard_classifier_jobs', 'Classification jobs by status.',
+                       lambda: {(row['status'],): row['n'] for row in
+                                ClassificationJob.objects.values('status').annotate(n=Count('pk'))},
+                       labelnames=('status',))
@@ -0,0 +1,120 @@
+"""
+Inference backends the model registry can load.
+
+- 'keras':  the full Keras model (waste_cnn.h5), needs the tensorflow package
+- 'tflite': a (quantized) TFLite artifact produced by `manage.py export_tflite`,
+            run with the standalone LiteRT/tflite-runtime interpreter when
+            installed, so CPU-only workers never import tensorflow
+
+Every backend returns an object with the subset of the Keras model API the
+classifier uses: predict(batch, batch_size=None, verbose=0), input_shape
+and count_params().
+"""
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """Keras-like wrapper around a TFLite interpreter, with (de)quantization of inputs and outputs."""
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter keeps per-invocation state, so calls are serialised
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None, *(int(dim) for dim in self._input['shape'][1:]))
+
+    @property
+    def weights(self):
+        return []
+
+    def count_params(self):
+        return sum(
+            int(np.prod(tensor['shape'])) for tensor in self._interpreter.get_tensor_details()
+            if tensor['shape'].size
+        )
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if len(batch) != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], [len(batch), *batch.shape[1:]])
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_size = len(batch)
+            self._interpreter.set_tensor(self._input['index'], _quantize(batch, self._input))
+            self._interpreter.invoke()
+            return _dequantize(self._interpreter.get_tensor(self._output['index']), self._output)
+
+
+def _quantize(values, details):
+    scale, zero_point = details['quantization']
+    dtype = details['dtype']
+    if not scale or np.issubdtype(dtype, np.floating):
+        return values.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(values, details):
+    scale, zero_point = details['quantization']
+    if not scale or np.issubdtype(values.dtype, np.floating):
+        return values.astype(np.float32, copy=False)
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+def load_keras(path):
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def load_tflite(path):
+    return TFLiteModel(path, num_threads=getattr(settings, 'CLASSIFIER_TFLITE_THREADS', None))
+
+
+LOADERS = {
+    'keras': load_keras,
+    'tflite': load_tflite,
+}
+
+
+def backend_name():
+    return getattr(settings, 'CLASSIFIER_BACKEND', 'keras')
+
+
+def default_model_path(backend=None):
+    if (backend or backend_name()) == 'tflite':
+        return getattr(settings, 'CLASSIFIER_TFLITE_MODEL_PATH', None) or os.path.join(
+            settings.BASE_DIR, 'ml_model', 'waste_cnn.tflite')
+    return getattr(settings, 'CLASSIFIER_MODEL_PATH', None) or os.path.join(
+        settings.BASE_DIR, 'ml_model', 'waste_cnn.h5')
+
+
+def load(path, backend=None):
+    """Loads `path` with the named backend (CLASSIFIER_BACKEND by default)."""
+    backend = backend or backend_name()
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown CLASSIFIER_BACKEND {backend!r}; expected one of {sorted(LOADERS)}")
+    return LOADERS[backend](path)
@@ -0,0 +1,94 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests into a single model call.
+
+    Callers submit arrays of shape (n, H, W, C); a background thread collects
+    requests until either `max_batch_size` images are queued or `max_wait_ms`
+    has passed since the first one arrived, runs `predict_fn` once on the
+    concatenated batch and hands every caller back its own rows.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._batches = 0
+        self._images = 0
+
+    def submit(self, img_array):
+        """Queue `img_array` for prediction and return a Future of its probabilities."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((img_array, future))
+        return future
+
+    def predict(self, img_array, timeout=None):
+        return self.submit(img_array).result(timeout=timeout)
+
+    def stats(self):
+        return {
+            'batches': self._batches,
+            'images': self._images,
+            'mean_batch_size': round(self._images / self._batches, 2) if self._batches else 0,
+            'queue_depth': self._queue.qsize(),
+        }
+
+    def _ensure_worker(self):
+        # Threads don't survive fork(), so a pre-forked worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='classifier-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            pending = [(array, future) for array, future in self._collect()
+                       if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            try:
+                predictions = self.predict_fn(np.concatenate([array for array, _ in pending]))
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+
+            self._batches += 1
+            self._images += len(predictions)
+            offset = 0
+            for array, future in pending:
+                future.set_result(predictions[offset:offset + len(array)])
+                offset += len(array)
@@ -0,0 +1,157 @@
+"""
+Micro-benchmarks for the classifier hot path.
+
+Each stage (preprocessing, model.predict, chart rendering, template
+rendering) is timed in isolation across batch sizes and concurrent caller
+threads, and summarised as p50/p95/p99 latency plus items per second.
+"""
+import glob
+import os
+import platform
+import subprocess
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .bulk import IMAGE_EXTENSIONS
+from .inference import IMAGE_SIZE, preprocess_image, specific_classes
+
+
+def build_synthetic_model(seed=0):
+    """
+    A small CNN with the same (224, 224, 3) -> 12-way softmax signature as
+    waste_cnn.h5, so the suite runs where the real model file is absent.
+    """
+    import keras
+    from keras import layers
+
+    keras.utils.set_random_seed(seed)
+    return keras.Sequential([
+        keras.Input((*IMAGE_SIZE, 3)),
+        layers.Conv2D(32, 3, strides=2, activation='relu'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(64, 3, activation='relu'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(128, 3, activation='relu'),
+        layers.GlobalAveragePooling2D(),
+        layers.Dense(128, activation='relu'),
+        layers.Dense(len(specific_classes), activation='softmax'),
+    ])
+
+
+def sample_images(directory=None, limit=32):
+    directory = directory or settings.MEDIA_ROOT
+    paths = sorted(
+        path for path in glob.glob(os.path.join(directory, '**', '*'), recursive=True)
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+    )
+    return paths[:limit]
+
+
+def measure(fn, items_per_call=1, iterations=20, threads=1, warmup=2):
+    """
+    Calls `fn` `iterations` times spread over `threads` concurrent threads.
+    Returns latency percentiles (ms) and items processed per second.
+    """
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, iterations // threads)
+
+    def worker():
+        local = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            fn()
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'items_per_sec': round(items_per_call * len(latencies) / elapsed, 2),
+    }
+
+
+def run_suite(model, images, batch_sizes=(1, 8, 32), thread_counts=(1, 2, 4), iterations=20):
+    """Benchmarks every stage and returns a list of result rows."""
+    from .views import prediction_chart_bars, render_prediction_chart_png
+
+    rows = []
+
+    def record(stage, batch_size, threads, fn):
+        stats = measure(fn, items_per_call=batch_size, iterations=iterations, threads=threads)
+        rows.append({'stage': stage, 'batch_size': batch_size, 'threads': threads, **stats})
+
+    cursor = iter(())
+
+    def next_image():
+        nonlocal cursor
+        try:
+            return next(cursor)
+        except StopIteration:
+            cursor = iter(images)
+            return next(cursor)
+
+    for threads in thread_counts:
+        record('preprocess', 1, threads, lambda: preprocess_image(next_image()))
+
+    for batch_size in batch_sizes:
+        batch = np.random.default_rng(0).random((batch_size, *IMAGE_SIZE, 3), dtype=np.float32)
+        for threads in thread_counts:
+            record('predict', batch_size, threads,
+                   lambda: model.predict(batch, batch_size=batch_size, verbose=0))
+
+    top = [('paper', 'Recyclable', 61.2), ('cardboard', 'Recyclable', 20.4), ('trash', 'Hazardous', 8.1)]
+    bars = prediction_chart_bars(top)
+    context = {
+        'specific_label': top[0][0],
+        'category_label': top[0][1],
+        'confidence': top[0][2],
+        'uploaded_image': '/media/example.jpg',
+        'predictions': bars,
+        'csrf_token': 'benchmark',
+    }
+    for threads in thread_counts:
+        record('chart_svg', 1, threads,
+               lambda: render_to_string('classifier/_prediction_chart.html', {'predictions': bars}))
+        record('chart_png', 1, threads, lambda: render_prediction_chart_png(top))
+        record('template', 1, threads, lambda: render_to_string('classifier/upload.html', context))
+    return rows
+
+
+def environment():
+    """Metadata stored next to the results so runs from different commits can be compared."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    import tensorflow as tf
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tensorflow': tf.__version__,
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+    }
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from .inference import format_result, predict, preprocess_image, top_predictions
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+
+
+def iter_images(uploaded_files):
+    """
+    Yields (name, file-like) for every image in the upload.
+    Zip archives are expanded one member at a time, so only the image being
+    handed out is held in memory, never the whole archive. A member larger
+    than CLASSIFIER_BULK_MAX_MEMBER_BYTES once decompressed is handed out as
+    a MemberTooLarge error instead, which load_image() reports for that image.
+    """
+    max_bytes = getattr(settings, 'CLASSIFIER_BULK_MAX_MEMBER_BYTES', 20 * 1024 * 1024)
+    for uploaded in uploaded_files:
+        if uploaded.name.lower().endswith('.zip') or zipfile.is_zipfile(uploaded):
+            uploaded.seek(0)
+            with zipfile.ZipFile(uploaded) as archive:
+                for member in archive.infolist():
+                    extension = os.path.splitext(member.filename)[1].lower()
+                    if member.is_dir() or extension not in IMAGE_EXTENSIONS:
+                        continue
+                    yield member.filename, _read_member(archive, member, max_bytes)
+        elif hasattr(uploaded, 'temporary_file_path'):
+            yield uploaded.name, uploaded.temporary_file_path()
+        else:
+            uploaded.seek(0)
+            yield uploaded.name, io.BytesIO(uploaded.read())
+
+
+class MemberTooLarge(ValueError):
+    """A zip member decompresses to more than CLASSIFIER_BULK_MAX_MEMBER_BYTES."""
+
+
+def _read_member(archive, member, max_bytes):
+    error = MemberTooLarge(f"larger than {max_bytes} bytes uncompressed")
+    if member.file_size > max_bytes:
+        return error
+    with archive.open(member) as fh:
+        # The header's size may lie: never decompress more than one byte past the cap
+        data = fh.read(max_bytes + 1)
+    return error if len(data) > max_bytes else io.BytesIO(data)
+
+
+def load_image(source):
+    """(preprocessed array, None) for one source from iter_images(), or (None, error) if it cannot be used."""
+    if isinstance(source, MemberTooLarge):
+        return None, str(source)
+    try:
+        return preprocess_image(source), None
+    except Exception as exc:  # corrupt or non-image member: report it, keep going
+        return None, str(exc)
+
+
+def classify_stream(images, batch_size=None, workers=None):
+    """
+    Classifies (name, file-like) pairs and yields one result dict per image,
+    in input order.
+
+    Decoding and preprocessing run in a thread pool that is never more than
+    two batches ahead of inference, which keeps memory bounded no matter how
+    many images the upload contains. Results are yielded as soon as the
+    batch they belong to has been predicted.
+    """
+    batch_size = batch_size or getattr(settings, 'CLASSIFIER_BULK_BATCH_SIZE', 32)
+    workers = workers or getattr(settings, 'CLASSIFIER_BULK_WORKERS', 4)
+    max_in_flight = 2 * batch_size
+    images = iter(images)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='classifier-bulk') as pool:
+        in_flight = deque()
+        exhausted = False
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    name, source = next(images)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight.append((name, pool.submit(load_image, source)))
+
+            batch = [in_flight.popleft() for _ in range(min(batch_size, len(in_flight)))]
+            loaded = [(name, *future.result()) for name, future in batch]
+
+            arrays = [array for _, array, _ in loaded if array is not None]
+            probabilities = iter(predict(np.concatenate(arrays)) if arrays else [])
+
+            for name, array, error in loaded:
+                if array is None:
+                    yield {'name': name, 'error': error}
+                    continue
+                top = top_predictions(next(probabilities), k=3)
+                yield {'name': name, **format_result(top)}
+
+
+def ndjson_lines(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
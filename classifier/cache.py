@@ -0,0 +1,107 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+
+from .inference import model_version
+from .models import CachedPrediction
+
+
+def content_hash(source):
+    """SHA-256 of a file path or binary file-like object, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        with open(source, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Top-3 predictions keyed by (image content hash, model version).
+
+    - In-memory LRU bounded to CLASSIFIER_CACHE_SIZE entries
+    - Optional persistent tier in the CachedPrediction table
+      (CLASSIFIER_CACHE_PERSISTENT)
+    - Entries for older model versions are never returned, and the memory
+      tier is dropped as soon as the registry reports a new version
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._counts = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}
+
+    def get(self, key):
+        version = model_version()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            top = self._entries.get(key)
+            if top is not None:
+                self._entries.move_to_end(key)
+                self._counts['memory_hits'] += 1
+                return top
+
+        if getattr(settings, 'CLASSIFIER_CACHE_PERSISTENT', False):
+            try:
+                stored = CachedPrediction.objects.filter(
+                    content_hash=key, model_version=version,
+                ).values_list('predictions', flat=True).first()
+            except DatabaseError:
+                stored = None
+            if stored is not None:
+                top = [tuple(p) for p in stored]
+                self._remember(key, top)
+                self._counts['db_hits'] += 1
+                return top
+
+        self._counts['misses'] += 1
+        return None
+
+    def set(self, key, top):
+        version = model_version()
+        self._remember(key, top)
+        if getattr(settings, 'CLASSIFIER_CACHE_PERSISTENT', False):
+            try:
+                CachedPrediction.objects.get_or_create(
+                    content_hash=key, model_version=version,
+                    defaults={'predictions': [list(p) for p in top]},
+                )
+            except (IntegrityError, DatabaseError):
+                pass  # another worker stored it first, or the table is unavailable
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = sum(self._counts.values())
+        hits = self._counts['memory_hits'] + self._counts['db_hits']
+        return {
+            **self._counts,
+            'size': len(self._entries),
+            'max_size': getattr(settings, 'CLASSIFIER_CACHE_SIZE', 1024),
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remember(self, key, top):
+        max_size = getattr(settings, 'CLASSIFIER_CACHE_SIZE', 1024)
+        with self._lock:
+            self._entries[key] = top
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+
+prediction_cache = PredictionCache()
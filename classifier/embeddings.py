@@ -0,0 +1,352 @@
+"""
+Near-duplicate detection over the CNN's penultimate-layer embeddings.
+
+- embed() runs the model once and returns both the embedding and the class
+  probabilities, so similarity search adds no second forward pass
+- ImageEmbedding rows are the source of truth; `manage.py build_embedding_index`
+  rebuilds the on-disk index from them
+- EmbeddingIndex is an inverted-file (IVF) index: L2-normalized float16
+  vectors in a memory-mapped .npy, grouped by their nearest k-means centroid,
+  so a query scans only the CLASSIFIER_EMBEDDING_NPROBE closest lists instead
+  of every stored vector. Rows added since the last build live in a small
+  in-memory tail that is searched exhaustively.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import backends
+from .batching import MicroBatcher
+from . import sidecar
+from .inference import model_version, specific_classes
+from .models import ImageEmbedding
+from .registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for embeddings stored by other worker processes
+TAIL_REFRESH_SECONDS = 30
+
+
+class EmbeddingsUnavailable(Exception):
+    """Raised when the loaded model does not expose a penultimate layer (e.g. the TFLite backend)."""
+
+
+def enabled():
+    return getattr(settings, 'CLASSIFIER_EMBEDDINGS', False) and backends.backend_name() == 'keras'
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+_dual_model = {'version': None, 'model': None}
+_dual_model_lock = threading.Lock()
+
+
+def _embedding_model():
+    """The registry's model with a second output at its penultimate layer, rebuilt when the model changes."""
+    model = registry.get_model()
+    version = registry.version
+    if _dual_model['version'] != version:
+        with _dual_model_lock:
+            if _dual_model['version'] != version:
+                if not hasattr(model, 'layers'):
+                    raise EmbeddingsUnavailable(f"The {registry.backend!r} backend does not expose embeddings")
+                import keras
+                _dual_model['model'] = keras.Model(model.inputs, [model.layers[-2].output, model.outputs[0]])
+                _dual_model['version'] = version
+    return _dual_model['model']
+
+
+def run_embedding_model(img_batch):
+    """(n, dim + classes) array: normalized embeddings followed by class probabilities."""
+    vectors, probabilities = _embedding_model().predict(img_batch, batch_size=len(img_batch), verbose=0)
+    return np.hstack([normalize(vectors.reshape(len(img_batch), -1)), probabilities])
+
+
+embedding_batcher = MicroBatcher(
+    run_embedding_model,
+    max_batch_size=getattr(settings, 'CLASSIFIER_MAX_BATCH_SIZE', 32),
+    max_wait_ms=getattr(settings, 'CLASSIFIER_MAX_BATCH_WAIT_MS', 10),
+)
+
+
+def embed(img_array):
+    """Returns (embeddings, probabilities) for a preprocessed batch, from one model call."""
+    combined = None
+    if sidecar.enabled():
+        try:
+            combined = sidecar.client.embed(img_array)
+        except sidecar.SidecarUnavailable:
+            pass
+    if combined is None and getattr(settings, 'CLASSIFIER_BATCHING', True):
+        combined = embedding_batcher.predict(img_array)
+    elif combined is None:
+        combined = run_embedding_model(img_array)
+    classes = len(specific_classes)
+    return combined[:, :-classes], combined[:, -classes:]
+
+
+class EmbeddingIndex:
+    """
+    Approximate nearest-neighbour search over stored upload embeddings.
+
+    Files in CLASSIFIER_EMBEDDING_INDEX_PATH, written by build_index():
+    vectors.npy (float16, grouped by list), image_ids.npy, centroids.npy,
+    offsets.npy and meta.json (model version, last ImageEmbedding pk).
+    The index is ignored when it was built for a different model version.
+    Pass `model_version` to pin the index instead of following the registry.
+    """
+
+    def __init__(self, path=None, model_version=None):
+        self._path = path
+        self._model_version = model_version
+        self._lock = threading.Lock()
+        self._meta_mtime = None
+        self._version = None
+        self._vectors = self._image_ids = self._centroids = self._offsets = None
+        self._meta = {}
+        self._tail_ids, self._tail_vectors, self._tail_matrix = [], [], None
+        self._last_pk = 0
+        self._last_refresh = 0.0
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, 'CLASSIFIER_EMBEDDING_INDEX_PATH', None) or os.path.join(
+            settings.BASE_DIR, 'ml_model', 'embedding_index')
+
+    def search(self, vector, k=5, nprobe=None):
+        """The k most similar stored uploads as [(image_id, cosine similarity), ...], best first."""
+        self._refresh()
+        query = normalize(vector).reshape(-1)
+        nprobe = nprobe or getattr(settings, 'CLASSIFIER_EMBEDDING_NPROBE', 8)
+        ids, scores = [], []
+
+        with self._lock:
+            vectors, image_ids, centroids, offsets = self._vectors, self._image_ids, self._centroids, self._offsets
+            tail_matrix = self._tail_matrix_locked()
+            tail_ids = self._tail_ids[:0 if tail_matrix is None else len(tail_matrix)]
+        if vectors is not None and len(vectors):
+            centroid_scores = centroids @ query
+            lists = np.argsort(-centroid_scores)[:nprobe]
+            for i in lists:
+                start, end = offsets[i], offsets[i + 1]
+                if end > start:
+                    ids.append(image_ids[start:end])
+                    scores.append(vectors[start:end].astype(np.float32) @ query)
+        if tail_matrix is not None:
+            ids.append(np.asarray(tail_ids, dtype=np.int64))
+            scores.append(tail_matrix @ query)
+        if not ids:
+            return []
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        best = np.argsort(-scores)
+        results, seen = [], set()
+        for i in best:
+            image_id = int(ids[i])
+            if image_id not in seen:
+                seen.add(image_id)
+                results.append((image_id, float(scores[i])))
+                if len(results) == k:
+                    break
+        return results
+
+    def add(self, embedding_pk, image_id, vector):
+        """Makes a freshly stored embedding searchable without rebuilding the index."""
+        with self._lock:
+            self._tail_ids.append(image_id)
+            self._tail_vectors.append(normalize(vector).reshape(-1).astype(np.float16))
+            self._tail_matrix = None
+            self._last_pk = max(self._last_pk, embedding_pk)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexed': 0 if self._vectors is None else len(self._vectors),
+                'lists': 0 if self._centroids is None else len(self._centroids),
+                'tail': len(self._tail_ids),
+                'model_version': self._meta.get('model_version'),
+                'built_at': self._meta.get('built_at'),
+            }
+
+    def _tail_matrix_locked(self):
+        if self._tail_matrix is None and self._tail_vectors:
+            self._tail_matrix = np.vstack(self._tail_vectors).astype(np.float32)
+        return self._tail_matrix
+
+    def _refresh(self):
+        version = self._model_version or model_version()
+        meta_path = os.path.join(self.path, 'meta.json')
+        try:
+            mtime = os.stat(meta_path).st_mtime
+        except OSError:
+            mtime = None
+        if version != self._version or mtime != self._meta_mtime:
+            self._load(version, mtime)
+        elif time.monotonic() - self._last_refresh > TAIL_REFRESH_SECONDS:
+            self._load_tail(version, self._last_pk)
+
+    def _load(self, version, mtime):
+        vectors = image_ids = centroids = offsets = None
+        meta = {}
+        if mtime is not None:
+            with open(os.path.join(self.path, 'meta.json')) as fh:
+                meta = json.load(fh)
+            if meta.get('model_version') == version:
+                vectors = np.load(os.path.join(self.path, 'vectors.npy'), mmap_mode='r')
+                image_ids = np.load(os.path.join(self.path, 'image_ids.npy'), mmap_mode='r')
+                centroids = np.load(os.path.join(self.path, 'centroids.npy'))
+                offsets = np.load(os.path.join(self.path, 'offsets.npy'))
+            else:
+                logger.info("Embedding index was built for model %s, not %s; ignoring it",
+                            meta.get('model_version'), version)
+        with self._lock:
+            self._vectors, self._image_ids, self._centroids, self._offsets = vectors, image_ids, centroids, offsets
+            self._meta = meta if vectors is not None else {}
+            self._version, self._meta_mtime = version, mtime
+            self._tail_ids, self._tail_vectors, self._tail_matrix = [], [], None
+            self._last_pk = self._meta.get('max_pk', 0)
+        self._load_tail(version, self._last_pk)
+
+    def _load_tail(self, version, after_pk):
+        limit = getattr(settings, 'CLASSIFIER_EMBEDDING_TAIL_LIMIT', 10000)
+        rows = list(
+            ImageEmbedding.objects.filter(model_version=version, pk__gt=after_pk)
+            .order_by('-pk').values_list('pk', 'image_id', 'vector')[:limit]
+        )
+        with self._lock:
+            for pk, image_id, vector in reversed(rows):
+                if pk > self._last_pk:
+                    self._tail_ids.append(image_id)
+                    self._tail_vectors.append(np.frombuffer(vector, dtype=np.float16))
+                    self._last_pk = pk
+            if rows:
+                self._tail_matrix = None
+            self._last_refresh = time.monotonic()
+
+
+embedding_index = EmbeddingIndex()
+
+
+def remember(image, vector, top):
+    """Stores the embedding of a classified upload and adds it to the live index."""
+    vector = normalize(vector).reshape(-1)
+    row = ImageEmbedding.objects.create(
+        image=image,
+        model_version=model_version(),
+        vector=vector.astype(np.float16).tobytes(),
+        predictions=[list(p) for p in top],
+    )
+    embedding_index.add(row.pk, image.pk, vector)
+    return row
+
+
+def reuse_prediction(vector):
+    """Top-3 of the most similar past upload when it clears CLASSIFIER_SIMILARITY_THRESHOLD, else None."""
+    threshold = getattr(settings, 'CLASSIFIER_SIMILARITY_THRESHOLD', None)
+    if threshold is None:
+        return None
+    matches = embedding_index.search(vector, k=1)
+    if not matches or matches[0][1] < threshold:
+        return None
+    stored = ImageEmbedding.objects.filter(
+        image_id=matches[0][0], model_version=model_version(),
+    ).values_list('predictions', flat=True).first()
+    return [tuple(p) for p in stored] if stored else None
+
+
+def spherical_kmeans(sample, lists, iterations=10, seed=0):
+    """Centroids (unit length) of `sample` under cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty lists from random points so every list stays in use
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def build_index(path, chunks, count, dim, model_version, lists=None, chunk_size=65536):
+    """
+    Writes an IVF index for `count` vectors of `dim` floats to `path`.
+
+    `chunks` yields (embedding pks, image ids, vectors) arrays; vectors are
+    normalized here. Memory use is bounded by the k-means sample and one
+    chunk, so millions of vectors can be indexed on a small node. The new
+    index replaces the old one in a single directory rename.
+    """
+    lists = lists or max(1, min(4096, int(math.sqrt(count))))
+    building = path.rstrip(os.sep) + '.building'
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    raw = np.lib.format.open_memmap(os.path.join(building, 'raw.npy'), mode='w+', dtype=np.float16, shape=(count, dim))
+    image_ids = np.empty(count, dtype=np.int64)
+    offset, max_pk = 0, 0
+    for pks, ids, vectors in chunks:
+        n = len(ids)
+        raw[offset:offset + n] = normalize(vectors)
+        image_ids[offset:offset + n] = ids
+        max_pk = max(max_pk, int(np.max(pks))) if n else max_pk
+        offset += n
+    if offset != count:
+        raise ValueError(f"Expected {count} vectors, got {offset}")
+
+    centroids = np.zeros((0, dim), dtype=np.float32)
+    if count:
+        # Train the coarse quantizer on a sample; 40 points per list is plenty for k-means
+        rng = np.random.default_rng(0)
+        sample_size = min(count, max(lists * 40, 10000))
+        sample = np.asarray(raw[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+        centroids = spherical_kmeans(sample, min(lists, sample_size))
+        del sample
+
+    assignments = np.empty(count, dtype=np.int32)
+    for start in range(0, count, chunk_size):
+        block = np.asarray(raw[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+
+    order = np.argsort(assignments, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+    vectors = np.lib.format.open_memmap(os.path.join(building, 'vectors.npy'), mode='w+', dtype=np.float16, shape=(count, dim))
+    for start in range(0, count, chunk_size):
+        vectors[start:start + chunk_size] = raw[order[start:start + chunk_size]]
+    vectors.flush()
+    del vectors, raw
+    os.remove(os.path.join(building, 'raw.npy'))
+
+    np.save(os.path.join(building, 'image_ids.npy'), image_ids[order])
+    np.save(os.path.join(building, 'centroids.npy'), centroids.astype(np.float32))
+    np.save(os.path.join(building, 'offsets.npy'), offsets.astype(np.int64))
+    with open(os.path.join(building, 'meta.json'), 'w') as fh:
+        json.dump({
+            'model_version': model_version,
+            'count': count,
+            'dim': dim,
+            'lists': len(centroids),
+            'max_pk': max_pk,
+            'built_at': time.time(),
+        }, fh)
+
+    previous = path.rstrip(os.sep) + '.previous'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(building, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return {'count': count, 'dim': dim, 'lists': len(centroids), 'max_pk': max_pk}
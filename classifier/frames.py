@@ -0,0 +1,152 @@
+"""
+Classification of frame bursts from a fixed camera, e.g. over a sorting conveyor.
+
+- A frame whose downscaled grayscale image barely differs from the last frame
+  the CNN actually saw is not sent to the model; it reuses that frame's
+  probabilities
+- The remaining frames go through the model in batches
+- Probabilities are smoothed over time and each run of the same smoothed
+  label becomes one object, so an item passing the camera gets one stable
+  label instead of per-frame flicker
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from .bulk import load_image
+from .inference import IMAGE_SIZE, label_to_category, predict, specific_classes
+
+# Side of the grayscale thumbnail compared between frames (224 / 7)
+SIGNATURE_SIZE = 32
+
+
+def frame_signature(img_array):
+    """Block-averaged SIGNATURE_SIZE x SIGNATURE_SIZE grayscale version of a preprocessed (1, H, W, 3) frame."""
+    block = IMAGE_SIZE[1] // SIGNATURE_SIZE
+    gray = img_array[0, :block * SIGNATURE_SIZE, :block * SIGNATURE_SIZE].mean(axis=-1)
+    return gray.reshape(SIGNATURE_SIZE, block, SIGNATURE_SIZE, block).mean(axis=(1, 3))
+
+
+def classify_frames(frames, diff_threshold=None, smoothing=None, min_run=None, batch_size=None, workers=None):
+    """
+    Classifies an ordered burst of (name, file-like) frames.
+
+    Returns {'frames': [...], 'objects': [...], 'stats': {...}} where every
+    frame reports whether the model ran on it and its smoothed label, and
+    objects are the stable runs of one label (shorter flickers than
+    `min_run` frames are folded into the neighbouring run).
+    """
+    diff_threshold = diff_threshold if diff_threshold is not None else getattr(
+        settings, 'CLASSIFIER_FRAME_DIFF_THRESHOLD', 0.02)
+    smoothing = smoothing or getattr(settings, 'CLASSIFIER_FRAME_SMOOTHING', 0.5)
+    min_run = min_run or getattr(settings, 'CLASSIFIER_FRAME_MIN_RUN', 3)
+    batch_size = batch_size or getattr(settings, 'CLASSIFIER_BULK_BATCH_SIZE', 32)
+    workers = workers or getattr(settings, 'CLASSIFIER_BULK_WORKERS', 4)
+
+    names, errors = [], {}
+    reference = []    # per frame: index of the inferred frame whose probabilities it uses
+    probabilities = {}  # inferred frame index -> probabilities
+    pending, last_signature, last_inferred = [], None, None
+
+    def flush():
+        batch = predict(np.concatenate([array for _, array in pending]))
+        for (index, _), probs in zip(pending, batch):
+            probabilities[index] = probs
+        pending.clear()
+
+    frames = iter(frames)
+    window = 2 * batch_size  # frames decoded ahead of inference, which bounds memory
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='classifier-frames') as pool:
+        while True:
+            chunk = [frame for _, frame in zip(range(window), frames)]
+            if not chunk:
+                break
+            # map() keeps input order, which the skip decision depends on
+            for (name, _), (array, error) in zip(chunk, pool.map(load_image, (source for _, source in chunk))):
+                index = len(names)
+                names.append(name)
+                if array is None:
+                    errors[index] = error
+                    reference.append(None)
+                    continue
+                signature = frame_signature(array)
+                if last_signature is not None and np.abs(signature - last_signature).mean() < diff_threshold:
+                    reference.append(last_inferred)
+                    continue
+                last_signature, last_inferred = signature, index
+                reference.append(index)
+                pending.append((index, array))
+                if len(pending) == batch_size:
+                    flush()
+        if pending:
+            flush()
+
+    smoothed, ema = {}, None
+    for index, ref in enumerate(reference):
+        if ref is None:
+            continue
+        probs = probabilities[ref]
+        ema = probs if ema is None else smoothing * probs + (1 - smoothing) * ema
+        smoothed[index] = ema
+
+    inferred = len(probabilities)
+    return {
+        'frames': [
+            {
+                'index': index,
+                'name': name,
+                'inferred': reference[index] == index,
+                **({'error': errors[index]} if index in errors else {
+                    'label': specific_classes[int(np.argmax(smoothed[index]))],
+                }),
+            }
+            for index, name in enumerate(names)
+        ],
+        'objects': _objects(names, smoothed, min_run),
+        'stats': {
+            'frames': len(names),
+            'inferred': inferred,
+            'skipped': len(names) - inferred - len(errors),
+            'errors': len(errors),
+        },
+    }
+
+
+def _objects(names, smoothed, min_run):
+    runs = []  # [label index, [frame indexes]]
+    for index, probs in smoothed.items():
+        label = int(np.argmax(probs))
+        if runs and runs[-1][0] == label:
+            runs[-1][1].append(index)
+        else:
+            runs.append([label, [index]])
+
+    # Fold flickers into the previous run (or the next one at the start)
+    stable = []
+    for label, indexes in runs:
+        if len(indexes) < min_run and (stable or len(runs) > 1):
+            if stable:
+                stable[-1][1].extend(indexes)
+            else:
+                stable.append([None, indexes])
+        elif stable and (stable[-1][0] == label or stable[-1][0] is None):
+            stable[-1][0] = label
+            stable[-1][1].extend(indexes)
+        else:
+            stable.append([label, indexes])
+
+    objects = []
+    for label, indexes in stable:
+        if label is None:
+            continue  # only flicker in the whole burst
+        name = specific_classes[label]
+        objects.append({
+            'label': name,
+            'category': label_to_category[name],
+            'confidence': round(float(np.mean([smoothed[i][label] for i in indexes])) * 100, 2),
+            'first_frame': names[indexes[0]],
+            'last_frame': names[indexes[-1]],
+            'frames': len(indexes),
+        })
+    return objects
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import WasteImage
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Window used when the caller gives no start date
+DEFAULT_SPANS = {
+    'day': timedelta(days=30),
+    'week': timedelta(weeks=12),
+    'month': timedelta(days=365),
+}
+
+
+def category_counts(period='day', start=None, end=None):
+    """
+    Classified uploads per category per day/week/month between `start` and `end`.
+
+    One GROUP BY over the (uploaded_at, category) index, so the cost follows
+    the number of rows in the window rather than the whole table.
+    Returns [{'period': date, 'category': str, 'count': int}, ...] in time order.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {sorted(PERIODS)}")
+    end = end or timezone.now()
+    start = start or end - DEFAULT_SPANS[period]
+    rows = (
+        WasteImage.objects
+        .filter(uploaded_at__gte=start, uploaded_at__lt=end)
+        .exclude(category='')
+        .annotate(period=PERIODS[period]('uploaded_at'))
+        .values('period', 'category')
+        .annotate(count=Count('pk'))
+        .order_by('period', 'category')
+    )
+    return [
+        {'period': row['period'].date(), 'category': row['category'], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def record_prediction(image_name, top, model_version):
+    """Stores an upload with its top-1 prediction (`top` as returned by top_predictions)."""
+    label, category, confidence = top[0] if top else ('', '', None)
+    return WasteImage.objects.create(
+        image=image_name,
+        label=label,
+        category=category,
+        confidence=confidence,
+        model_version=model_version or '',
+    )
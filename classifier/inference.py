@@ -0,0 +1,147 @@
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from ecoguard.metrics import timer
+
+from . import sidecar
+from .batching import MicroBatcher
+from .registry import registry
+
+# Input size the CNN was trained on (width, height)
+IMAGE_SIZE = (224, 224)
+
+# Model's original classes (exact order)
+specific_classes = [
+    'battery',       # 0
+    'biological',    # 1
+    'brown-glass',   # 2
+    'cardboard',     # 3
+    'clothes',       # 4
+    'green-glass',   # 5
+    'metal',         # 6
+    'paper',         # 7
+    'plastic',       # 8
+    'shoes',         # 9
+    'trash',         # 10
+    'white-glass'    # 11
+]
+
+# Index to label mapping
+class_indices = {i: label for i, label in enumerate(specific_classes)}
+
+# Label to category mapping
+label_to_category = {
+    'battery': 'Hazardous',
+    'biological': 'Organic',
+    'brown-glass': 'Recyclable',
+    'cardboard': 'Recyclable',
+    'clothes': 'Hazardous',
+    'green-glass': 'Recyclable',
+    'metal': 'Recyclable',
+    'paper': 'Recyclable',
+    'plastic': 'Recyclable',
+    'shoes': 'Hazardous',
+    'trash': 'Hazardous',
+    'white-glass': 'Recyclable'
+}
+
+
+def preprocess_image(source):
+    """
+    Loads and preprocesses an image for model prediction.
+    - Accepts a filesystem path or a binary file-like object (e.g. the upload buffer)
+    - Lets the JPEG decoder downscale by DCT while decoding (Pillow draft mode),
+      so a 12 MP phone photo is decoded near 224x224 instead of at full size
+    - Resizes to 224x224 (or whatever your model was trained on)
+    - Returns a (1, 224, 224, 3) float32 array in [0, 1], normalized in place
+    """
+    with timer('classifier.preprocess'), Image.open(source) as img:
+        img.draft('RGB', IMAGE_SIZE)
+        img = img.convert('RGB')
+        if img.size != IMAGE_SIZE:
+            img = img.resize(IMAGE_SIZE, Image.NEAREST)
+        img_array = np.asarray(img, dtype=np.float32)
+    img_array *= 1 / 255.0
+    return img_array[np.newaxis]
+
+
+def run_model(img_batch):
+    """Runs the registry's current model on a (n, 224, 224, 3) batch in one call."""
+    model = registry.get_model()
+    with timer('classifier.predict'):
+        return model.predict(img_batch, batch_size=len(img_batch), verbose=0)
+
+
+batcher = MicroBatcher(
+    run_model,
+    max_batch_size=getattr(settings, 'CLASSIFIER_MAX_BATCH_SIZE', 32),
+    max_wait_ms=getattr(settings, 'CLASSIFIER_MAX_BATCH_WAIT_MS', 10),
+)
+
+
+def predict(img_array):
+    """
+    Returns class probabilities for each image in `img_array`.
+    Goes to the inference sidecar when CLASSIFIER_SIDECAR_SOCKET is set (falling
+    back to in-process inference if it is down), and through the shared
+    micro-batcher when CLASSIFIER_BATCHING is on.
+    """
+    if sidecar.enabled():
+        try:
+            return sidecar.client.predict(img_array)
+        except sidecar.SidecarUnavailable:
+            pass
+    if getattr(settings, 'CLASSIFIER_BATCHING', True):
+        return batcher.predict(img_array)
+    return run_model(img_array)
+
+
+def model_version():
+    """
+    Version of the model answering predictions: the sidecar's when one is in
+    use, so web workers never load the model just to key caches and rows, and
+    the in-process model's while predict() is falling back to it.
+    """
+    if sidecar.enabled() and not sidecar.client.is_down:
+        try:
+            return sidecar.client.version or sidecar.client.status()['version']
+        except sidecar.SidecarUnavailable:
+            pass
+    return registry.version
+
+
+def ensure_model():
+    """Raises ModelUnavailable unless a model (sidecar or in-process) can serve predictions."""
+    if sidecar.enabled() and not sidecar.client.is_down:
+        try:
+            sidecar.client.status()  # asks the sidecar, rather than trusting the last version seen
+            return
+        except sidecar.SidecarUnavailable:
+            pass
+    registry.get_model()
+
+
+def top_predictions(probabilities, k=3):
+    """
+    Turns one probability vector into the k best (label, category, confidence %)
+    tuples, highest first.
+    """
+    top_indices = np.argsort(probabilities)[-k:][::-1]
+    return [
+        (specific_classes[i], label_to_category[specific_classes[i]], float(probabilities[i]) * 100)
+        for i in top_indices
+    ]
+
+
+def format_result(top):
+    """JSON-ready form of top_predictions() output, as returned by the bulk and job APIs."""
+    return {
+        'label': top[0][0],
+        'category': top[0][1],
+        'confidence': round(top[0][2], 2),
+        'top3': [
+            {'label': label, 'category': category, 'confidence': round(confidence, 2)}
+            for label, category, confidence in top
+        ],
+    }
@@ -0,0 +1,126 @@
+import io
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .bulk import classify_stream
+from .history import record_prediction
+from .inference import model_version
+from .models import ClassificationJob
+from .storage import upload_storage
+
+logger = logging.getLogger(__name__)
+
+# Longest pause between worker passes while the database keeps failing
+MAX_BACKOFF_SECONDS = 30
+
+
+def enqueue_job(name, data):
+    """Stores the upload and queues it for the inference workers."""
+    image_name = upload_storage.save(name, ContentFile(data))
+    return ClassificationJob.objects.create(image_name=image_name)
+
+
+def claim_jobs(limit):
+    """
+    Atomically moves up to `limit` pending jobs to running and returns them.
+    The conditional UPDATE means two workers can never claim the same job,
+    on SQLite as well as PostgreSQL.
+    """
+    candidates = ClassificationJob.objects.filter(
+        status=ClassificationJob.PENDING,
+    ).order_by('created_at').values_list('pk', flat=True)[:limit]
+
+    claimed = []
+    now = timezone.now()
+    for pk in candidates:
+        updated = ClassificationJob.objects.filter(pk=pk, status=ClassificationJob.PENDING).update(
+            status=ClassificationJob.RUNNING, started_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+    return list(ClassificationJob.objects.filter(pk__in=claimed).order_by('created_at'))
+
+
+def requeue_stale_jobs():
+    """Puts back jobs left running by a worker that died mid-batch."""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'CLASSIFIER_JOB_STALE_SECONDS', 300))
+    return ClassificationJob.objects.filter(
+        status=ClassificationJob.RUNNING, started_at__lt=cutoff,
+    ).update(status=ClassificationJob.PENDING, started_at=None)
+
+
+def _open_images(jobs):
+    for job in jobs:
+        try:
+            with upload_storage.open(job.image_name, 'rb') as fh:
+                source = io.BytesIO(fh.read())
+        except OSError as exc:
+            _fail(job, str(exc))
+            continue
+        yield str(job.pk), source
+
+
+def process_jobs(jobs):
+    """Classifies a batch of claimed jobs in one pass and records each outcome."""
+    by_id = {str(job.pk): job for job in jobs}
+    try:
+        for result in classify_stream(_open_images(jobs), batch_size=len(jobs) or 1):
+            job = by_id[result.pop('name')]
+            if 'error' in result:
+                _fail(job, result['error'])
+            else:
+                job.status = ClassificationJob.DONE
+                job.result = result
+                job.finished_at = timezone.now()
+                job.save(update_fields=['status', 'result', 'finished_at'])
+                record_prediction(job.image_name, [(result['label'], result['category'], result['confidence'])],
+                                  model_version())
+    except Exception as exc:
+        logger.exception("Classification batch failed")
+        for job in jobs:
+            if job.status == ClassificationJob.RUNNING:
+                _fail(job, str(exc))
+
+
+def _fail(job, error):
+    job.status = ClassificationJob.FAILED
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+
+def run_worker(poll_interval=0.5, batch_size=None, stop=None):
+    """
+    Worker loop: claim a batch of pending jobs, classify it, repeat.
+    Sleeps `poll_interval` seconds whenever the queue is empty, and puts back
+    stale jobs every CLASSIFIER_JOB_STALE_SECONDS. A database error is logged
+    and the pass retried with exponential backoff instead of ending the worker.
+    """
+    batch_size = batch_size or getattr(settings, 'CLASSIFIER_MAX_BATCH_SIZE', 32)
+    stale_seconds = getattr(settings, 'CLASSIFIER_JOB_STALE_SECONDS', 300)
+    backoff = poll_interval
+    next_requeue = time.monotonic() + stale_seconds
+    while stop is None or not stop.is_set():
+        try:
+            if time.monotonic() >= next_requeue:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    logger.warning("Requeued %d stale job(s)", requeued)
+                next_requeue = time.monotonic() + stale_seconds
+            jobs = claim_jobs(batch_size)
+            if jobs:
+                process_jobs(jobs)
+            else:
+                time.sleep(poll_interval)
+            backoff = poll_interval
+        except DatabaseError:
+            logger.exception("Worker pass failed; retrying in %.1fs", backoff)
+            connection.close()  # reconnect on the next pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from classifier.batching import MicroBatcher
+from classifier.benchmarks import build_synthetic_model
+from classifier.registry import ModelRegistry, registry
+
+
+class Command(BaseCommand):
+    help = "Measures classifier throughput/latency with the micro-batcher at several batch sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', action='store_true',
+                            help="Use a synthetic CNN with the real model's input/output shape")
+        parser.add_argument('--model', help="Model file to benchmark (defaults to CLASSIFIER_MODEL_PATH)")
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--clients', type=int, default=32, help="Concurrent uploading threads")
+        parser.add_argument('--requests', type=int, default=256, help="Images classified per batch size")
+        parser.add_argument('--wait-ms', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            model = build_synthetic_model()
+        else:
+            model = (ModelRegistry(options['model']) if options['model'] else registry).get_model()
+        image = np.random.rand(1, 224, 224, 3).astype(np.float32)
+
+        def run_model(batch):
+            return model.predict(batch, batch_size=len(batch), verbose=0)
+
+        self.stdout.write(f"{'batch':>6} {'img/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean batch':>11}")
+        for batch_size in options['batch_sizes']:
+            batcher = MicroBatcher(run_model, max_batch_size=batch_size, max_wait_ms=options['wait_ms'])
+            batcher.predict(image)  # start the worker thread outside the timed region
+            latencies = []
+            per_client = max(1, options['requests'] // options['clients'])
+
+            def client():
+                for _ in range(per_client):
+                    start = time.perf_counter()
+                    batcher.predict(image)
+                    latencies.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=client) for _ in range(options['clients'])]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            stats = batcher.stats()
+            p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+            self.stdout.write(
+                f"{batch_size:>6} {len(latencies) / elapsed:>9.1f} {p50:>9.1f} {p95:>9.1f} "
+                f"{stats['mean_batch_size']:>11}"
+            )
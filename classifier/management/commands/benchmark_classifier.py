@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from classifier.benchmarks import build_synthetic_model, environment, run_suite, sample_images
+from classifier.registry import ModelRegistry, registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks preprocessing, model.predict, chart and template rendering "
+        "(p50/p95/p99 latency and items/sec) across batch sizes and thread counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--synthetic', action='store_true',
+                            help="Use a synthetic CNN with the real model's input/output shape")
+        parser.add_argument('--model', help="Model file to benchmark (defaults to CLASSIFIER_MODEL_PATH)")
+        parser.add_argument('--images', help="Directory of sample images (defaults to MEDIA_ROOT)")
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+        parser.add_argument('--iterations', type=int, default=20, help="Timed calls per configuration")
+        parser.add_argument('--json', dest='json_path', help="Write machine-readable results to this file")
+        parser.add_argument('--compare', help="Previous --json results to compare p50 latency against")
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            model, model_name = build_synthetic_model(), 'synthetic'
+        else:
+            source = ModelRegistry(options['model']) if options['model'] else registry
+            model, model_name = source.get_model(), source.version
+
+        images = sample_images(options['images'])
+        if not images:
+            raise CommandError("No sample images found; pass --images DIR")
+
+        rows = run_suite(
+            model, images,
+            batch_sizes=options['batch_sizes'],
+            thread_counts=options['threads'],
+            iterations=options['iterations'],
+        )
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = {(r['stage'], r['batch_size'], r['threads']): r for r in json.load(fh)['results']}
+
+        self.stdout.write(
+            f"{'stage':<11} {'batch':>5} {'thr':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'items/s':>9}"
+            + (f" {'p50 vs base':>12}" if baseline else '')
+        )
+        for row in rows:
+            line = (
+                f"{row['stage']:<11} {row['batch_size']:>5} {row['threads']:>4} {row['p50_ms']:>9.2f} "
+                f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['items_per_sec']:>9.1f}"
+            )
+            previous = baseline.get((row['stage'], row['batch_size'], row['threads']))
+            if previous and previous['p50_ms']:
+                line += f" {(row['p50_ms'] / previous['p50_ms'] - 1) * 100:>+11.1f}%"
+            self.stdout.write(line)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump({
+                    'environment': environment(),
+                    'model': model_name,
+                    'images': len(images),
+                    'results': rows,
+                }, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from classifier import embeddings
+from classifier.inference import preprocess_image, specific_classes, top_predictions
+from classifier.models import ImageEmbedding, WasteImage
+from classifier.registry import registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the on-disk similarity index from the stored ImageEmbedding rows of the current model. "
+        "--backfill first embeds uploads that have no embedding yet; --synthetic N instead benchmarks "
+        "build time, query latency and recall on N generated vectors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true',
+                            help="Embed WasteImage rows without an embedding for the current model first")
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--lists', type=int, help="IVF lists (defaults to sqrt of the row count)")
+        parser.add_argument('--chunk-size', type=int, default=65536, help="Rows read from the DB per chunk")
+        parser.add_argument('--synthetic', type=int, metavar='N', help="Benchmark on N clustered random vectors")
+        parser.add_argument('--dim', type=int, default=1280, help="Vector size for --synthetic")
+        parser.add_argument('--queries', type=int, default=50, help="Queries timed for --synthetic")
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            return self._benchmark(options['synthetic'], options['dim'], options['lists'], options['queries'])
+        if not embeddings.enabled():
+            raise CommandError("Set CLASSIFIER_EMBEDDINGS = True (keras backend) to build the index")
+
+        version = registry.version
+        if options['backfill']:
+            self._backfill(version, options['batch_size'])
+
+        rows = ImageEmbedding.objects.filter(model_version=version)
+        count = rows.count()
+        first = rows.values_list('vector', flat=True).first()
+        if first is None:
+            raise CommandError(f"No embeddings stored for model {version}; run with --backfill")
+        dim = len(np.frombuffer(first, dtype=np.float16))
+
+        start = time.perf_counter()
+        info = embeddings.build_index(
+            embeddings.embedding_index.path, self._db_chunks(rows, options['chunk_size']),
+            count, dim, version, lists=options['lists'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {info['count']} embeddings ({info['dim']} dims, {info['lists']} lists) "
+            f"for model {version} in {time.perf_counter() - start:.1f}s"
+        ))
+
+    def _db_chunks(self, rows, chunk_size):
+        # Keyset pagination keeps every chunk an index range scan, however large the table
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'image_id', 'vector')[:chunk_size])
+            if not chunk:
+                return
+            pks, image_ids, vectors = zip(*chunk)
+            yield np.array(pks), np.array(image_ids), np.vstack([np.frombuffer(v, dtype=np.float16) for v in vectors])
+            last_pk = pks[-1]
+
+    def _backfill(self, version, batch_size):
+        pending = WasteImage.objects.exclude(image='').filter(embedding__isnull=True).order_by('pk')
+        classes = len(specific_classes)
+        last_pk, done = 0, 0
+        while True:
+            images = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not images:
+                break
+            last_pk = images[-1].pk
+            batch, arrays = [], []
+            for image in images:
+                try:
+                    with image.image.open('rb') as fh:
+                        arrays.append(preprocess_image(fh))
+                    batch.append(image)
+                except Exception as exc:
+                    self.stderr.write(f"{image.image.name}: {exc}")
+            if not batch:
+                continue
+            combined = embeddings.run_embedding_model(np.concatenate(arrays))
+            for image, row in zip(batch, combined):
+                embeddings.remember(image, row[:-classes], top_predictions(row[-classes:], k=3))
+            done += len(batch)
+        self.stdout.write(f"Backfilled {done} embedding(s) for model {version}")
+
+    def _benchmark(self, count, dim, lists, queries):
+        rng = np.random.default_rng(0)
+        # Clustered data like real photo embeddings: many items, each seen under varied framing
+        centers = embeddings.normalize(rng.standard_normal((max(count // 200, 1), dim)))
+
+        def chunks(chunk_size=65536):
+            for start in range(0, count, chunk_size):
+                n = min(chunk_size, count - start)
+                assignment = rng.integers(0, len(centers), n)
+                vectors = centers[assignment] + rng.standard_normal((n, dim)).astype(np.float32) * (0.3 / np.sqrt(dim))
+                yield np.arange(start + 1, start + n + 1), np.arange(start + 1, start + n + 1), vectors
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index')
+            start = time.perf_counter()
+            info = embeddings.build_index(path, chunks(), count, dim, 'synthetic', lists=lists)
+            build_seconds = time.perf_counter() - start
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            self.stdout.write(
+                f"Built {count} x {dim} index ({info['lists']} lists, {size / 1e6:.0f} MB) in {build_seconds:.1f}s"
+            )
+
+            index = embeddings.EmbeddingIndex(path, model_version='synthetic')
+            vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+            image_ids = np.load(os.path.join(path, 'image_ids.npy'), mmap_mode='r')
+            picks = rng.choice(count, queries, replace=False)
+            probes = embeddings.normalize(
+                vectors[np.sort(picks)].astype(np.float32) + rng.standard_normal((queries, dim)) * (0.1 / np.sqrt(dim)))
+
+            exact = [self._exact(vectors, image_ids, query, k=10) for query in probes[:min(queries, 10)]]
+            self.stdout.write(f"{'nprobe':>6} {'p50 ms':>8} {'p95 ms':>8} {'recall@10':>10}")
+            for nprobe in (1, 4, 8, 16, 32):
+                times, found = [], []
+                for i, query in enumerate(probes):
+                    t0 = time.perf_counter()
+                    matches = index.search(query, k=10, nprobe=nprobe)
+                    times.append(time.perf_counter() - t0)
+                    if i < len(exact):
+                        found.append(len({m for m, _ in matches} & exact[i]) / 10)
+                p50, p95 = np.percentile(times, [50, 95]) * 1000
+                self.stdout.write(f"{nprobe:>6} {p50:>8.2f} {p95:>8.2f} {np.mean(found):>10.3f}")
+
+    def _exact(self, vectors, image_ids, query, k, chunk_size=65536):
+        scores = np.concatenate([
+            vectors[start:start + chunk_size].astype(np.float32) @ query
+            for start in range(0, len(vectors), chunk_size)
+        ])
+        return {int(image_ids[i]) for i in np.argpartition(-scores, k)[:k]}
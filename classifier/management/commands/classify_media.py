@@ -0,0 +1,165 @@
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from classifier.bulk import IMAGE_EXTENSIONS
+from classifier.inference import format_result, run_model, top_predictions
+from classifier.models import CachedPrediction, WasteImage
+from classifier.offline import decode, in_shard, init_decoder
+from classifier.registry import ModelUnavailable, registry
+from classifier.storage import upload_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-classifies every stored upload with the current model, stores the results in the "
+        "prediction cache and updates the WasteImage rows for each file. Resumable and shardable across machines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['media', 'db'], default='media',
+                            help="Walk MEDIA_ROOT, or only the files referenced by WasteImage rows")
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Decoding/preprocessing processes")
+        parser.add_argument('--shard', type=int, default=0)
+        parser.add_argument('--num-shards', type=int, default=1)
+        parser.add_argument('--no-resume', action='store_true',
+                            help="Re-score images already classified by this model version")
+        parser.add_argument('--output', help="Also write one JSON line per image to this file")
+        parser.add_argument('--progress-every', type=float, default=10.0, help="Seconds between progress lines")
+
+    def handle(self, *args, **options):
+        shard, num_shards = options['shard'], options['num_shards']
+        if num_shards < 1:
+            raise CommandError("--num-shards must be at least 1")
+        if not 0 <= shard < num_shards:
+            raise CommandError(f"--shard must be between 0 and {num_shards - 1}, got {shard}")
+        paths = [
+            p for p in self._paths(options['source'])
+            if in_shard(os.path.relpath(p, settings.MEDIA_ROOT), shard, num_shards)
+        ]
+        try:
+            version = registry.version
+        except ModelUnavailable as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f"Model {version}: {len(paths)} image(s) in shard {shard}/{num_shards}")
+
+        done = set()
+        if not options['no_resume']:
+            done = set(CachedPrediction.objects.filter(model_version=version).values_list('content_hash', flat=True))
+
+        output = open(options['output'], 'a') if options['output'] else None
+        counts = {'classified': 0, 'skipped': 0, 'duplicates': 0, 'errors': 0}
+        start = last_report = time.perf_counter()
+        chunk_size = options['batch_size'] * 4  # bounds how far decoding can run ahead of inference
+
+        try:
+            with multiprocessing.Pool(options['workers'], initializer=init_decoder, initargs=(frozenset(done),)) as pool:
+                for offset in range(0, len(paths), chunk_size):
+                    decoded = pool.imap(decode, paths[offset:offset + chunk_size], chunksize=4)
+                    self._classify_chunk(decoded, options['batch_size'], version, done, counts, output)
+
+                    now = time.perf_counter()
+                    if now - last_report >= options['progress_every']:
+                        self._report(counts, len(paths), now - start)
+                        last_report = now
+        finally:
+            if output:
+                output.close()
+
+        self._report(counts, len(paths), time.perf_counter() - start)
+
+    def _paths(self, source):
+        if source == 'db':
+            names = WasteImage.objects.exclude(image='').values_list('image', flat=True)
+            return sorted(upload_storage.path(name) for name in names)
+        paths = []
+        thumbnails = os.path.join(settings.MEDIA_ROOT, upload_storage.thumbnail_prefix)
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            if root == thumbnails or root.startswith(thumbnails + os.sep):
+                continue  # display copies, not uploads
+            for name in files:
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    def _classify_chunk(self, decoded, batch_size, version, done, counts, output):
+        batch = []
+        known = {}  # content hash -> top-3 classified in this chunk
+        reused = []  # (path, hash) answered by an earlier classification
+        for path, digest, array, error in decoded:
+            if error:
+                counts['errors'] += 1
+                self.stderr.write(f"{path}: {error}")
+            elif array is None:
+                counts['skipped'] += 1
+                reused.append((path, digest))
+            elif digest in done:
+                counts['duplicates'] += 1  # same content earlier in this run
+                reused.append((path, digest))
+            else:
+                done.add(digest)
+                batch.append((path, digest, array))
+                if len(batch) == batch_size:
+                    self._flush(batch, version, counts, output, known)
+                    batch = []
+        if batch:
+            self._flush(batch, version, counts, output, known)
+        if reused:
+            self._update_reused(reused, version, known)
+
+    def _flush(self, batch, version, counts, output, known):
+        probabilities = run_model(np.concatenate([array for _, _, array in batch]))
+        rows, results = [], {}
+        for (path, digest, _), probs in zip(batch, probabilities):
+            top = top_predictions(probs, k=3)
+            known[digest] = top
+            rows.append(CachedPrediction(
+                content_hash=digest, model_version=version, predictions=[list(p) for p in top],
+            ))
+            if output:
+                output.write(json.dumps({'path': path, 'hash': digest, **format_result(top)}) + '\n')
+            results[_storage_name(path)] = top
+        with transaction.atomic():
+            CachedPrediction.objects.bulk_create(rows, ignore_conflicts=True)
+            _update_images(results, version)
+        counts['classified'] += len(batch)
+
+    def _update_reused(self, reused, version, known):
+        """Updates the rows of skipped and duplicate files from the prediction they share."""
+        missing = {digest for _, digest in reused if digest not in known}
+        if missing:
+            stored = CachedPrediction.objects.filter(model_version=version, content_hash__in=missing)
+            for digest, predictions in stored.values_list('content_hash', 'predictions'):
+                known[digest] = [tuple(p) for p in predictions]
+        results = {_storage_name(path): known[digest] for path, digest in reused if digest in known}
+        with transaction.atomic():
+            _update_images(results, version)
+
+    def _report(self, counts, total, elapsed):
+        seen = sum(counts.values())
+        rate = counts['classified'] / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f"{seen}/{total} seen | {counts['classified']} classified, {counts['skipped']} already done, "
+            f"{counts['duplicates']} duplicates, {counts['errors']} errors | {rate:.1f} img/s"
+        )
+
+
+def _storage_name(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def _update_images(results, version):
+    """Sets label, category, confidence and model version on the WasteImage rows of {storage name: top-3}."""
+    images = list(WasteImage.objects.filter(image__in=list(results)).exclude(model_version=version))
+    for image in images:
+        image.label, image.category, image.confidence = results[image.image.name][0]
+        image.model_version = version
+    WasteImage.objects.bulk_update(images, ['label', 'category', 'confidence', 'model_version'], batch_size=500)
@@ -0,0 +1,95 @@
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from classifier import backends
+from classifier.benchmarks import sample_images
+from classifier.inference import preprocess_image
+from classifier.registry import ModelRegistry, rss_bytes
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the Keras classifier to a quantized TFLite artifact for CLASSIFIER_BACKEND = 'tflite', "
+        "then reports accuracy drift, latency and memory against the Keras model over the sample images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help="Keras model to convert (defaults to CLASSIFIER_MODEL_PATH)")
+        parser.add_argument('--output', help="Artifact path (defaults to CLASSIFIER_TFLITE_MODEL_PATH)")
+        parser.add_argument('--quantization', choices=['int8', 'float16', 'dynamic', 'none'], default='int8')
+        parser.add_argument('--images', help="Sample images for calibration and the drift check (defaults to MEDIA_ROOT)")
+        parser.add_argument('--calibration-images', type=int, default=100)
+        parser.add_argument('--no-check', action='store_true', help="Skip the drift/latency comparison")
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+
+        keras_path = options['model'] or backends.default_model_path('keras')
+        output = options['output'] or backends.default_model_path('tflite')
+        images = sample_images(options['images'], limit=max(options['calibration_images'], 1))
+        if not images:
+            raise CommandError("No sample images found; pass --images DIR")
+
+        model = ModelRegistry(keras_path, backend='keras').get_model()
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        quantization = options['quantization']
+        if quantization != 'none':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            # Full integer quantization, calibrated on real uploads
+            def representative_dataset():
+                for path in images:
+                    yield [preprocess_image(path)]
+
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.uint8
+            converter.inference_output_type = tf.uint8
+
+        artifact = converter.convert()
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'wb') as fh:
+            fh.write(artifact)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {quantization} TFLite model to {output} ({len(artifact) / 1e6:.1f} MB, "
+            f"Keras file {os.path.getsize(keras_path) / 1e6:.1f} MB)"
+        ))
+
+        if not options['no_check']:
+            self._compare(model, output, images)
+
+    def _compare(self, keras_model, tflite_path, images):
+        rss_before = rss_bytes()
+        lite_model = backends.load_tflite(tflite_path)
+        rss_after = rss_bytes()
+
+        keras_probs, lite_probs = [], []
+        keras_times, lite_times = [], []
+        for path in images:
+            batch = preprocess_image(path)
+            start = time.perf_counter()
+            keras_probs.append(keras_model.predict(batch, verbose=0)[0])
+            keras_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            lite_probs.append(lite_model.predict(batch)[0])
+            lite_times.append(time.perf_counter() - start)
+
+        keras_probs, lite_probs = np.array(keras_probs), np.array(lite_probs)
+        agreement = float(np.mean(keras_probs.argmax(axis=1) == lite_probs.argmax(axis=1))) * 100
+        abs_diff = np.abs(keras_probs - lite_probs)
+
+        self.stdout.write(f"Drift over {len(images)} sample images:")
+        self.stdout.write(f"  top-1 agreement         {agreement:.1f}%")
+        self.stdout.write(f"  mean |prob diff|        {abs_diff.mean():.4f}")
+        self.stdout.write(f"  max |prob diff|         {abs_diff.max():.4f}")
+        self.stdout.write("Latency per image (p50 / p95 ms):")
+        for name, times in (('keras', keras_times), ('tflite', lite_times)):
+            p50, p95 = np.percentile(times, [50, 95]) * 1000
+            self.stdout.write(f"  {name:<8} {p50:8.2f} / {p95:8.2f}")
+        if rss_before and rss_after:
+            self.stdout.write(f"TFLite interpreter RSS growth: {(rss_after - rss_before) / 1e6:.1f} MB")
@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+from multiprocessing.connection import wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from classifier.jobs import requeue_stale_jobs
+from classifier.workers import worker_main
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = "Runs a pool of inference worker processes that consume queued classification jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=0.5, help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--batch-size', type=int, default=None, help="Jobs claimed per model call")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        # Children must open their own database connections
+        connections.close_all()
+        processes = [self._start(i, options) for i in range(options['processes'])]
+        self.stdout.write(self.style.SUCCESS(f"Started {len(processes)} inference worker(s); Ctrl+C to stop"))
+
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            while True:
+                # Blocks until a worker exits, then starts a replacement
+                wait([process.sentinel for process in processes])
+                for i, process in enumerate(processes):
+                    if not process.is_alive():
+                        process.join()
+                        self.stderr.write(f"{process.name} exited with code {process.exitcode}; restarting it")
+                        processes[i] = self._start(i, options)
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+    def _start(self, number, options):
+        process = multiprocessing.Process(
+            target=worker_main,
+            args=(options['poll_interval'], options['batch_size']),
+            name=f'classifier-worker-{number}',
+            daemon=True,
+        )
+        process.start()
+        return process
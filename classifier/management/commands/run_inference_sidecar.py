@@ -0,0 +1,38 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from classifier import sidecar
+from classifier.registry import ModelUnavailable, registry
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = (
+        "Serves the classifier model over a Unix domain socket so web workers with "
+        "CLASSIFIER_SIDECAR_SOCKET set share one copy of the model instead of loading their own."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', help="Socket path (defaults to CLASSIFIER_SIDECAR_SOCKET)")
+
+    def handle(self, *args, **options):
+        path = options['socket'] or sidecar.socket_path()
+        if not path:
+            raise CommandError("Pass --socket or set CLASSIFIER_SIDECAR_SOCKET")
+        try:
+            registry.get_model()
+        except ModelUnavailable as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving model {registry.version} ({registry.backend}) on {path}; Ctrl+C to stop"
+        ))
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+        try:
+            sidecar.serve(path)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:12
+
+import classifier.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0003_classificationjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wasteimage',
+            name='image',
+            field=models.ImageField(db_index=True, storage=classifier.storage.get_upload_storage, upload_to='uploads/'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0004_alter_wasteimage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasteimage',
+            name='category',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='wasteimage',
+            name='confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wasteimage',
+            name='label',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='wasteimage',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='wasteimage',
+            index=models.Index(fields=['uploaded_at', 'category'], name='classifier__uploade_9529b4_idx'),
+        ),
+    ]
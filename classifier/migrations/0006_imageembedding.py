@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0005_wasteimage_prediction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=64)),
+                ('vector', models.BinaryField()),
+                ('predictions', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to='classifier.wasteimage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'id'], name='classifier__model_v_58df6d_idx')],
+            },
+        ),
+    ]
@@ -1,10 +1,111 @@
 
 # Create your models here.
+import uuid
+
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .storage import get_upload_storage, upload_storage
+
 
 class WasteImage(models.Model):
-    image = models.ImageField(upload_to='uploads/')
+    image = models.ImageField(upload_to='uploads/', storage=get_upload_storage, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Top-1 prediction; blank when the model was unavailable at upload time
+    label = models.CharField(max_length=50, blank=True)
+    category = models.CharField(max_length=20, blank=True)
+    confidence = models.FloatField(null=True, blank=True)
+    model_version = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            # Covers the history aggregates: range scan on uploaded_at, grouped by category
+            models.Index(fields=['uploaded_at', 'category']),
+        ]
 
     def __str__(self):
         return f"WasteImage {self.id}"
+
+
+class ImageEmbedding(models.Model):
+    """Penultimate-layer CNN embedding of an upload; the similarity index is rebuilt from these rows."""
+    image = models.OneToOneField(WasteImage, on_delete=models.CASCADE, related_name='embedding')
+    model_version = models.CharField(max_length=64)
+    vector = models.BinaryField()  # L2-normalized float16
+    predictions = models.JSONField()  # top-3 [label, category, confidence] at the time of upload
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_version', 'id']),
+        ]
+
+    def __str__(self):
+        return f"ImageEmbedding {self.image_id} @ {self.model_version}"
+
+
+class CachedPrediction(models.Model):
+    """Persistent tier of the prediction cache: top-3 results per image content and model."""
+    content_hash = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=64)
+    predictions = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'model_version'], name='unique_cached_prediction'),
+        ]
+
+    def __str__(self):
+        return f"CachedPrediction {self.content_hash[:12]} @ {self.model_version}"
+
+
+class ClassificationJob(models.Model):
+    """An upload queued for classification by the background inference workers."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    image_name = models.CharField(max_length=255)  # name in default storage
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"ClassificationJob {self.id} ({self.status})"
+
+
+def image_references(name):
+    """Rows still pointing at a stored upload; the file is deleted when this drops to zero."""
+    return (
+        WasteImage.objects.filter(image=name).count()
+        + ClassificationJob.objects.filter(image_name=name).count()
+    )
+
+
+@receiver(post_delete, sender=WasteImage)
+def release_waste_image(sender, instance, **kwargs):
+    if instance.image:
+        upload_storage.release(instance.image.name, image_references(instance.image.name))
+
+
+@receiver(post_delete, sender=ClassificationJob)
+def release_job_image(sender, instance, **kwargs):
+    upload_storage.release(instance.image_name, image_references(instance.image_name))
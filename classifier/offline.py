@@ -0,0 +1,46 @@
+"""
+Helpers for offline (re-)classification of stored images.
+
+decode() runs in classify_media's pool workers. Importing this module
+imports classifier.inference, which reads Django settings at import time,
+so a spawned worker needs DJANGO_SETTINGS_MODULE (inherited from
+manage.py). It never queries the database or uses models, so workers do
+not need django.setup().
+"""
+import hashlib
+import io
+import zlib
+
+from .inference import preprocess_image
+
+_skip_hashes = frozenset()
+
+
+def init_decoder(skip_hashes):
+    global _skip_hashes
+    _skip_hashes = skip_hashes
+
+
+def decode(path):
+    """
+    Reads, hashes and preprocesses one image in a pool worker.
+    Returns (path, content hash, array or None, error or None); the array is
+    None when the hash was already classified for the current model.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            data = fh.read()
+    except OSError as exc:
+        return path, None, None, str(exc)
+    digest = hashlib.sha256(data).hexdigest()
+    if digest in _skip_hashes:
+        return path, digest, None, None
+    try:
+        return path, digest, preprocess_image(io.BytesIO(data)), None
+    except Exception as exc:
+        return path, digest, None, str(exc)
+
+
+def in_shard(name, shard, num_shards):
+    """Stable assignment of a file to one of `num_shards` machines."""
+    return zlib.crc32(name.encode('utf-8')) % num_shards == shard
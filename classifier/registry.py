@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import backends
+
+
+class ModelUnavailable(Exception):
+    """Raised when the waste CNN cannot be loaded (missing file, bad weights, ...)."""
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Owns the Keras model used by the classifier.
+
+    - Loads the model lazily on first use (or eagerly from AppConfig.ready()
+      when CLASSIFIER_EAGER_LOAD is set)
+    - Runs CLASSIFIER_WARMUP_RUNS dummy predictions after loading so the first
+      real request does not pay for graph tracing
+    - Watches the model file and hot-swaps in a new version when it changes,
+      without restarting the worker
+    """
+
+    def __init__(self, path=None, backend=None):
+        self._path = path
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._model = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._stats = {}
+
+    @property
+    def backend(self):
+        return self._backend or backends.backend_name()
+
+    @property
+    def path(self):
+        return self._path or backends.default_model_path(self.backend)
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    @property
+    def version(self):
+        """Short content hash of the currently loaded model file."""
+        self.get_model()
+        return self._stats['version']
+
+    def get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load(self.path)
+        else:
+            self._maybe_reload()
+        return self._model
+
+    def reload(self, path=None):
+        """Load `path` (or the configured path) and swap it in atomically."""
+        if path is not None:
+            self._path = path
+        with self._lock:
+            self._load(self.path)
+        return self._model
+
+    def stats(self):
+        return dict(self._stats, loaded=self.is_loaded, path=self.path, backend=self.backend)
+
+    def _maybe_reload(self):
+        interval = getattr(settings, 'CLASSIFIER_MODEL_RELOAD_INTERVAL', 30)
+        now = time.monotonic()
+        if interval is None or now - self._last_check < interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return  # keep serving the model we already have
+        if mtime == self._mtime or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._load(self.path)
+        except ModelUnavailable:
+            self._mtime = mtime  # don't retry a broken file on every request
+        finally:
+            self._lock.release()
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            raise ModelUnavailable(f"Model file not found: {path}")
+
+        mtime = os.path.getmtime(path)
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        try:
+            model = backends.load(path, self.backend)
+        except Exception as exc:
+            raise ModelUnavailable(f"Could not load model from {path}: {exc}") from exc
+        load_seconds = time.perf_counter() - start
+
+        warmup_seconds = self._warm_up(model)
+        rss_after = rss_bytes()
+
+        self._stats = {
+            'version': _file_digest(path),
+            'loaded_at': time.time(),
+            'load_seconds': round(load_seconds, 4),
+            'warmup_seconds': round(warmup_seconds, 4),
+            'parameters': int(model.count_params()),
+            'weights_bytes': int(sum(
+                np.prod(w.shape) * np.dtype(getattr(w.dtype, 'name', w.dtype)).itemsize
+                for w in model.weights
+            )),
+            'rss_delta_bytes': rss_after - rss_before if rss_before and rss_after else None,
+            'file_bytes': os.path.getsize(path),
+        }
+        # Swap last so concurrent readers only ever see a fully warmed model
+        self._model = model
+        self._mtime = mtime
+        self._last_check = time.monotonic()
+
+    def _warm_up(self, model):
+        runs = getattr(settings, 'CLASSIFIER_WARMUP_RUNS', 1)
+        if not runs:
+            return 0.0
+        shape = tuple(dim or 1 for dim in model.input_shape)
+        dummy = np.zeros(shape, dtype=np.float32)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model.predict(dummy, verbose=0)
+        return time.perf_counter() - start
+
+
+registry = ModelRegistry()
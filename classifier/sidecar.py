@@ -0,0 +1,217 @@
+"""
+Local inference sidecar: one process owns the model, web workers talk to it
+over a Unix domain socket instead of each loading TensorFlow and the weights.
+
+- `manage.py run_inference_sidecar` serves CLASSIFIER_SIDECAR_SOCKET
+- SidecarClient sends preprocessed batches and gets probabilities (or
+  embeddings) back; requests from all workers meet in the sidecar's
+  micro-batcher, so they are batched together too
+- When the sidecar is unreachable the caller falls back to in-process
+  inference and the client backs off for CLASSIFIER_SIDECAR_RETRY_SECONDS
+
+Wire format, both directions: 4-byte big-endian header length, JSON header,
+then `nbytes` of raw array data.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .registry import ModelUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Set in the sidecar process itself so its own inference never loops back to the socket
+_serving = False
+
+
+class SidecarUnavailable(Exception):
+    """Raised when the sidecar cannot be reached; callers fall back to in-process inference."""
+
+
+def socket_path():
+    return getattr(settings, 'CLASSIFIER_SIDECAR_SOCKET', None)
+
+
+def enabled():
+    return bool(socket_path()) and not _serving
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def send_message(sock, header, array=None):
+    payload = b''
+    if array is not None:
+        array = np.ascontiguousarray(array)
+        header = dict(header, shape=list(array.shape), dtype=array.dtype.str)
+        payload = array.tobytes()
+    data = json.dumps(dict(header, nbytes=len(payload))).encode()
+    sock.sendall(struct.pack('>I', len(data)) + data + payload)
+
+
+def recv_message(sock):
+    """Returns (header, array or None)."""
+    size = struct.unpack('>I', _recv_exact(sock, 4))[0]
+    header = json.loads(_recv_exact(sock, size))
+    array = None
+    if header.get('nbytes'):
+        payload = _recv_exact(sock, header['nbytes'])
+        array = np.frombuffer(payload, dtype=header['dtype']).reshape(header['shape'])
+    return header, array
+
+
+class SidecarClient:
+    """Thread-safe client; keeps one persistent connection per thread."""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._local = threading.local()
+        self._down_until = 0.0
+        self.version = None  # model version reported with the last reply
+
+    @property
+    def path(self):
+        return self._path or socket_path()
+
+    @property
+    def is_down(self):
+        """True while the client is backing off after a failure (callers use in-process inference)."""
+        return time.monotonic() < self._down_until
+
+    def predict(self, img_array):
+        return self._call({'op': 'predict'}, img_array)[1]
+
+    def embed(self, img_array):
+        return self._call({'op': 'embed'}, img_array)[1]
+
+    def status(self):
+        return self._call({'op': 'status'})[0]['stats']
+
+    def _call(self, header, array=None):
+        if self.is_down:
+            raise SidecarUnavailable("Sidecar marked down; retrying later")
+        # A kept-alive connection may have been closed by a sidecar restart: retry once on a fresh one
+        for attempt in (0, 1):
+            sock = self._connection()
+            try:
+                send_message(sock, header, array)
+                reply, result = recv_message(sock)
+                break
+            except OSError as exc:
+                self._disconnect()
+                if attempt or isinstance(exc, TimeoutError):
+                    self._mark_down(exc)
+        if not reply.get('ok'):
+            if reply.get('unavailable'):
+                raise ModelUnavailable(reply['error'])
+            raise RuntimeError(f"Sidecar error: {reply.get('error')}")
+        self.version = reply.get('version', self.version)
+        return reply, result
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(getattr(settings, 'CLASSIFIER_SIDECAR_TIMEOUT', 30))
+            try:
+                sock.connect(self.path)
+            except OSError as exc:
+                sock.close()
+                self._mark_down(exc)
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _mark_down(self, exc):
+        retry = getattr(settings, 'CLASSIFIER_SIDECAR_RETRY_SECONDS', 5)
+        self._down_until = time.monotonic() + retry
+        self.version = None  # a restarted sidecar may serve another model; re-read it on reconnect
+        logger.warning("Inference sidecar at %s unavailable (%s); using in-process inference for %ss",
+                       self.path, exc, retry)
+        raise SidecarUnavailable(str(exc)) from exc
+
+
+client = SidecarClient()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        from . import embeddings
+        from .inference import predict
+        from .registry import registry
+
+        while True:
+            try:
+                header, array = recv_message(self.request)
+            except (ConnectionError, struct.error, OSError):
+                return  # client went away
+            try:
+                op = header.get('op')
+                if op == 'predict':
+                    result = predict(array)
+                elif op == 'embed':
+                    vectors, probabilities = embeddings.embed(array)
+                    result = np.hstack([vectors, probabilities])
+                elif op == 'status':
+                    result = None
+                else:
+                    raise ValueError(f"Unknown op {op!r}")
+                reply = {'ok': True, 'version': registry.version}
+                if op == 'status':
+                    reply['stats'] = self.server.stats()
+                send_message(self.request, reply, result)
+            except ModelUnavailable as exc:
+                send_message(self.request, {'ok': False, 'unavailable': True, 'error': str(exc)})
+            except Exception as exc:
+                logger.exception("Sidecar request failed")
+                send_message(self.request, {'ok': False, 'error': str(exc)})
+
+
+class SidecarServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+
+    def stats(self):
+        from .inference import batcher
+        from .registry import registry, rss_bytes
+        return {**registry.stats(), 'batching': batcher.stats(), 'pid': os.getpid(), 'rss_bytes': rss_bytes()}
+
+
+def serve(path=None):
+    """Loads the model and serves it on `path` until interrupted."""
+    global _serving
+    _serving = True
+    from .registry import registry
+    registry.get_model()
+    server = SidecarServer(path or socket_path())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(server.server_address)
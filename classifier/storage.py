@@ -0,0 +1,131 @@
+import hashlib
+import io
+import mimetypes
+import os
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores uploads under the SHA-256 of their content, so identical photos
+    share a single file however many times they are uploaded.
+
+    - uploads/ab/abcdef....jpg holds the original, written once
+    - thumbnails/ab/abcdef....jpg holds a compressed display copy, generated
+      when the original is first stored
+    - files are only removed by release() once no row references them, and
+      not within `release_grace_seconds` of being stored: an upload of the
+      same content may be about to add its row
+    """
+
+    prefix = 'uploads'
+    thumbnail_prefix = 'thumbnails'
+    release_grace_seconds = 60
+
+    def __init__(self, **kwargs):
+        # Identical name means identical bytes, so a concurrent writer may safely overwrite
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def content_name(self, content, original_name):
+        """
+        Storage name for `content` (bytes or a file): its hash plus the
+        extension of the image format Pillow detects, whatever the client
+        called the file ('.bin' when it is not an image).
+        """
+        digest = hashlib.sha256()
+        if isinstance(content, bytes):
+            digest.update(content)
+            extension = image_extension(io.BytesIO(content))
+        else:
+            content.seek(0)
+            for chunk in iter(lambda: content.read(1024 * 1024), b''):
+                digest.update(chunk)
+            content.seek(0)
+            extension = image_extension(content)
+            content.seek(0)
+        hexdigest = digest.hexdigest()
+        return f"{self.prefix}/{hexdigest[:2]}/{hexdigest}{extension}"
+
+    def thumbnail_name(self, name):
+        stem = os.path.splitext(os.path.basename(name))[0]
+        return f"{self.thumbnail_prefix}/{stem[:2]}/{stem}.jpg"
+
+    def thumbnail_url(self, name):
+        """URL of the display thumbnail, or of the original when no thumbnail exists."""
+        thumbnail = self.thumbnail_name(name)
+        return self.url(thumbnail if self.exists(thumbnail) else name)
+
+    def save(self, name, content, max_length=None):
+        if isinstance(content, bytes):
+            content = ContentFile(content)
+        elif not hasattr(content, 'chunks'):
+            content = File(content, name)
+        target = self.content_name(content, name)
+        try:
+            # Already stored: restart release()'s grace period instead of writing it again
+            os.utime(self.path(target))
+        except FileNotFoundError:
+            super()._save(target, content)
+            self._save_thumbnail(target, content)
+        return target
+
+    def release(self, name, references):
+        """
+        Deletes `name` and its thumbnail when `references` (rows still pointing
+        at it) is zero, unless it was stored within the grace period: the
+        count cannot see the row a concurrent upload of the same content has
+        not created yet.
+        """
+        if references or not name.startswith(self.prefix + '/'):
+            return
+        try:
+            age = time.time() - os.path.getmtime(self.path(name))
+        except OSError:
+            return  # already gone
+        if age >= self.release_grace_seconds:
+            self.delete(name)
+            self.delete(self.thumbnail_name(name))
+
+    def _save_thumbnail(self, name, content):
+        size = getattr(settings, 'CLASSIFIER_THUMBNAIL_SIZE', (480, 480))
+        quality = getattr(settings, 'CLASSIFIER_THUMBNAIL_QUALITY', 80)
+        content.seek(0)
+        try:
+            with Image.open(content) as img:
+                already_small = img.format == 'JPEG' and img.width <= size[0] and img.height <= size[1]
+                img.draft('RGB', size)
+                img = img.convert('RGB')
+                img.thumbnail(size)
+                buffer = io.BytesIO()
+                img.save(buffer, format='JPEG', quality=quality, optimize=True)
+        except (OSError, ValueError):
+            return  # not a decodable image; the original is still served
+        thumbnail = buffer.getvalue()
+        if already_small and len(thumbnail) >= content.size:
+            # Re-encoding a small JPEG would only make it bigger
+            content.seek(0)
+            thumbnail = content.read()
+        super()._save(self.thumbnail_name(name), ContentFile(thumbnail))
+
+
+def image_extension(source):
+    """File extension of the image format in `source` (a binary file), or '.bin' if Pillow cannot identify it."""
+    try:
+        with Image.open(source) as img:
+            mime = Image.MIME.get(img.format)
+    except (OSError, ValueError):
+        return '.bin'
+    return (mimetypes.guess_extension(mime) if mime else None) or f'.{img.format.lower()}'
+
+
+def get_upload_storage():
+    return upload_storage
+
+
+upload_storage = ContentAddressedStorage()
@@ -1,3 +1,143 @@
-from django.test import TestCase
+import io
+import threading
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .batching import MicroBatcher
+from .bulk import MemberTooLarge, _read_member, load_image
+from .cache import PredictionCache, content_hash
+from .frames import _objects
+from .inference import specific_classes
+from .models import CachedPrediction
+from .offline import in_shard
+
+TOP = [('battery', 'Hazardous', 91.5), ('metal', 'Recyclable', 5.0), ('trash', 'Non-Recyclable', 1.0)]
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_each_caller_gets_its_own_rows(self):
+        batcher = MicroBatcher(lambda batch: batch * 2, max_batch_size=64, max_wait_ms=50)
+        results = {}
+
+        def call(i):
+            results[i] = batcher.predict(np.full((i % 3 + 1, 2), float(i)), timeout=5)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(10):
+            np.testing.assert_array_equal(results[i], np.full((i % 3 + 1, 2), 2.0 * i))
+        stats = batcher.stats()
+        self.assertEqual(stats['images'], sum(i % 3 + 1 for i in range(10)))
+        self.assertLess(stats['batches'], 10)
+
+    def test_error_reaches_every_caller_in_the_batch(self):
+        def fail(batch):
+            raise RuntimeError('model failed')
+
+        batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=50)
+        futures = [batcher.submit(np.zeros((1, 2))) for _ in range(3)]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, 'model failed'):
+                future.result(timeout=5)
+        # The worker keeps serving after a failed batch
+        batcher.predict_fn = lambda batch: batch + 1
+        np.testing.assert_array_equal(batcher.predict(np.zeros((1, 2)), timeout=5), np.ones((1, 2)))
+
+
+class PredictionCacheTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('classifier.cache.model_version', return_value='v1')
+        self.model_version = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = PredictionCache()
+
+    def test_content_hash_ignores_the_file_name(self):
+        self.assertEqual(content_hash(io.BytesIO(b'same bytes')), content_hash(io.BytesIO(b'same bytes')))
+        self.assertNotEqual(content_hash(io.BytesIO(b'same bytes')), content_hash(io.BytesIO(b'other bytes')))
+
+    def test_hit_for_the_same_hash_and_version(self):
+        self.assertIsNone(self.cache.get('abc'))
+        self.cache.set('abc', TOP)
+        self.assertEqual(self.cache.get('abc'), TOP)
+        self.assertEqual((self.cache.stats()['memory_hits'], self.cache.stats()['misses']), (1, 1))
+
+    @override_settings(CLASSIFIER_CACHE_PERSISTENT=False)
+    def test_new_model_version_misses(self):
+        self.cache.get('abc')
+        self.cache.set('abc', TOP)
+        self.assertEqual(self.cache.stats()['size'], 1)
+        self.model_version.return_value = 'v2'
+        self.assertIsNone(self.cache.get('abc'))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    @override_settings(CLASSIFIER_CACHE_PERSISTENT=True)
+    def test_persistent_tier_is_keyed_by_version(self):
+        self.cache.set('abc', TOP)
+        self.assertTrue(CachedPrediction.objects.filter(content_hash='abc', model_version='v1').exists())
+        self.assertEqual(PredictionCache().get('abc'), TOP)
+        self.model_version.return_value = 'v2'
+        self.assertIsNone(PredictionCache().get('abc'))
+
+
+class ReadMemberTests(SimpleTestCase):
+    def archive(self, size):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('photo.jpg', b'\0' * size)
+        return zipfile.ZipFile(buffer)
+
+    def test_member_at_the_cap_is_read(self):
+        archive = self.archive(1000)
+        data = _read_member(archive, archive.getinfo('photo.jpg'), max_bytes=1000)
+        self.assertEqual(len(data.getvalue()), 1000)
+
+    def test_member_over_the_cap_is_an_error(self):
+        archive = self.archive(1001)
+        error = _read_member(archive, archive.getinfo('photo.jpg'), max_bytes=1000)
+        self.assertIsInstance(error, MemberTooLarge)
+        self.assertEqual(load_image(error), (None, 'larger than 1000 bytes uncompressed'))
+
+
+class InShardTests(SimpleTestCase):
+    names = [f'uploads/image{i}.jpg' for i in range(200)]
+
+    def test_each_name_is_in_exactly_one_shard(self):
+        for name in self.names:
+            self.assertEqual(sum(in_shard(name, shard, 4) for shard in range(4)), 1)
+
+    def test_assignment_is_stable(self):
+        # crc32, unlike hash(), gives every machine and run the same answer
+        self.assertTrue(in_shard('uploads/battery1.jpg', 1, 4))
+        self.assertTrue(in_shard('uploads/cardboard7.png', 2, 4))
+
+
+def _smoothed(labels):
+    return {index: np.eye(len(specific_classes))[label] for index, label in enumerate(labels)}
+
+
+class FrameObjectsTests(SimpleTestCase):
+    def objects(self, labels, min_run=2):
+        names = [f'frame{i}.jpg' for i in range(len(labels))]
+        return [(obj['label'], obj['first_frame'], obj['last_frame'], obj['frames'])
+                for obj in _objects(names, _smoothed(labels), min_run)]
+
+    def test_flicker_is_folded_into_the_previous_run(self):
+        self.assertEqual(self.objects([0, 0, 0, 5, 0, 0]), [('battery', 'frame0.jpg', 'frame5.jpg', 6)])
+
+    def test_flicker_at_the_start_is_folded_into_the_next_run(self):
+        self.assertEqual(self.objects([5, 3, 3, 3]), [('cardboard', 'frame0.jpg', 'frame3.jpg', 4)])
+
+    def test_stable_runs_are_separate_objects(self):
+        self.assertEqual(self.objects([3, 3, 3, 7, 7, 7]), [
+            ('cardboard', 'frame0.jpg', 'frame2.jpg', 3),
+            ('paper', 'frame3.jpg', 'frame5.jpg', 3),
+        ])
+
+    def test_only_flicker_has_no_objects(self):
+        self.assertEqual(self.objects([1, 2, 3], min_run=2), [])
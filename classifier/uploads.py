@@ -0,0 +1,21 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+# Single writer thread: uploads are persisted off the request's critical path
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='classifier-upload')
+
+
+def save_upload_async(storage, name, data):
+    """Writes `data` to `storage` under `name` in the background and returns the Future."""
+    def write():
+        try:
+            return storage.save(name, ContentFile(data))
+        except Exception:
+            logger.exception("Could not persist upload %s", name)
+            raise
+
+    return _writer.submit(write)
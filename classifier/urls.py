@@ -3,4 +3,12 @@ from . import views
 
 urlpatterns = [
     path('', views.upload_image, name='upload_image'),
+    path('bulk/', views.bulk_classify, name='bulk_classify'),
+    path('sequence/', views.classify_sequence, name='classifier_sequence'),
+    path('jobs/', views.create_job, name='classifier_create_job'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='classifier_job_status'),
+    path('history/', views.classification_history, name='classifier_history'),
+    path('similar/', views.similar_images, name='classifier_similar'),
+    path('images/<int:image_id>/similar/', views.similar_images, name='classifier_image_similar'),
+    path('model/status/', views.model_status, name='classifier_model_status'),
 ]
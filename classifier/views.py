@@ -1,116 +1,149 @@
-import os
-import numpy as np
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
-from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .forms import ImageUploadForm
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import matplotlib
-from django.core.files.storage import FileSystemStorage
+from .registry import registry, ModelUnavailable
+from .inference import (
+    batcher, ensure_model, model_version, predict, preprocess_image, top_predictions,
+)
+from django.conf import settings
 import io
+import numpy as np
+from PIL import Image
+from datetime import datetime, time, timedelta
 import base64
-from .models import WasteImage
-
-matplotlib.use('Agg')  # Use non-GUI backend
-import matplotlib.pyplot as plt
-import uuid
-
-# Load the trained CNN model
-BASE_DIR = settings.BASE_DIR
-MODEL_PATH = os.path.join(BASE_DIR, 'ml_model', 'waste_cnn.h5')
-model = load_model(MODEL_PATH)
-
-# Model's original classes (exact order)
-specific_classes = [
-    'battery',       # 0
-    'biological',    # 1
-    'brown-glass',   # 2
-    'cardboard',     # 3
-    'clothes',       # 4
-    'green-glass',   # 5
-    'metal',         # 6
-    'paper',         # 7
-    'plastic',       # 8
-    'shoes',         # 9
-    'trash',         # 10
-    'white-glass'    # 11
-]
-
-# Index to label mapping
-class_indices = {i: label for i, label in enumerate(specific_classes)}
-
-# Label to category mapping
-label_to_category = {
-    'battery': 'Hazardous',
-    'biological': 'Organic',
-    'brown-glass': 'Recyclable',
-    'cardboard': 'Recyclable',
-    'clothes': 'Hazardous',
-    'green-glass': 'Recyclable',
-    'metal': 'Recyclable',
-    'paper': 'Recyclable',
-    'plastic': 'Recyclable',
-    'shoes': 'Hazardous',
-    'trash': 'Hazardous',
-    'white-glass': 'Recyclable'
+from .models import WasteImage, ClassificationJob, ImageEmbedding
+from ecoguard.metrics import timer
+from . import embeddings, sidecar
+from .jobs import enqueue_job
+from .history import PERIODS, category_counts, record_prediction
+from .cache import content_hash, prediction_cache
+from .bulk import classify_stream, iter_images, ndjson_lines
+from .frames import classify_frames
+from .storage import upload_storage
+from .uploads import save_upload_async
+
+# Color mapping based on category
+CATEGORY_COLORS = {
+    'Recyclable': 'gold',
+    'Organic': 'green',
+    'Hazardous': 'red'
 }
-def preprocess_image(path):
-    """
-    Loads and preprocesses an image for model prediction.
-    - Resizes to 224x224 (or whatever your model was trained on)
-    - Converts to array and normalizes pixel values
-    """
-    img = image.load_img(path, target_size=(224, 224)) 
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0) 
-    img_array = img_array / 255.0
-    return img_array
-
-def classify_image(image_path):
-    img_array = preprocess_image(image_path)
-    predictions = model.predict(img_array)[0]
-
-    top_indices = predictions.argsort()[-3:][::-1]  # top 3 predictions
-    labels = [specific_classes[i] for i in top_indices]
-    confidences = [float(predictions[i]) * 100 for i in top_indices]
-    categories = [label_to_category[label] for label in labels]
-
-    # Color mapping based on category
-    color_map = {
-        'Recyclable': 'gold',
-        'Organic': 'green',
-        'Hazardous': 'red'
-    }
-    colors = [color_map.get(category, 'blue') for category in categories]
-
-    # Plotting
-    plt.figure(figsize=(10, 6))
-    bars = plt.bar(labels, confidences, color=colors)
-    plt.ylim(0, 100)
-    plt.title("Top 3 Waste Predictions", fontsize=14)
-    plt.xlabel("Waste Type", fontsize=12)
-    plt.ylabel("Confidence (%)", fontsize=12)
+
+# Geometry of the inline SVG prediction chart
+CHART_LEFT = 60
+CHART_BAR_WIDTH = 120
+CHART_BAR_STEP = 180
+CHART_BASELINE = 260
+CHART_PLOT_HEIGHT = 220
+
+def classify_image(source):
+    """
+    Classifies an image given as a path or a binary file-like object.
+    Returns (label, category, confidence, chart bars, optional PNG chart URL).
+    """
+    top, _ = predict_top(source)
+    predictions, chart_url = prediction_chart(top)
+    label, category, confidence = top[0]
+    return label, category, confidence, predictions, chart_url
+
+
+def predict_top(source):
+    """
+    Top-3 predictions for an image, plus its embedding when CLASSIFIER_EMBEDDINGS
+    is on and the model actually ran (None otherwise).
+    """
+    # Identical uploads are answered from the prediction cache
+    key = content_hash(source)
+    top = prediction_cache.get(key)
+    if top is not None:
+        return top, None
+
+    img_array = preprocess_image(source)
+    vector = None
+    if embeddings.enabled():
+        vectors, probabilities = embeddings.embed(img_array)
+        vector = vectors[0]
+        # Near-duplicates of a past upload get the same answer
+        top = embeddings.reuse_prediction(vector) or top_predictions(probabilities[0], k=3)
+    else:
+        top = top_predictions(predict(img_array)[0], k=3)  # top 3 predictions
+    prediction_cache.set(key, top)
+    return top, vector
+
+
+def prediction_chart(top):
+    """Chart bars for the inline SVG, plus the PNG data URL when CLASSIFIER_CHART_PNG is on."""
+    with timer('classifier.chart'):
+        chart_url = None
+        if getattr(settings, 'CLASSIFIER_CHART_PNG', False):
+            chart_url = render_prediction_chart_png(top)
+        return prediction_chart_bars(top), chart_url
+
+
+def prediction_chart_bars(top):
+    """
+    Lays out the top predictions as bars for the inline SVG chart in
+    classifier/_prediction_chart.html (600x300 viewBox, 0-100% on the y axis).
+    """
+    bars = []
+    for i, (label, category, confidence) in enumerate(top):
+        height = round(confidence * CHART_PLOT_HEIGHT / 100, 1)
+        bars.append({
+            'label': label,
+            'category': category,
+            'confidence': round(confidence, 1),
+            'color': CATEGORY_COLORS.get(category, 'blue'),
+            'x': CHART_LEFT + i * CHART_BAR_STEP,
+            'center': CHART_LEFT + i * CHART_BAR_STEP + CHART_BAR_WIDTH / 2,
+            'y': round(CHART_BASELINE - height, 1),
+            'height': height,
+        })
+    return bars
+
+
+def render_prediction_chart_png(top):
+    """
+    Opt-in fallback (CLASSIFIER_CHART_PNG): the original matplotlib bar chart
+    as a base64 PNG data URL. Uses a standalone Figure rather than pyplot so
+    it is safe under threaded servers.
+    """
+    from matplotlib.figure import Figure
+
+    labels = [label for label, _, _ in top]
+    categories = [category for _, category, _ in top]
+    confidences = [confidence for _, _, confidence in top]
+    colors = [CATEGORY_COLORS.get(category, 'blue') for category in categories]
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    bars = ax.bar(labels, confidences, color=colors)
+    ax.set_ylim(0, 100)
+    ax.set_title("Top 3 Waste Predictions", fontsize=14)
+    ax.set_xlabel("Waste Type", fontsize=12)
+    ax.set_ylabel("Confidence (%)", fontsize=12)
 
     # Annotate bars with confidence and category
-    for i, (bar, conf, cat) in enumerate(zip(bars, confidences, categories)):
-        plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 2, f"{conf:.1f}%", 
-                 ha='center', fontsize=10, color='black')
-        plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() - 10, f"{cat}", 
-                 ha='center', va='bottom', fontsize=9, color='white', fontweight='bold')
+    for bar, conf, cat in zip(bars, confidences, categories):
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 2, f"{conf:.1f}%",
+                ha='center', fontsize=10, color='black')
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() - 10, f"{cat}",
+                ha='center', va='bottom', fontsize=9, color='white', fontweight='bold')
 
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Convert chart to base64
     buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
+    fig.savefig(buffer, format='png')
     image_base64 = base64.b64encode(buffer.getvalue()).decode()
     buffer.close()
-    chart_url = 'data:image/png;base64,' + image_base64
-
-    plt.close()
-
-    return labels[0], categories[0], confidences[0], chart_url
+    return 'data:image/png;base64,' + image_base64
 
 
 def upload_image(request):
@@ -122,25 +155,267 @@ def upload_image(request):
     category_label = None
     confidence = None
     img_url = None
+    full_img_url = None
     chart_url = None
+    predictions = None
+    error = None
+    job = None
+
+    if request.method == 'GET' and request.GET.get('job'):
+        # Result page for a job queued in async mode
+        try:
+            job = ClassificationJob.objects.get(pk=request.GET['job'])
+        except (ClassificationJob.DoesNotExist, ValidationError):
+            raise Http404("Unknown job")
+        img_url = upload_storage.thumbnail_url(job.image_name)
+        full_img_url = upload_storage.url(job.image_name)
+        if job.status == ClassificationJob.DONE:
+            top = [(p['label'], p['category'], p['confidence']) for p in job.result['top3']]
+            specific_label, category_label, confidence = top[0]
+            predictions, chart_url = prediction_chart(top)
+            job = None
+        elif job.status == ClassificationJob.FAILED:
+            error = f"Classification failed: {job.error}"
+            job = None
 
     if request.method == 'POST':
         form = ImageUploadForm(request.POST, request.FILES)
         if form.is_valid():
             image_file = request.FILES['image']
-            fs = FileSystemStorage()
-            filename = fs.save(image_file.name, image_file)
-            file_path = fs.path(filename)
-            img_url = fs.url(filename)
-
-            # classify and get updated bar chart path
-            specific_label, category_label, confidence, chart_url = classify_image(file_path)
-
-    return render(request, 'classifier/upload.html', {
-        'form': form,
-        'specific_label': specific_label,
-        'category_label': category_label,
-        'confidence': round(confidence, 2) if confidence else None,
-        'uploaded_image': img_url,
-        'chart_url': chart_url  
+            data = image_file.read()
+
+            if getattr(settings, 'CLASSIFIER_ASYNC', False):
+                # Hand off to the inference workers; the page polls for the result
+                job = enqueue_job(image_file.name, data)
+                return _render_upload(request, form, job=job)
+
+            # Persist the upload (and its thumbnail) in the background; classify straight from memory
+            filename = upload_storage.content_name(data, image_file.name)
+            saved = save_upload_async(upload_storage, filename, data)
+
+            top = vector = None
+            version = ''
+            try:
+                predicted, vector = predict_top(io.BytesIO(data))
+                # Read with the prediction: the sidecar may go down in between
+                version = model_version()
+                top = predicted
+                specific_label, category_label, confidence = top[0]
+                predictions, chart_url = prediction_chart(top)
+            except ModelUnavailable:
+                vector = None
+                error = "The classification model is currently unavailable. Please try again later."
+            image = record_prediction(filename, top, version)
+            if vector is not None:
+                embeddings.remember(image, vector, top)
+            # The write overlapped inference; wait for it so the page only links files that exist
+            try:
+                saved.result()
+            except Exception:
+                pass  # logged by the writer; show the result without the image
+            else:
+                img_url = upload_storage.thumbnail_url(filename)
+                full_img_url = upload_storage.url(filename)
+
+    return _render_upload(
+        request, form,
+        specific_label=specific_label,
+        category_label=category_label,
+        confidence=round(confidence, 2) if confidence else None,
+        uploaded_image=img_url,
+        uploaded_image_full=full_img_url,
+        chart_url=chart_url,
+        predictions=predictions,
+        error=error,
+        job=job,
+    )
+
+
+def _render_upload(request, form, job=None, **context):
+    if job is not None:
+        context['job_id'] = job.pk
+        context['job_url'] = reverse('classifier_job_status', args=[job.pk])
+    with timer('classifier.template'):
+        return render(request, 'classifier/upload.html', {'form': form, **context})
+
+
+def model_status(request):
+    """
+    Reports whether the CNN is loaded plus its load time and memory footprint.
+    """
+    return JsonResponse({
+        **registry.stats(),
+        'batching': batcher.stats(),
+        'cache': prediction_cache.stats(),
+        'embeddings': embeddings.embedding_index.stats() if embeddings.enabled() else None,
+        'sidecar': _sidecar_status(),
+    })
+
+
+def _sidecar_status():
+    if not sidecar.enabled():
+        return None
+    try:
+        return sidecar.client.status()
+    except (sidecar.SidecarUnavailable, ModelUnavailable) as exc:
+        return {'error': str(exc)}
+
+
+@csrf_exempt
+@require_POST
+def bulk_classify(request):
+    """
+    Classifies many images in one request.
+    Accepts any number of files (images and/or zip archives) and streams
+    back one JSON object per image as newline-delimited JSON.
+    """
+    uploaded_files = [f for field in request.FILES for f in request.FILES.getlist(field)]
+    if not uploaded_files:
+        return JsonResponse({'error': 'No files uploaded.'}, status=400)
+    try:
+        ensure_model()
+    except ModelUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=503)
+
+    results = classify_stream(iter_images(uploaded_files))
+    return StreamingHttpResponse(ndjson_lines(results), content_type='application/x-ndjson')
+
+
+@csrf_exempt
+@require_POST
+def classify_sequence(request):
+    """
+    Classifies a burst of frames from a fixed camera, in upload order
+    (several files and/or a zip archive). Frames that barely differ from the
+    last classified one skip the model; returns one smoothed label per object
+    plus how many frames were inferred vs skipped.
+    """
+    uploaded_files = [f for field in request.FILES for f in request.FILES.getlist(field)]
+    if not uploaded_files:
+        return JsonResponse({'error': 'No frames uploaded.'}, status=400)
+    try:
+        ensure_model()
+    except ModelUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=503)
+    return JsonResponse(classify_frames(iter_images(uploaded_files)))
+
+
+@login_required
+@require_POST
+def create_job(request):
+    """
+    Queues one uploaded image for background classification.
+    Returns 202 with the job id and the URL to poll for its result.
+    """
+    form = ImageUploadForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Upload a valid image.', 'fields': form.errors}, status=400)
+    image_file = form.cleaned_data['image']
+    job = enqueue_job(image_file.name, image_file.read())
+    return JsonResponse({
+        'job_id': str(job.pk),
+        'status': job.status,
+        'result_url': reverse('classifier_job_status', args=[job.pk]),
+    }, status=202)
+
+
+async def job_status(request, job_id):
+    """
+    Status of a queued job, plus its prediction once done.
+    Async so that polling clients don't tie up worker threads under ASGI.
+    """
+    try:
+        job = await ClassificationJob.objects.aget(pk=job_id)
+    except ClassificationJob.DoesNotExist:
+        return JsonResponse({'error': 'Unknown job.'}, status=404)
+    data = {'job_id': str(job.pk), 'status': job.status}
+    if job.status == ClassificationJob.DONE:
+        data.update(job.result)
+    elif job.status == ClassificationJob.FAILED:
+        data['error'] = job.error
+    return JsonResponse(data)
+
+
+def classification_history(request):
+    """
+    Classified uploads per category per day, week or month, for the dashboards.
+    Query parameters: period=day|week|month (default day), optional start/end as YYYY-MM-DD.
+    """
+    period = request.GET.get('period', 'day')
+    if period not in PERIODS:
+        return JsonResponse({'error': f"period must be one of {', '.join(PERIODS)}."}, status=400)
+    try:
+        start, end = (_parse_day(request.GET.get(name)) for name in ('start', 'end'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if end is not None:
+        end += timedelta(days=1)  # inclusive of the end day
+
+    rows = category_counts(period, start, end)
+    return JsonResponse({
+        'period': period,
+        'categories': sorted({row['category'] for row in rows}),
+        'results': [{**row, 'period': row['period'].isoformat()} for row in rows],
     })
+
+
+def _parse_day(value):
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date {value!r}; expected YYYY-MM-DD.")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+@csrf_exempt
+def similar_images(request, image_id=None):
+    """
+    Past uploads that look most like an image, by embedding similarity.
+    GET .../images/<id>/similar/ searches around a stored upload; POST an
+    `image` to similar/ to search around a new photo. ?k= sets the count (default 5).
+    """
+    if not embeddings.enabled():
+        return JsonResponse({'error': 'Similarity search is disabled.'}, status=404)
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'k must be an integer.'}, status=400)
+
+    try:
+        if image_id is not None:
+            stored = ImageEmbedding.objects.filter(
+                image_id=image_id, model_version=model_version(),
+            ).values_list('vector', flat=True).first()
+            if stored is None:
+                return JsonResponse({'error': 'No embedding stored for this image.'}, status=404)
+            vector = np.frombuffer(stored, dtype=np.float16)
+        elif request.method == 'POST' and request.FILES.get('image'):
+            try:
+                img_array = preprocess_image(request.FILES['image'])
+            except (OSError, ValueError, Image.DecompressionBombError):
+                return JsonResponse({'error': 'Upload a valid image.'}, status=400)
+            vectors, _ = embeddings.embed(img_array)
+            vector = vectors[0]
+        else:
+            return JsonResponse({'error': 'POST an image, or GET a stored image id.'}, status=400)
+        matches = [m for m in embeddings.embedding_index.search(vector, k=k + 1) if m[0] != image_id][:k]
+    except ModelUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=503)
+
+    images = WasteImage.objects.in_bulk([image_id for image_id, _ in matches])
+    results = []
+    for match_id, similarity in matches:
+        image = images.get(match_id)
+        if image is None:
+            continue  # deleted since the index was built
+        results.append({
+            'id': image.pk,
+            'similarity': round(similarity, 4),
+            'label': image.label,
+            'category': image.category,
+            'uploaded_at': image.uploaded_at.isoformat(),
+            'image_url': image.image.url,
+            'thumbnail_url': upload_storage.thumbnail_url(image.image.name),
+        })
+    return JsonResponse({'results': results})
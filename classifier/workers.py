@@ -0,0 +1,19 @@
+"""
+Entry point for inference worker processes.
+
+Kept free of model imports at module level so it can be the target of a
+spawned process (Windows/macOS), which has to set Django up itself.
+"""
+import os
+import signal
+
+
+def worker_main(poll_interval, batch_size):
+    # A restarted worker is forked after the parent turned SIGTERM into KeyboardInterrupt
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecoguard.settings')
+    import django
+    django.setup()
+
+    from .jobs import run_worker
+    run_worker(poll_interval=poll_interval, batch_size=batch_size)
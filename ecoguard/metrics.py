@@ -0,0 +1,218 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+- MetricsMiddleware records request counts, latency and DB queries per view
+- timer('stage') wraps hot sections (preprocessing, model.predict, charts,
+  pandas aggregation, template rendering) in a latency histogram
+- register_gauge() adds values computed at scrape time (queue depth, cache
+  hit ratio, ...)
+- metrics_view serves everything at /metrics
+
+With METRICS_ENABLED = False every timer is a shared no-op and the
+middleware passes requests straight through. Values are per process.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = (('le', bound if bound == '+Inf' else repr(float(bound))),)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """A value read from `callback` at scrape time; the callback returns a number or {labels-tuple: number}."""
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.callback = callback
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            value = self.callback()
+        except Exception:
+            return []  # a broken source must not take down the whole scrape
+        if isinstance(value, dict):
+            for key, item in sorted(value.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {item}')
+        elif value is not None:
+            lines.append(f'{self.name} {value}')
+        return lines
+
+
+http_requests = Counter(
+    'ecoguard_http_requests_total', 'HTTP requests by view, method and status.', ('view', 'method', 'status'))
+http_latency = Histogram(
+    'ecoguard_http_request_duration_seconds', 'Time to produce a response, by view.', ('view',))
+db_queries = Histogram(
+    'ecoguard_db_queries_per_request', 'Database queries executed per request, by view.', ('view',),
+    buckets=QUERY_BUCKETS)
+stage_latency = Histogram(
+    'ecoguard_stage_duration_seconds', 'Time spent in instrumented hot sections.', ('stage',))
+
+_gauges = []
+
+
+def register_gauge(name, documentation, callback, labelnames=()):
+    _gauges.append(Gauge(name, documentation, callback, labelnames))
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+@contextmanager
+def _timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage=stage)
+
+
+def timer(stage):
+    """Context manager timing a hot section into ecoguard_stage_duration_seconds{stage=...}."""
+    if not enabled():
+        return _null_timer
+    return _timed(stage)
+
+
+class MetricsMiddleware:
+    """
+    Records every request's view, status, latency and DB query count.
+    Runs natively under both WSGI and ASGI. Under ASGI the ORM runs in
+    sync_to_async threads shared by concurrent requests, so queries cannot be
+    attributed to one request there and only counts and latency are recorded.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not enabled():
+            return self.get_response(request)
+
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        if not enabled():
+            return await self.get_response(request)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, elapsed, queries=None):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_latency.observe(elapsed, view=view)
+        if queries is not None:
+            db_queries.observe(queries, view=view)
+
+
+def render_metrics():
+    lines = []
+    for metric in (http_requests, http_latency, db_queries, stage_latency, *_gauges):
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    if not enabled():
+        raise Http404("Metrics are disabled")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
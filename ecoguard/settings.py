@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'ecoguard.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +83,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction begins, so concurrent writers
+            # (e.g. several smart meters) wait for it instead of failing with
+            # "database is locked" when a read lock cannot be upgraded
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -146,4 +154,49 @@ EMAIL_HOST_PASSWORD = 'clhdnxqamltucrlo'
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'upload_image'  # or your dashboard
-LOGOUT_REDIRECT_URL = 'login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'
+
+# Waste classifier model
+CLASSIFIER_MODEL_PATH = os.path.join(BASE_DIR, 'ml_model', 'waste_cnn.h5')
+CLASSIFIER_EAGER_LOAD = False           # load the CNN at worker boot instead of on first upload
+CLASSIFIER_WARMUP_RUNS = 1              # dummy predictions run right after (re)loading
+CLASSIFIER_MODEL_RELOAD_INTERVAL = 30   # seconds between model file change checks; None disables hot-swap
+CLASSIFIER_BATCHING = True              # coalesce concurrent uploads into one model.predict call
+CLASSIFIER_MAX_BATCH_SIZE = 32
+CLASSIFIER_MAX_BATCH_WAIT_MS = 10       # how long the first request in a batch waits for company
+CLASSIFIER_BULK_BATCH_SIZE = 32         # images per model call on the bulk endpoint
+CLASSIFIER_BULK_WORKERS = 4             # threads decoding/preprocessing bulk uploads
+CLASSIFIER_BULK_MAX_MEMBER_BYTES = 20 * 1024 * 1024  # larger zip members are reported as errors, not read
+CLASSIFIER_CACHE_SIZE = 1024            # in-memory LRU entries keyed by image content hash + model version
+CLASSIFIER_CACHE_PERSISTENT = False     # also store predictions in the CachedPrediction table
+CLASSIFIER_CHART_PNG = False            # render the top-3 chart with matplotlib instead of inline SVG
+CLASSIFIER_ASYNC = False                # queue uploads for `manage.py run_classifier_workers` instead of classifying inline
+CLASSIFIER_JOB_STALE_SECONDS = 300      # running jobs older than this are put back in the queue by the workers
+CLASSIFIER_BACKEND = 'keras'            # 'keras' (waste_cnn.h5) or 'tflite' (see `manage.py export_tflite`)
+CLASSIFIER_TFLITE_MODEL_PATH = os.path.join(BASE_DIR, 'ml_model', 'waste_cnn.tflite')
+CLASSIFIER_TFLITE_THREADS = None        # interpreter threads; None lets the runtime decide
+CLASSIFIER_THUMBNAIL_SIZE = (480, 480)  # display copy generated when an upload is first stored
+CLASSIFIER_THUMBNAIL_QUALITY = 80
+METRICS_ENABLED = True                  # per-view latency/query counts and hot-section timers served at /metrics
+CLASSIFIER_EMBEDDINGS = False           # store penultimate-layer embeddings for similarity search (keras backend only)
+CLASSIFIER_EMBEDDING_INDEX_PATH = os.path.join(BASE_DIR, 'ml_model', 'embedding_index')
+CLASSIFIER_EMBEDDING_NPROBE = 8         # IVF lists scanned per query; higher is slower but more exact
+CLASSIFIER_EMBEDDING_TAIL_LIMIT = 10000  # embeddings newer than the index kept in memory until the next rebuild
+CLASSIFIER_SIMILARITY_THRESHOLD = None  # cosine similarity above which a past upload's prediction is reused;
+                                        # calibrate on your model first (post-ReLU embeddings all score high)
+CLASSIFIER_FRAME_DIFF_THRESHOLD = 0.02  # mean 32x32 grayscale change below which a frame reuses the last result
+CLASSIFIER_FRAME_SMOOTHING = 0.5        # weight of the newest frame in the moving average of probabilities
+CLASSIFIER_FRAME_MIN_RUN = 3            # shorter label runs are treated as flicker, not a new object
+CLASSIFIER_SIDECAR_SOCKET = None        # e.g. '/run/ecoguard/inference.sock': delegate inference to `manage.py run_inference_sidecar`
+CLASSIFIER_SIDECAR_TIMEOUT = 30         # seconds to wait for a sidecar reply before falling back to in-process inference
+CLASSIFIER_SIDECAR_RETRY_SECONDS = 5    # how long a worker keeps using in-process inference after the sidecar fails
+CARBON_FACTOR_CACHE_SECONDS = 60        # how long a process trusts its cached EmissionFactor set; None = until changed locally
+CARBON_CHART_CACHE_SECONDS = 3600       # how long cached dashboard data / trend PNGs for one data version are kept
+CARBON_CHART_PRERENDER = False          # render the trend PNG on a background thread right after each entry write
+CARBON_ANOMALY_Z = 2.0                  # |z-score| above which a day's total is flagged as an anomaly
+CARBON_ANOMALY_MIN_DAYS = 5             # days a window needs before new days are scored
+CARBON_ANOMALY_WINDOW = 30              # rolling window (7, 30, 90 or 0 = all time) shown on the dashboard
+CARBON_IMPORT_CHUNK_SIZE = 5000         # CSV rows validated and upserted per transaction by the carbon import
+CARBON_METER_BATCH_SIZE = 2000          # smart-meter readings buffered per bulk insert and daily-entry update
+CARBON_SCENARIO_MAX = 5_000_000         # most scenario combinations / Monte Carlo samples one request may evaluate
+CARBON_SCENARIO_SAMPLES = 100_000       # Monte Carlo samples when a request has distributions but no `samples`
@@ -21,6 +21,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from users import views as user_views
 from django.contrib.auth import views as auth_views
+from ecoguard.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -31,6 +32,7 @@ urlpatterns = [
     path('', include('users.urls')),
     path('classifier/', include('classifier.urls')),
     path('login/', auth_views.LoginView.as_view(), name='login'),
+    path('metrics', metrics_view, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 